@@ -0,0 +1,395 @@
+import gzip
+import hashlib
+import json
+
+from flask import Blueprint, Response, abort, request
+
+import kitchen_board
+import partitions
+from db import get_db
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth compressing
+GZIP_LEVEL = 6
+
+# Per resource: the FROM clause, the key used for paging, the exposed fields
+# mapped to SQL expressions, and the query parameters usable as filters.
+RESOURCES = {
+    'menu': {
+        'from': '''dishes
+                   LEFT JOIN categories ON dishes.category_id = categories.id
+                   LEFT JOIN sub_category ON dishes.sub_category_id = sub_category.id''',
+        'key': 'dishes.id',
+        'fields': {
+            'id': 'dishes.id',
+            'name': 'dishes.name',
+            'price': 'dishes.price',
+            'category_id': 'dishes.category_id',
+            'category': 'categories.name',
+            'sub_category_id': 'dishes.sub_category_id',
+            'sub_category': 'sub_category.name',
+            'img_link': 'dishes.img_link',
+        },
+        'filters': {'category_id': 'dishes.category_id', 'sub_category_id': 'dishes.sub_category_id'},
+    },
+    'orders': {
+        'from': 'orders LEFT JOIN user ON orders.user_id = user.id',
+        'key': 'orders.id',
+        'fields': {
+            'id': 'orders.id',
+            'description': 'orders.description',
+            'status': 'orders.status',
+            'total': 'orders.total',
+            'user_id': 'orders.user_id',
+            'user_name': 'user.name',
+            'branch_id': 'orders.branch_id',
+            'courier_id': 'orders.courier_id',
+        },
+        'filters': {'status': 'orders.status', 'user_id': 'orders.user_id', 'branch_id': 'orders.branch_id'},
+        # Orders may be spread over per-branch databases (see partitions.py)
+        'partitioned': True,
+    },
+    'couriers': {
+        'from': 'user',
+        'key': 'user.id',
+        'where': "user.role = 'courier'",
+        'fields': {'id': 'user.id', 'name': 'user.name', 'phone': 'user.phone'},
+        'filters': {},
+    },
+    'branches': {
+        'from': 'branch',
+        'key': 'branch.id',
+        'fields': {'id': 'branch.id', 'name': 'branch.name', 'address': 'branch.address', 'phone': 'branch.phone'},
+        'filters': {},
+    },
+}
+
+ORDER_ITEM_FIELDS = {
+    'dish_id': 'order_items.dish_id',
+    'dish_name': 'dishes.name',
+    'quantity': 'order_items.quantity',
+    'unit_price': 'order_items.unit_price',
+}
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _selected_fields(available):
+    """Returns the requested ``?fields=a,b`` in order, or all of them."""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in available]
+    if unknown:
+        abort(400, f"Unknown field(s): {', '.join(unknown)}")
+    return selected
+
+
+def _encode_rows(cur, names):
+    # Rows are read as plain tuples and encoded one at a time; no Row objects
+    # or intermediate list of results are built.
+    for row in cur:
+        yield _dumps(dict(zip(names, row)))
+
+
+def _json_response(body):
+    body = body.encode()
+    etag = hashlib.sha1(body).hexdigest()
+    compress = len(body) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']
+    if compress:
+        # The compressed bytes are a different representation, so they get their own tag
+        etag += '-gz'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        if compress:
+            body = gzip.compress(body, GZIP_LEVEL)
+        response = Response(body, mimetype='application/json')
+        if compress:
+            response.content_encoding = 'gzip'
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def _list(resource):
+    spec = RESOURCES[resource]
+    fields = _selected_fields(spec['fields'])
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor', type=int)
+
+    conditions, params = [], []
+    if 'where' in spec:
+        conditions.append(spec['where'])
+    for name, column in spec['filters'].items():
+        value = request.args.get(name)
+        if value:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if cursor is not None:
+        conditions.append(f"{spec['key']} > ?")
+        params.append(cursor)
+
+    # The paging key always comes first so the next cursor is known even when
+    # the client didn't ask for the id.
+    columns = ', '.join([spec['key']] + [spec['fields'][field] for field in fields])
+    query = f"SELECT {columns} FROM {spec['from']}"
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f" ORDER BY {spec['key']} LIMIT ?"
+    params.append(limit + 1)
+
+    if spec.get('partitioned'):
+        rows = partitions.fan_out(query, params, request.args.get('branch_id', type=int), plain=True, history=True)
+    else:
+        cur = get_db().cursor()
+        cur.row_factory = None
+        rows = cur.execute(query, params)
+
+    items, last_key, count = [], None, 0
+    for row in rows:
+        count += 1
+        if count > limit:
+            break
+        last_key = row[0]
+        items.append(_dumps(dict(zip(fields, row[1:]))))
+    next_cursor = last_key if count > limit else None
+    return _json_response('{"data":[' + ','.join(items) + '],"next_cursor":' + _dumps(next_cursor) + '}')
+
+
+@bp.route('/menu')
+def menu():
+    """
+    Lists menu dishes as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated fields to return (id, name, price, category_id, category, sub_category_id, sub_category, img_link)
+      - name: category_id
+        in: query
+        type: integer
+        required: false
+        description: Only list dishes of this category
+      - name: sub_category_id
+        in: query
+        type: integer
+        required: false
+        description: Only list dishes of this sub-category
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: The next_cursor of the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 100, at most 1000)
+    responses:
+      200:
+        description: A page of dishes and the cursor of the next page
+      304:
+        description: The page has not changed since the supplied ETag
+      400:
+        description: Unknown field requested
+    """
+    return _list('menu')
+
+
+@bp.route('/orders')
+def orders():
+    """
+    Lists orders as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated fields to return (id, description, status, total, user_id, user_name, branch_id, courier_id)
+      - name: status
+        in: query
+        type: string
+        required: false
+        enum: ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
+        description: Only list orders with this status
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed by this user
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed at this branch
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: The next_cursor of the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 100, at most 1000)
+    responses:
+      200:
+        description: A page of orders and the cursor of the next page
+      304:
+        description: The page has not changed since the supplied ETag
+      400:
+        description: Unknown field requested
+    """
+    return _list('orders')
+
+
+@bp.route('/couriers')
+def couriers():
+    """
+    Lists couriers as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated fields to return (id, name, phone)
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: The next_cursor of the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 100, at most 1000)
+    responses:
+      200:
+        description: A page of couriers and the cursor of the next page
+      304:
+        description: The page has not changed since the supplied ETag
+    """
+    return _list('couriers')
+
+
+@bp.route('/branches')
+def branches():
+    """
+    Lists branches as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated fields to return (id, name, address, phone)
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: The next_cursor of the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 100, at most 1000)
+    responses:
+      200:
+        description: A page of branches and the cursor of the next page
+      304:
+        description: The page has not changed since the supplied ETag
+    """
+    return _list('branches')
+
+
+@bp.route('/kitchen/board')
+def kitchen_board_counts():
+    """
+    Returns the open quantity of each dish per order status as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only count this branch's orders (0 for orders without a branch)
+    responses:
+      200:
+        description: One entry per dish with a count for each open status
+      304:
+        description: The board has not changed since the supplied ETag
+    """
+    board = kitchen_board.read(request.args.get('branch_id', type=int))
+    return _json_response(_dumps({'data': board}))
+
+
+@bp.route('/orders/<int:order_id>')
+def order_details(order_id):
+    """
+    Returns one order and its lines as JSON.
+    ---
+    tags:
+      - JSON API
+    parameters:
+      - name: order_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the order
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated order fields to return (id, description, status, total, user_id, user_name, branch_id, courier_id)
+    responses:
+      200:
+        description: The order with an items list
+      304:
+        description: The order has not changed since the supplied ETag
+      404:
+        description: Order not found
+    """
+    spec = RESOURCES['orders']
+    fields = _selected_fields(spec['fields'])
+    columns = ', '.join(spec['fields'][field] for field in fields)
+    # Archived orders are only looked up once the live database doesn't have them
+    for conn in partitions.lookup_dbs(order_id):
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(f"SELECT {columns} FROM {spec['from']} WHERE orders.id = ?", (order_id,))
+        header = cur.fetchone()
+        if header is not None:
+            break
+    else:
+        abort(404)
+
+    cur.execute(f'''SELECT {', '.join(ORDER_ITEM_FIELDS.values())}
+                    FROM order_items LEFT JOIN dishes ON order_items.dish_id = dishes.id
+                    WHERE order_items.order_id = ?
+                    ORDER BY order_items.id''', (order_id,))
+    items = ','.join(_encode_rows(cur, list(ORDER_ITEM_FIELDS)))
+    body = _dumps(dict(zip(fields, header)))
+    return _json_response(body[:-1] + (',' if fields else '') + '"items":[' + items + ']}')
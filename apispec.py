@@ -0,0 +1,54 @@
+"""Prebuilt OpenAPI spec, so workers don't parse every route docstring.
+
+flasgger builds the spec from the YAML in each view's docstring the first
+time it is requested. ``python apispec.py`` does that once, at build time,
+and writes the result to ``static/apispec.json``. Workers then hand that
+file to flasgger as its cached spec. A spec older than the modules that
+define the views is ignored, so an outdated build falls back to parsing.
+"""
+import json
+import os
+import sys
+
+SPEC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'apispec.json')
+ENDPOINT = 'apispec_1'
+
+
+def _is_current(app, path):
+    try:
+        built = os.path.getmtime(path)
+    except OSError:
+        return False
+    modules = {view.__module__ for view in app.view_functions.values()}
+    sources = [getattr(sys.modules.get(module), '__file__', None) for module in modules]
+    return all(built >= os.path.getmtime(source) for source in sources if source and os.path.exists(source))
+
+
+def load(app, swagger, path=SPEC_FILE):
+    """Installs the prebuilt spec as flasgger's cached one; call after all routes exist."""
+    if not _is_current(app, path):
+        return False
+    with open(path, encoding='utf-8') as f:
+        swagger.apispecs[ENDPOINT] = json.load(f)
+    return True
+
+
+def build(app, swagger):
+    swagger.apispecs.pop(ENDPOINT, None)
+    with app.test_request_context():
+        return swagger.get_apispecs(ENDPOINT)
+
+
+def main(path=SPEC_FILE):
+    from app import app, swagger
+
+    spec = build(app, swagger)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp, path)
+    print(f"Wrote {len(spec['paths'])} paths to {path}")
+
+
+if __name__ == '__main__':
+    main()
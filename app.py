@@ -1,1057 +1,2027 @@
-from flask import Flask, render_template, request, redirect, url_for
-import sqlite3
-import qrcode
-from io import BytesIO
-import base64
-from flasgger import Swagger
-
-app = Flask(__name__)
-Swagger(app)
-
-def get_db_connection():
-    conn = sqlite3.connect('cooksoo_cafe.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-@app.route('/')
-def index():
-    return render_template('admin_panel.html')
-
-# --- Dish Management ---
-@app.route('/add_dish', methods=['GET', 'POST'])
-def add_dish():
-    """
-    Adds a new dish to the database.
-    ---
-    tags:
-      - Dish Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Name of the dish
-      - name: price
-        in: formData
-        type: number
-        required: true
-        description: Price of the dish
-      - name: image_link
-        in: formData
-        type: string
-        required: false
-        description: URL link to the image of the dish
-      - name: category_id
-        in: formData
-        type: integer
-        required: true
-        description: ID of the category the dish belongs to
-      - name: sub_category_id
-        in: formData
-        type: integer
-        required: false
-        description: ID of the sub-category the dish belongs to
-    responses:
-      200:
-        description: Dish successfully added
-    """
-    conn = get_db_connection()
-    if request.method == 'POST':
-        name = request.form['name']
-        price = request.form['price']
-        img_link = request.form['image_link']
-        category_id = request.form['category_id']
-        sub_category_id = request.form.get('sub_category_id')
-        conn.execute('INSERT OR IGNORE INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES (?, ?, ?, ?, ?)', 
-                     (name, price, category_id, sub_category_id, img_link))
-        conn.commit()
-        conn.close()
-        return render_template('add_dish.html', message="Dish added successfully")
-
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-    sub_categories = conn.execute('SELECT * FROM sub_category').fetchall()
-    conn.close()
-    return render_template('add_dish.html', categories=categories, sub_categories=sub_categories)
-
-@app.route('/edit_dish/<int:dish_id>', methods=['GET', 'POST'])
-def edit_dish(dish_id):
-    """
-    Edits an existing dish in the database.
-    ---
-    tags:
-      - Dish Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: dish_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the dish
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Updated name of the dish
-      - name: price
-        in: formData
-        type: number
-        required: true
-        description: Updated price of the dish
-      - name: category_id
-        in: formData
-        type: integer
-        required: true
-        description: Updated ID of the category the dish belongs to
-      - name: sub_category_id
-        in: formData
-        type: integer
-        required: false
-        description: Updated ID of the sub-category the dish belongs to
-    responses:
-      200:
-        description: Dish successfully updated
-      404:
-        description: Dish not found
-    """
-    conn = get_db_connection()
-    if request.method == 'POST':
-        name = request.form['name']
-        price = request.form['price']
-        category_id = request.form['category_id']
-        sub_category_id = request.form.get('sub_category_id')
-        conn.execute('UPDATE dishes SET name = ?, price = ?, category_id = ?, sub_category_id = ? WHERE id = ?', 
-                     (name, price, category_id, sub_category_id, dish_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('menu'))
-        
-
-    dish = conn.execute('SELECT * FROM dishes WHERE id = ?', (dish_id,)).fetchone()
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-    sub_categories = conn.execute('SELECT * FROM sub_category').fetchall()
-    conn.close()
-    return render_template('edit_dish.html', dish=dish, categories=categories, sub_categories=sub_categories)
-
-@app.route('/delete_dish/<int:dish_id>', methods=['POST'])
-def delete_dish(dish_id):
-    """
-    Deletes an existing dish from the database.
-    ---
-    tags:
-      - Dish Management
-    parameters:
-      - name: dish_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the dish to delete
-    responses:
-      200:
-        description: Dish successfully deleted
-      404:
-        description: Dish not found
-    """
-    conn = get_db_connection()
-    conn.execute('DELETE FROM dishes WHERE id = ?', (dish_id,))
-    conn.commit()
-    conn.close()
-    return redirect(url_for('menu'))
-
-# --- Category Management ---
-
-@app.route('/add_category', methods=['GET', 'POST'])
-def add_category():
-    """
-    Adds a new category to the database.
-    ---
-    tags:
-      - Category Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Name of the category to add
-    responses:
-      200:
-        description: Category successfully added
-      400:
-        description: Error with the provided data
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''select * from categories''')
-    categories = cur.fetchall()
-    if request.method == 'POST':
-        name = request.form['name']
-        conn = get_db_connection()
-        conn.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
-        conn.commit()
-        cur = conn.cursor()
-        cur.execute('''select * from categories''')
-        categories = cur.fetchall()
-        conn.close()
-        return render_template("add_category.html", categories=categories)
-    return render_template('add_category.html', categories=categories)
-
-@app.route('/edit_category/<int:category_id>', methods=['GET', 'POST'])
-def edit_category(category_id):
-    """
-    Edits an existing category in the database.
-    ---
-    tags:
-      - Category Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: category_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the category to edit
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Updated name of the category
-    responses:
-      200:
-        description: Category successfully updated
-      404:
-        description: Category not found
-    """
-    conn = get_db_connection()
-    if request.method == 'POST':
-        name = request.form['name']
-        conn.execute('UPDATE categories SET name = ? WHERE id = ?', (name, category_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('admin_panel'))
-    category = conn.execute('SELECT * FROM categories WHERE id = ?', (category_id,)).fetchone()
-    conn.close()
-    if category is None:
-        abort(404)  # Category not found
-    return render_template('edit_category.html', category=category)
-
-@app.route('/delete_category/<int:category_id>', methods=['POST'])
-def delete_category(category_id):
-    """
-    Deletes an existing category from the database.
-    ---
-    tags:
-      - Category Management
-    parameters:
-      - name: category_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the category to delete
-    responses:
-      200:
-        description: Category successfully deleted
-      404:
-        description: Category not found
-    """
-    conn = get_db_connection()
-    conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
-    conn.commit()
-    conn.close()
-    return redirect(url_for('admin_panel'))
-
-@app.route('/add_sub_category', methods=['GET', 'POST'])
-def add_sub_category():
-    """
-    Adds a new sub-category to the database.
-    ---
-    tags:
-      - Sub-Category Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Name of the sub-category to add
-      - name: category_id
-        in: formData
-        type: integer
-        required: true
-        description: ID of the parent category
-    responses:
-      200:
-        description: Sub-category successfully added
-      400:
-        description: Error with the provided data
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Fetch categories for the dropdown
-    cur.execute('SELECT * FROM categories')
-    categories = cur.fetchall()
-
-    if request.method == 'POST':
-        name = request.form['name']
-        category_id = request.form['category_id']
-
-        # Insert the new sub-category
-        cur.execute('INSERT OR IGNORE INTO sub_category (name, category_id) VALUES (?, ?)', (name, category_id))
-        conn.commit()
-
-    # Fetch sub-categories to display on the page
-    cur.execute('SELECT * FROM sub_category')
-    sub_categories = cur.fetchall()
-
-    conn.close()
-
-    return render_template('add_sub_category.html', sub_categories=sub_categories, categories=categories)
-
-@app.route('/edit_sub_category/<int:sub_category_id>', methods=['GET', 'POST'])
-def edit_sub_category(sub_category_id):
-    """
-    Edits an existing sub-category in the database.
-    ---
-    tags:
-      - Sub-Category Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: sub_category_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the sub-category to edit
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Updated name of the sub-category
-      - name: category_id
-        in: formData
-        type: integer
-        required: true
-        description: Updated ID of the parent category
-    responses:
-      200:
-        description: Sub-category successfully updated
-      404:
-        description: Sub-category not found
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''select * from categories''')
-    categories = cur.fetchall()
-    if request.method == 'POST':
-        # Logic to edit a category
-        name = request.form['name']
-        category_id = request.form['category_id']
-        conn = get_db_connection()
-        conn.execute('UPDATE sub_category SET name = ?, category_id = ? WHERE id = ?', (name, category_id, sub_category_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('admin_panel'))
-    # Fetch category details to populate the form
-    conn = get_db_connection()
-    cur.execute('''Select * from sub_category where id = ?''', (sub_category_id,))
-    sub_category = cur.fetchall()
-    conn.close()
-    return render_template('edit_sub_category.html', sub_category=sub_category, categories=categories)
-
-@app.route('/delete_sub_category/<int:sub_category_id>', methods=['POST'])
-def delete_sub_category(sub_category_id):
-    """
-    Deletes an existing sub-category from the database.
-    ---
-    tags:
-      - Sub-Category Management
-    parameters:
-      - name: sub_category_id
-        in: path
-        type: integer
-        required: true
-        description: Unique ID of the sub-category to delete
-    responses:
-      200:
-        description: Sub-category successfully deleted
-      404:
-        description: Sub-category not found
-    """
-    # Logic to delete a category
-    conn = get_db_connection()
-    conn.execute('DELETE FROM sub_category WHERE id = ?', (sub_category_id,))
-    conn.commit()
-    cur = conn.cursor()
-    cur.execute('''select * from sub_category''')
-    sub_categories = cur.fetchall()
-    conn.close()
-    return render_template('admin_panel.html')
-
-# --- Courier Management ---
-@app.route('/add_courier', methods=['GET', 'POST'])
-def add_courier():
-    """
-    Adds a new courier to the database.
-    ---
-    tags:
-      - Courier Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Full name of the courier
-      - name: phone
-        in: formData
-        type: string
-        required: true
-        description: Phone number of the courier
-    responses:
-      200:
-        description: Courier successfully added
-      400:
-        description: Error with the provided data
-    """
-    if request.method == 'POST':
-        name = request.form['name']
-        phone = request.form['phone']  # Assuming a 'phone' field in your form
-        role = 'courier'  # Since this route adds couriers
-
-        conn = get_db_connection()
-        conn.execute('INSERT INTO user (name, phone, role) VALUES (?, ?, ?)', (name, phone, role))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('couriers'))
-
-    return render_template('add_courier.html')
-
-@app.route('/edit_courier/<int:courier_id>', methods=['GET', 'POST'])
-def edit_courier(courier_id):
-    """
-    Edit a courier's information.
-    ---
-    tags:
-      - Couriers
-    parameters:
-      - name: courier_id
-        in: path
-        type: integer
-        required: true
-        description: The courier's ID
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: The new name of the courier
-      - name: phone
-        in: formData
-        type: string
-        required: false
-        description: The new phone number of the courier
-    responses:
-      200:
-        description: Courier information successfully updated
-      404:
-        description: Courier not found
-    """
-    conn = get_db_connection()
-    courier = conn.execute('SELECT * FROM user WHERE id = ? AND role = "courier"', (courier_id,)).fetchone()
-    
-    if not courier:
-        conn.close()
-        abort(404)  # Courier not found
-
-    if request.method == 'POST':
-        name = request.form['name']
-        phone = request.form['phone']
-        conn.execute('UPDATE user SET name = ?, phone = ? WHERE id = ? AND role = "courier"', (name, phone, courier_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('couriers'))
-
-    conn.close()
-    return render_template('edit_courier.html', courier=courier)
-    
-    courier = conn.execute('SELECT * FROM user WHERE id = ? AND role = "courier"', (courier_id,)).fetchone()
-    conn.close()
-
-    if courier is None:
-        abort(404)  # Courier not found
-
-    return render_template('edit_courier.html', courier=courier)
-
-@app.route('/delete_courier/<int:courier_id>', methods=['POST'])
-def delete_courier(courier_id):
-    """
-    Delete a courier from the database.
-    ---
-    tags:
-      - Couriers
-    parameters:
-      - name: courier_id
-        in: path
-        type: integer
-        required: true
-        description: The courier's ID
-    responses:
-      200:
-        description: Courier successfully deleted
-      404:
-        description: Courier not found
-    """
-    conn = get_db_connection()
-    conn.execute('DELETE FROM user WHERE id = ? AND role = "courier"', (courier_id,))
-    conn.commit()
-    conn.close()
-    return redirect(url_for('couriers'))
-
-@app.route('/couriers')
-def couriers():
-    """
-    Retrieves a list of all couriers.
-    ---
-    tags:
-      - Courier Management
-    responses:
-      200:
-        description: A list of couriers
-      500:
-        description: Error retrieving couriers
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM user WHERE role = 'courier'")
-    couriers = cur.fetchall()
-    conn.close()
-    return render_template('couriers.html', couriers=couriers)
-
-# --- Order Management ---
-@app.route('/orders')
-def orders():
-    """
-    Retrieves a list of all orders with detailed information.
-    ---
-    tags:
-      - Order Management
-    responses:
-      200:
-        description: A detailed list of orders
-      500:
-        description: Error retrieving orders
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT orders.id, orders.description, orders.status, dishes.name AS dish_name, user.name AS user_name 
-        FROM orders 
-        LEFT JOIN dishes ON orders.dish_id = dishes.id 
-        LEFT JOIN user ON orders.user_id = user.id
-    ''')
-    orders = cur.fetchall()
-    conn.close()
-    return render_template('orders.html', orders=orders)
-
-@app.route('/create_user', methods=['GET', 'POST'])
-def create_user():
-    """
-    Creates a new user in the database.
-    ---
-    tags:
-      - User Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: name
-        in: formData
-        type: string
-        required: true
-        description: Full name of the user
-      - name: phone
-        in: formData
-        type: string
-        required: true
-        description: Phone number of the user
-      - name: role
-        in: formData
-        type: string
-        required: true
-        description: Role of the user (kitchen, administration, courier, user)
-    responses:
-      200:
-        description: User successfully created
-      400:
-        description: Error with the provided data
-    """
-    if request.method == 'POST':
-        name = request.form['name']
-        phone = request.form['phone']
-        role = request.form['role']
-
-        # Validating the role
-        if role not in ['kitchen', 'administration', 'courier', 'user']:
-            return "Invalid role specified", 400
-
-        conn = get_db_connection()
-        conn.execute('INSERT INTO user (name, phone, role) VALUES (?, ?, ?)', (name, phone, role))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('index'))
-
-    return render_template('create_user.html')
-
-@app.route('/make_order', methods=['GET', 'POST'])
-def make_order():
-    """
-    Create a new order.
-    ---
-    tags:
-      - Order Management
-    parameters:
-      - name: description
-        in: formData
-        type: string
-        required: true
-        description: Description of the order
-      - name: user_id
-        in: formData
-        type: integer
-        required: true
-        description: User ID who is making the order
-      - name: dish_id
-        in: formData
-        type: integer
-        required: true
-        description: Dish ID for the order
-    responses:
-      200:
-        description: Order successfully created
-      400:
-        description: Error in order creation
-    """
-    conn = get_db_connection()
-    if request.method == 'POST':
-        description = request.form['description']
-        user_id = request.form['user_id']
-        dish_id = request.form['dish_id']
-        conn.execute('INSERT INTO orders (description, user_id, dish_id, status) VALUES (?, ?, ?, "Pending")', 
-                     (description, user_id, dish_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('orders'))
-
-    # Fetching users and dishes for dropdowns
-    users = conn.execute('SELECT id, name FROM user WHERE role = "user"').fetchall()
-    dishes = conn.execute('SELECT id, name FROM dishes').fetchall()
-    conn.close()
-    return render_template('make_order.html', users=users, dishes=dishes)
-
-
-@app.route('/send_order_to_kitchen/<int:order_id>', methods=['POST'])
-def send_order_to_kitchen(order_id):
-    """
-    Updates the status of an order to 'In Kitchen'.
-    ---
-    tags:
-      - Order Management
-    parameters:
-      - name: order_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the order
-    responses:
-      200:
-        description: Order status updated to 'In Kitchen'
-      404:
-        description: Order not found
-    """
-    # Send order to kitchen logic
-    conn = get_db_connection()
-    conn.execute('UPDATE orders SET status = ? WHERE id = ?', ('In Kitchen', order_id))
-    conn.commit()
-    conn.close()
-    return redirect(url_for('orders'))
-
-@app.route('/order_details/<int:order_id>')
-def order_details(order_id):
-    """
-    Retrieves details for a specific order.
-    ---
-    tags:
-      - Order Management
-    parameters:
-      - name: order_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the order
-    responses:
-      200:
-        description: Details of the specified order
-      404:
-        description: Order not found
-    """
-    # View detailed information about the order
-    conn = get_db_connection()
-    cur.execute('''Select * from orders where id = ?''', (order_id,))
-    order = cur.fetchall()
-    conn.close()
-    return render_template('order_details.html', order_id=order_id)
-
-# --- Branch Management ---
-@app.route('/add_branch', methods=['GET', 'POST'])
-def add_branch():
-    """
-    Adds a new branch location.
-    ---
-    tags:
-      - Branch Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: branch_name
-        in: formData
-        type: string
-        required: true
-        description: Name of the branch
-      - name: address
-        in: formData
-        type: string
-        required: true
-        description: Address of the branch
-      - name: phone
-        in: formData
-        type: string
-        required: true
-        description: Contact phone number for the branch
-    responses:
-      200:
-        description: Branch successfully added
-      400:
-        description: Error with the provided data
-    """
-    if request.method == 'POST':
-        branch_name = request.form['branch_name']
-        address = request.form['address']
-        phone = request.form['phone']  # Get phone number from the form
-
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('INSERT INTO branch (name, address, phone) VALUES (?, ?, ?)', (branch_name, address, phone))
-        conn.commit()
-        conn.close()
-
-        return render_template('add_branch.html', message="Branch added successfully")
-
-    return render_template('add_branch.html')
-
-@app.route('/edit_branch/<int:branch_id>', methods=['GET', 'POST'])
-def edit_branch(branch_id):
-    """
-    Edits an existing branch location's information.
-    ---
-    tags:
-      - Branch Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: branch_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the branch
-      - name: branch_name
-        in: formData
-        type: string
-        required: true
-        description: Updated name of the branch
-      - name: address
-        in: formData
-        type: string
-        required: true
-        description: Updated address of the branch
-      - name: phone
-        in: formData
-        type: string
-        required: true
-        description: Updated contact phone number for the branch
-    responses:
-      200:
-        description: Branch information successfully updated
-      404:
-        description: Branch not found
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    if request.method == 'POST':
-        branch_name = request.form['branch_name']
-        address = request.form['address']
-        phone = request.form['phone']
-
-        cur.execute('UPDATE branch SET name = ?, address = ?, phone = ? WHERE id = ?', 
-                    (branch_name, address, phone, branch_id))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('admin_panel'))
-
-    # Fetch branch details for GET request
-    cur.execute('SELECT name, address, phone FROM branch WHERE id = ?', (branch_id,))
-    branch = cur.fetchone()
-    conn.close()
-
-    if branch is None:
-        abort(404)  # Branch not found
-
-    return render_template('edit_branch.html', branch=branch, branch_id=branch_id)
-
-
-@app.route('/delete_branch/<int:branch_id>', methods=['POST'])
-def delete_branch(branch_id):
-    """
-    Deletes a branch location from the database.
-    ---
-    tags:
-      - Branch Management
-    parameters:
-      - name: branch_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the branch to delete
-    responses:
-      200:
-        description: Branch successfully deleted
-      404:
-        description: Branch not found
-    """
-    # Logic to delete a branch
-    conn = get_db_connection()
-    conn.execute('DELETE FROM branch WHERE id = ?', (branch_id,))
-    conn.commit()
-    conn.close()
-    return render_template('admin_panel.html')
-
-@app.route('/branches')
-def branches():
-    """
-    Retrieves a list of all branch locations.
-    ---
-    tags:
-      - Branch Management
-    responses:
-      200:
-        description: A list of branches
-      500:
-        description: Error retrieving branches
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM branch")
-    branches = cur.fetchall()
-    conn.close()
-    return render_template('branches.html', branches=branches)
-
-# --- Promo Code Management ---
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    buffered = BytesIO()
-    img.save(buffered, format="JPEG")
-    return buffered.getvalue()
-
-@app.route('/add_promocode', methods=['GET', 'POST'])
-def add_promocode():
-    """
-    Adds a new promo code to the database.
-    ---
-    tags:
-      - Promo Code Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: code
-        in: formData
-        type: string
-        required: true
-        description: The promo code
-      - name: discount
-        in: formData
-        type: number
-        required: true
-        description: The discount percentage for the promo code
-    responses:
-      200:
-        description: Promo code successfully added
-      400:
-        description: Error with the provided data
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    if request.method == 'POST':
-        code = request.form['code']
-        discount = request.form['discount']
-        qr_code_blob = generate_qr_code(code)
-
-        cur.execute('INSERT INTO promocodes (code, discount, qr_code) VALUES (?, ?, ?)', 
-                    (code, discount, qr_code_blob))
-        conn.commit()
-
-    cur.execute('SELECT code, discount, qr_code FROM promocodes')
-    promocodes = []
-    for row in cur.fetchall():
-        code, discount, qr_blob = row
-        qr_base64 = base64.b64encode(qr_blob).decode()
-        promocodes.append((code, discount, qr_base64))
-
-    conn.close()
-    return render_template('add_promocode.html', promocodes=promocodes)
-
-@app.route('/delete_promocode/<int:promo_id>', methods=['POST'])
-def delete_promocode(promo_id):
-    """
-    Deletes an existing promo code from the database.
-    ---
-    tags:
-      - Promo Code Management
-    parameters:
-      - name: promo_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the promo code
-    responses:
-      200:
-        description: Promo code successfully deleted
-      404:
-        description: Promo code not found
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Check if the promocode exists
-    cur.execute('SELECT id FROM promocodes WHERE id = ?', (promo_id,))
-    if cur.fetchone() is None:
-        conn.close()
-        abort(404)  # Not found
-
-    # Delete the promocode
-    cur.execute('DELETE FROM promocodes WHERE id = ?', (promo_id,))
-    conn.commit()
-    conn.close()
-
-    return render_template('admin_panel.html')
-
-# --- Additional Features ---
-# Implement routes and logic for any additional features required
-
-def get_dishes():
-    conn = sqlite3.connect('cooksoo_cafe.db')
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM dishes")
-    dishes = cur.fetchall()
-    conn.close()
-    return dishes
-
-@app.route('/menu', methods=['GET', 'POST'])
-def menu():
-    """
-    Retrieves the menu items, optionally filtered by category.
-    ---
-    tags:
-      - Menu Management
-    parameters:
-      - name: category_id
-        in: formData
-        type: integer
-        required: false
-        description: Optional category ID to filter the menu items
-    responses:
-      200:
-        description: A list of menu items, optionally filtered by category
-      500:
-        description: Error retrieving menu items
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    selected_category_id = request.form.get('category_id') if request.method == 'POST' else None
-
-    # Fetch categories for the filter dropdown
-    cur.execute('SELECT * FROM categories')
-    categories = cur.fetchall()
-
-    # Fetch dishes, filtered by category if selected
-    query = 'SELECT * FROM dishes'
-    if selected_category_id:
-        query += ' WHERE category_id = ?'
-        cur.execute(query, (selected_category_id,))
-    else:
-        cur.execute(query)
-    dishes = cur.fetchall()
-
-    conn.close()
-    return render_template('menu.html', categories=categories, dishes=dishes, selected_category_id=selected_category_id)
-
-@app.route('/update_order_status/<int:order_id>', methods=['POST'])
-def update_order_status(order_id):
-    """
-    Updates the status of a specific order.
-    ---
-    tags:
-      - Order Management
-    consumes:
-      - application/x-www-form-urlencoded
-    parameters:
-      - name: order_id
-        in: path
-        type: integer
-        required: true
-        description: The unique identifier for the order
-      - name: status
-        in: formData
-        type: string
-        required: true
-        enum: ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
-        description: The new status for the order
-    responses:
-      200:
-        description: Order status successfully updated
-      404:
-        description: Order not found
-    """
-    status = request.form.get('status')
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Check if the order exists
-    cur.execute('SELECT id FROM orders WHERE id = ?', (order_id,))
-    if cur.fetchone() is None:
-        conn.close()
-        abort(404)  # Not found
-
-    # Update the order status
-    cur.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
-    conn.commit()
-    conn.close()
-
-    return redirect(url_for('orders'))
-
-
-if __name__ == '__main__':
+import startup  # first, so the boot report covers every other import
+
+from flask import Flask, render_template, request, redirect, url_for, abort, make_response, send_file, Response, stream_with_context, stream_template, jsonify
+import collections
+import csv
+import datetime
+import hashlib
+import io
+import itertools
+import os
+import queue
+import re
+import sqlite3
+import threading
+from flasgger import Swagger
+
+import api
+import apispec
+import backup
+import db
+import dispatch
+import group_commit
+import kitchen_board
+import kitchen_feed
+import menu_io
+import metrics
+import partitions
+import promo_campaign
+import promo_codes
+import reports
+import slow_queries
+import thumbnails
+from db import get_db
+from qr import generate_qr_code
+
+startup.mark('imports')
+
+app = Flask(__name__)
+swagger = Swagger(app)
+startup.mark('swagger')
+db.init_app(app)
+group_commit.init_app(app)
+partitions.init_app(app)
+backup.init_app(app)
+dispatch.init_app(app)
+metrics.init_app(app)
+slow_queries.init_app(app)
+thumbnails.init_app(app)
+app.register_blueprint(api.bp)
+startup.mark('extensions')
+
+@app.route('/')
+def index():
+    return render_template('admin_panel.html')
+
+# --- Dish Management ---
+@app.route('/add_dish', methods=['GET', 'POST'])
+def add_dish():
+    """
+    Adds a new dish to the database.
+    ---
+    tags:
+      - Dish Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Name of the dish
+      - name: price
+        in: formData
+        type: number
+        required: true
+        description: Price of the dish
+      - name: image_link
+        in: formData
+        type: string
+        required: false
+        description: URL link to the image of the dish; fetched once and thumbnailed
+      - name: image
+        in: formData
+        type: file
+        required: false
+        description: Image of the dish, used instead of image_link
+      - name: category_id
+        in: formData
+        type: integer
+        required: true
+        description: ID of the category the dish belongs to
+      - name: sub_category_id
+        in: formData
+        type: integer
+        required: false
+        description: ID of the sub-category the dish belongs to
+    responses:
+      200:
+        description: Dish successfully added
+      400:
+        description: The uploaded image is not a usable image
+    """
+    conn = get_db()
+    if request.method == 'POST':
+        name = request.form['name']
+        price = request.form['price']
+        img_link = request.form.get('image_link', '')
+        category_id = request.form['category_id']
+        sub_category_id = request.form.get('sub_category_id')
+        try:
+            thumbnail = dish_thumbnail(img_link)
+        except thumbnails.ThumbnailError as e:
+            return str(e), 400
+        conn.execute('INSERT OR IGNORE INTO dishes (name, price, category_id, sub_category_id, img_link, thumbnail) VALUES (?, ?, ?, ?, ?, ?)', 
+                     (name, price, category_id, sub_category_id, img_link, thumbnail))
+        conn.commit()
+        return render_template('add_dish.html', message="Dish added successfully")
+
+    categories = conn.execute('SELECT * FROM categories').fetchall()
+    sub_categories = conn.execute('SELECT * FROM sub_category').fetchall()
+    return render_template('add_dish.html', categories=categories, sub_categories=sub_categories)
+
+@app.route('/edit_dish/<int:dish_id>', methods=['GET', 'POST'])
+def edit_dish(dish_id):
+    """
+    Edits an existing dish in the database.
+    ---
+    tags:
+      - Dish Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: dish_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the dish
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Updated name of the dish
+      - name: price
+        in: formData
+        type: number
+        required: true
+        description: Updated price of the dish
+      - name: category_id
+        in: formData
+        type: integer
+        required: true
+        description: Updated ID of the category the dish belongs to
+      - name: sub_category_id
+        in: formData
+        type: integer
+        required: false
+        description: Updated ID of the sub-category the dish belongs to
+      - name: image_link
+        in: formData
+        type: string
+        required: false
+        description: New URL link to the image of the dish; the image is unchanged if empty
+      - name: image
+        in: formData
+        type: file
+        required: false
+        description: New image of the dish, used instead of image_link
+    responses:
+      200:
+        description: Dish successfully updated
+      400:
+        description: The uploaded image is not a usable image
+      404:
+        description: Dish not found
+    """
+    conn = get_db()
+    if request.method == 'POST':
+        name = request.form['name']
+        price = request.form['price']
+        category_id = request.form['category_id']
+        sub_category_id = request.form.get('sub_category_id')
+        img_link = request.form.get('image_link', '')
+        # The image is fetched before anything is written, so the download
+        # doesn't hold the database's write lock
+        new_image = bool(img_link or request.files.get('image'))
+        if new_image:
+            try:
+                thumbnail = dish_thumbnail(img_link)
+            except thumbnails.ThumbnailError as e:
+                return str(e), 400
+        conn.execute('UPDATE dishes SET name = ?, price = ?, category_id = ?, sub_category_id = ? WHERE id = ?', 
+                     (name, price, category_id, sub_category_id, dish_id))
+        if new_image:
+            conn.execute("UPDATE dishes SET img_link = COALESCE(NULLIF(?, ''), img_link), thumbnail = ? WHERE id = ?",
+                         (img_link, thumbnail, dish_id))
+        conn.commit()
+        return redirect(url_for('menu'))
+        
+
+    dish = conn.execute('SELECT * FROM dishes WHERE id = ?', (dish_id,)).fetchone()
+    categories = conn.execute('SELECT * FROM categories').fetchall()
+    sub_categories = conn.execute('SELECT * FROM sub_category').fetchall()
+    return render_template('edit_dish.html', dish=dish, categories=categories, sub_categories=sub_categories)
+
+def dish_thumbnail(img_link):
+    """Caches the uploaded image, or else the linked one, and returns its digest.
+
+    An unusable upload raises ThumbnailError. A link that can't be fetched
+    leaves the dish without a thumbnail, and the menu falls back to the link.
+    """
+    cache = thumbnails.get_cache(app)
+    upload = request.files.get('image')
+    if upload is not None and upload.filename:
+        data = upload.read(thumbnails.MAX_SOURCE_BYTES + 1)
+        if len(data) > thumbnails.MAX_SOURCE_BYTES:
+            raise thumbnails.ThumbnailError('Image is too large')
+        return cache.store(data)
+    if img_link:
+        try:
+            return cache.store_url(img_link)
+        except thumbnails.ThumbnailError as e:
+            app.logger.warning('No thumbnail for %s: %s', img_link, e)
+    return None
+
+@app.route('/img/<digest>')
+def dish_image(digest):
+    """
+    Serves a cached dish thumbnail, as WebP when the browser accepts it.
+    Thumbnails are addressed by content, so they are cached for a year.
+    ---
+    tags:
+      - Dish Management
+    produces:
+      - image/webp
+      - image/jpeg
+    parameters:
+      - name: digest
+        in: path
+        type: string
+        required: true
+        description: SHA-256 of the original image
+    responses:
+      200:
+        description: The thumbnail
+      302:
+        description: The thumbnail was evicted; redirects to the original image
+      404:
+        description: Unknown image
+    """
+    if not thumbnails.DIGEST_RE.match(digest):
+        abort(404)
+    ext = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+    path = thumbnails.get_cache(app).open(digest, ext)
+    if path is None:
+        row = get_db().execute("SELECT img_link FROM dishes WHERE thumbnail = ? AND img_link != '' LIMIT 1",
+                               (digest,)).fetchone()
+        if row is None:
+            abort(404)
+        return redirect(row['img_link'])
+    response = send_file(path, mimetype=thumbnails.FORMATS[ext][1], etag=f'{digest}-{ext}',
+                         max_age=thumbnails.MAX_AGE)
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
+@app.route('/delete_dish/<int:dish_id>', methods=['POST'])
+def delete_dish(dish_id):
+    """
+    Deletes an existing dish from the database.
+    ---
+    tags:
+      - Dish Management
+    parameters:
+      - name: dish_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the dish to delete
+    responses:
+      200:
+        description: Dish successfully deleted
+      404:
+        description: Dish not found
+    """
+    conn = get_db()
+    conn.execute('DELETE FROM dishes WHERE id = ?', (dish_id,))
+    conn.commit()
+    return redirect(url_for('menu'))
+
+# --- Category Management ---
+
+@app.route('/add_category', methods=['GET', 'POST'])
+def add_category():
+    """
+    Adds a new category to the database.
+    ---
+    tags:
+      - Category Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Name of the category to add
+    responses:
+      200:
+        description: Category successfully added
+      400:
+        description: Error with the provided data
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute('''select * from categories''')
+    categories = cur.fetchall()
+    if request.method == 'POST':
+        name = request.form['name']
+        conn.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
+        conn.commit()
+        cur = conn.cursor()
+        cur.execute('''select * from categories''')
+        categories = cur.fetchall()
+        return render_template("add_category.html", categories=categories)
+    return render_template('add_category.html', categories=categories)
+
+@app.route('/edit_category/<int:category_id>', methods=['GET', 'POST'])
+def edit_category(category_id):
+    """
+    Edits an existing category in the database.
+    ---
+    tags:
+      - Category Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: category_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the category to edit
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Updated name of the category
+    responses:
+      200:
+        description: Category successfully updated
+      404:
+        description: Category not found
+    """
+    conn = get_db()
+    if request.method == 'POST':
+        name = request.form['name']
+        conn.execute('UPDATE categories SET name = ? WHERE id = ?', (name, category_id))
+        conn.commit()
+        return redirect(url_for('admin_panel'))
+    category = conn.execute('SELECT * FROM categories WHERE id = ?', (category_id,)).fetchone()
+    if category is None:
+        abort(404)  # Category not found
+    return render_template('edit_category.html', category=category)
+
+@app.route('/delete_category/<int:category_id>', methods=['POST'])
+def delete_category(category_id):
+    """
+    Deletes an existing category from the database.
+    ---
+    tags:
+      - Category Management
+    parameters:
+      - name: category_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the category to delete
+    responses:
+      200:
+        description: Category successfully deleted
+      404:
+        description: Category not found
+    """
+    conn = get_db()
+    conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+    conn.commit()
+    return redirect(url_for('admin_panel'))
+
+@app.route('/add_sub_category', methods=['GET', 'POST'])
+def add_sub_category():
+    """
+    Adds a new sub-category to the database.
+    ---
+    tags:
+      - Sub-Category Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Name of the sub-category to add
+      - name: category_id
+        in: formData
+        type: integer
+        required: true
+        description: ID of the parent category
+    responses:
+      200:
+        description: Sub-category successfully added
+      400:
+        description: Error with the provided data
+    """
+    conn = get_db()
+    cur = conn.cursor()
+
+    # Fetch categories for the dropdown
+    cur.execute('SELECT * FROM categories')
+    categories = cur.fetchall()
+
+    if request.method == 'POST':
+        name = request.form['name']
+        category_id = request.form['category_id']
+
+        # Insert the new sub-category
+        cur.execute('INSERT OR IGNORE INTO sub_category (name, category_id) VALUES (?, ?)', (name, category_id))
+        conn.commit()
+
+    # Fetch sub-categories to display on the page
+    cur.execute('SELECT * FROM sub_category')
+    sub_categories = cur.fetchall()
+
+
+    return render_template('add_sub_category.html', sub_categories=sub_categories, categories=categories)
+
+@app.route('/edit_sub_category/<int:sub_category_id>', methods=['GET', 'POST'])
+def edit_sub_category(sub_category_id):
+    """
+    Edits an existing sub-category in the database.
+    ---
+    tags:
+      - Sub-Category Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: sub_category_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the sub-category to edit
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Updated name of the sub-category
+      - name: category_id
+        in: formData
+        type: integer
+        required: true
+        description: Updated ID of the parent category
+    responses:
+      200:
+        description: Sub-category successfully updated
+      404:
+        description: Sub-category not found
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute('''select * from categories''')
+    categories = cur.fetchall()
+    if request.method == 'POST':
+        # Logic to edit a category
+        name = request.form['name']
+        category_id = request.form['category_id']
+        conn.execute('UPDATE sub_category SET name = ?, category_id = ? WHERE id = ?', (name, category_id, sub_category_id))
+        conn.commit()
+        return redirect(url_for('admin_panel'))
+    # Fetch category details to populate the form
+    cur.execute('''Select * from sub_category where id = ?''', (sub_category_id,))
+    sub_category = cur.fetchall()
+    return render_template('edit_sub_category.html', sub_category=sub_category, categories=categories)
+
+@app.route('/delete_sub_category/<int:sub_category_id>', methods=['POST'])
+def delete_sub_category(sub_category_id):
+    """
+    Deletes an existing sub-category from the database.
+    ---
+    tags:
+      - Sub-Category Management
+    parameters:
+      - name: sub_category_id
+        in: path
+        type: integer
+        required: true
+        description: Unique ID of the sub-category to delete
+    responses:
+      200:
+        description: Sub-category successfully deleted
+      404:
+        description: Sub-category not found
+    """
+    # Logic to delete a category
+    conn = get_db()
+    conn.execute('DELETE FROM sub_category WHERE id = ?', (sub_category_id,))
+    conn.commit()
+    cur = conn.cursor()
+    cur.execute('''select * from sub_category''')
+    sub_categories = cur.fetchall()
+    return render_template('admin_panel.html')
+
+# --- Courier Management ---
+@app.route('/add_courier', methods=['GET', 'POST'])
+def add_courier():
+    """
+    Adds a new courier to the database.
+    ---
+    tags:
+      - Courier Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Full name of the courier
+      - name: phone
+        in: formData
+        type: string
+        required: true
+        description: Phone number of the courier
+      - name: branch_id
+        in: formData
+        type: integer
+        required: false
+        description: Branch the courier delivers for; empty to serve every branch
+    responses:
+      200:
+        description: Courier successfully added
+      400:
+        description: Error with the provided data
+    """
+    conn = get_db()
+    if request.method == 'POST':
+        name = request.form['name']
+        phone = request.form['phone']  # Assuming a 'phone' field in your form
+        role = 'courier'  # Since this route adds couriers
+        branch_id = request.form.get('branch_id', type=int)
+
+        conn.execute('INSERT INTO user (name, phone, role, branch_id) VALUES (?, ?, ?, ?)',
+                     (name, phone, role, branch_id))
+        conn.commit()
+        dispatch.couriers_changed()
+        return redirect(url_for('couriers'))
+
+    branches = conn.execute('SELECT id, name FROM branch').fetchall()
+    return render_template('add_courier.html', branches=branches)
+
+@app.route('/edit_courier/<int:courier_id>', methods=['GET', 'POST'])
+def edit_courier(courier_id):
+    """
+    Edit a courier's information.
+    ---
+    tags:
+      - Couriers
+    parameters:
+      - name: courier_id
+        in: path
+        type: integer
+        required: true
+        description: The courier's ID
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: The new name of the courier
+      - name: phone
+        in: formData
+        type: string
+        required: false
+        description: The new phone number of the courier
+      - name: branch_id
+        in: formData
+        type: integer
+        required: false
+        description: Branch the courier delivers for; empty to serve every branch
+    responses:
+      200:
+        description: Courier information successfully updated
+      404:
+        description: Courier not found
+    """
+    conn = get_db()
+    courier = conn.execute('SELECT * FROM user WHERE id = ? AND role = "courier"', (courier_id,)).fetchone()
+    
+    if not courier:
+        abort(404)  # Courier not found
+
+    if request.method == 'POST':
+        name = request.form['name']
+        phone = request.form['phone']
+        branch_id = request.form.get('branch_id', type=int)
+        conn.execute('UPDATE user SET name = ?, phone = ?, branch_id = ? WHERE id = ? AND role = "courier"',
+                     (name, phone, branch_id, courier_id))
+        conn.commit()
+        dispatch.couriers_changed()
+        return redirect(url_for('couriers'))
+
+    branches = conn.execute('SELECT id, name FROM branch').fetchall()
+    return render_template('edit_courier.html', courier=courier, branches=branches)
+    
+    courier = conn.execute('SELECT * FROM user WHERE id = ? AND role = "courier"', (courier_id,)).fetchone()
+
+    if courier is None:
+        abort(404)  # Courier not found
+
+    return render_template('edit_courier.html', courier=courier)
+
+@app.route('/delete_courier/<int:courier_id>', methods=['POST'])
+def delete_courier(courier_id):
+    """
+    Delete a courier from the database.
+    ---
+    tags:
+      - Couriers
+    parameters:
+      - name: courier_id
+        in: path
+        type: integer
+        required: true
+        description: The courier's ID
+    responses:
+      200:
+        description: Courier successfully deleted
+      404:
+        description: Courier not found
+    """
+    conn = get_db()
+    conn.execute('DELETE FROM user WHERE id = ? AND role = "courier"', (courier_id,))
+    conn.commit()
+    dispatch.couriers_changed()
+    return redirect(url_for('couriers'))
+
+@app.route('/couriers')
+def couriers():
+    """
+    Retrieves a list of all couriers.
+    ---
+    tags:
+      - Courier Management
+    responses:
+      200:
+        description: A list of couriers
+      500:
+        description: Error retrieving couriers
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute('''SELECT user.*, branch.name AS branch_name FROM user
+                   LEFT JOIN branch ON user.branch_id = branch.id
+                   WHERE user.role = 'courier' ''')
+    couriers = cur.fetchall()
+    return render_template('couriers.html', couriers=couriers)
+
+# --- Order Management ---
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 500
+ORDER_STATUSES = ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
+
+def build_orders_query(status=None, user_id=None, cursor=None, limit=None, branch_id=None):
+    """Builds the /orders listing query, newest first.
+
+    ``cursor`` is the id of the last order already shown; paging by id keeps
+    every page an index range scan no matter how deep the client goes.
+    """
+    # The order lines are folded into one column by a correlated subquery, which
+    # only runs for the rows that make it onto the page.
+    query = '''
+        SELECT orders.id, orders.description, orders.status, orders.total, user.name AS user_name,
+               branch.name AS branch_name, courier.name AS courier_name,
+               (SELECT group_concat(dishes.name || ' x' || order_items.quantity, ', ')
+                FROM order_items
+                LEFT JOIN dishes ON order_items.dish_id = dishes.id
+                WHERE order_items.order_id = orders.id) AS items
+        FROM orders 
+        LEFT JOIN user ON orders.user_id = user.id
+        LEFT JOIN branch ON orders.branch_id = branch.id
+        LEFT JOIN user AS courier ON orders.courier_id = courier.id
+    '''
+    conditions, params = [], []
+    if status:
+        conditions.append('orders.status = ?')
+        params.append(status)
+    if user_id:
+        conditions.append('orders.user_id = ?')
+        params.append(user_id)
+    if branch_id:
+        conditions.append('orders.branch_id = ?')
+        params.append(branch_id)
+    if cursor:
+        conditions.append('orders.id < ?')
+        params.append(cursor)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY orders.id DESC'
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+@app.route('/orders')
+def orders():
+    """
+    Retrieves a page of orders with detailed information, newest first.
+    ---
+    tags:
+      - Order Management
+    parameters:
+      - name: status
+        in: query
+        type: string
+        required: false
+        enum: ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
+        description: Only list orders with this status
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed by this user
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed at this branch
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Id of the last order on the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 50, at most 500)
+    responses:
+      200:
+        description: A detailed list of orders
+      500:
+        description: Error retrieving orders
+    """
+    status = request.args.get('status')
+    user_id = request.args.get('user_id', type=int)
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', ORDERS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, ORDERS_MAX_PAGE_SIZE))
+    branch_id = request.args.get('branch_id', type=int)
+
+    # Fetch one extra row to find out whether there is a next page. Every
+    # partition returns at most that many rows, and the newest are merged.
+    query, params = build_orders_query(status, user_id, cursor, limit + 1, branch_id)
+    orders = list(itertools.islice(partitions.fan_out(query, params, branch_id, descending=True, history=True),
+                                   limit + 1))
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = orders[-1]['id']
+    return render_template('orders.html', orders=orders, statuses=ORDER_STATUSES, status=status, user_id=user_id,
+                           branch_id=branch_id, branches=get_db().execute('SELECT id, name FROM branch').fetchall(),
+                           limit=limit, next_cursor=next_cursor)
+
+@app.route('/orders/export')
+def export_orders():
+    """
+    Renders every matching order in one page, streamed as it is read.
+    ---
+    tags:
+      - Order Management
+    parameters:
+      - name: status
+        in: query
+        type: string
+        required: false
+        enum: ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
+        description: Only list orders with this status
+      - name: user_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed by this user
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only list orders placed at this branch
+    responses:
+      200:
+        description: A detailed list of all matching orders
+    """
+    status = request.args.get('status')
+    user_id = request.args.get('user_id', type=int)
+    branch_id = request.args.get('branch_id', type=int)
+
+    query, params = build_orders_query(status, user_id, branch_id=branch_id)
+    # The cursors are iterated lazily by the template, so only one row per partition is held at a time
+    orders = partitions.fan_out(query, params, branch_id, descending=True, history=True)
+    branches = get_db().execute('SELECT id, name FROM branch').fetchall()
+    return Response(stream_template('orders.html', orders=orders, statuses=ORDER_STATUSES, status=status,
+                                    user_id=user_id, branch_id=branch_id, branches=branches, export=True))
+
+@app.route('/create_user', methods=['GET', 'POST'])
+def create_user():
+    """
+    Creates a new user in the database.
+    ---
+    tags:
+      - User Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Full name of the user
+      - name: phone
+        in: formData
+        type: string
+        required: true
+        description: Phone number of the user
+      - name: role
+        in: formData
+        type: string
+        required: true
+        description: Role of the user (kitchen, administration, courier, user)
+    responses:
+      200:
+        description: User successfully created
+      400:
+        description: Error with the provided data
+    """
+    if request.method == 'POST':
+        name = request.form['name']
+        phone = request.form['phone']
+        role = request.form['role']
+
+        # Validating the role
+        if role not in ['kitchen', 'administration', 'courier', 'user']:
+            return "Invalid role specified", 400
+
+        conn = get_db()
+        conn.execute('INSERT INTO user (name, phone, role) VALUES (?, ?, ?)', (name, phone, role))
+        conn.commit()
+        return redirect(url_for('index'))
+
+    return render_template('create_user.html')
+
+def parse_cart():
+    """Reads the order lines of a make_order request as [(dish_id, quantity)].
+
+    Accepts a JSON body with an ``items`` list, or form fields where every
+    ``dish_id`` is paired with the ``quantity`` at the same position (a lone
+    ``dish_id`` without quantities orders one of it). Repeated dishes are merged.
+    """
+    if request.is_json:
+        items = request.json.get('items', [])
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("items must be a list of objects")
+        lines = [(item.get('dish_id'), item.get('quantity', 1)) for item in items]
+    else:
+        dish_ids = request.form.getlist('dish_id')
+        quantities = request.form.getlist('quantity') or ['1'] * len(dish_ids)
+        if len(quantities) != len(dish_ids):
+            raise ValueError("Every dish_id needs a quantity")
+        lines = zip(dish_ids, quantities)
+
+    cart = {}
+    for dish_id, quantity in lines:
+        try:
+            dish_id, quantity = int(dish_id), int(quantity or 0)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid dish or quantity")
+        if quantity < 0:
+            raise ValueError("Invalid dish or quantity")
+        if quantity:
+            cart[dish_id] = cart.get(dish_id, 0) + quantity
+    return list(cart.items())
+
+@app.route('/make_order', methods=['GET', 'POST'])
+def make_order():
+    """
+    Create a new order from a cart of dishes.
+    ---
+    tags:
+      - Order Management
+    consumes:
+      - application/x-www-form-urlencoded
+      - application/json
+    parameters:
+      - name: description
+        in: formData
+        type: string
+        required: true
+        description: Description of the order
+      - name: user_id
+        in: formData
+        type: integer
+        required: true
+        description: User ID who is making the order
+      - name: dish_id
+        in: formData
+        type: array
+        items:
+          type: integer
+        collectionFormat: multi
+        required: true
+        description: Dish IDs in the cart
+      - name: quantity
+        in: formData
+        type: array
+        items:
+          type: integer
+        collectionFormat: multi
+        required: false
+        description: Quantity of each dish, in the same order as dish_id
+      - name: branch_id
+        in: formData
+        type: integer
+        required: false
+        description: Branch the order is placed at; required when orders are partitioned by branch
+      - name: promocode
+        in: formData
+        type: string
+        required: false
+        description: Promo code whose discount applies to the order total
+    responses:
+      201:
+        description: Order successfully created (JSON requests)
+      302:
+        description: Order successfully created
+      400:
+        description: Error in order creation, an unknown branch, or an unknown or used-up promo code
+    """
+    conn = get_db(readonly=True)
+    partitioned = partitions.enabled()
+    if request.method == 'POST':
+        if request.is_json and not isinstance(request.json, dict):
+            return "The request body must be a JSON object", 400
+        data = request.json if request.is_json else request.form
+        description = data.get('description')
+        user_id = data.get('user_id')
+        try:
+            cart = parse_cart()
+        except ValueError as e:
+            return str(e), 400
+        if not cart:
+            return "The order has no dishes", 400
+
+        branch_id = data.get('branch_id') or None
+        if branch_id is not None:
+            try:
+                branch_id = int(branch_id)
+            except (TypeError, ValueError):
+                return "Invalid branch_id", 400
+            if not conn.execute('SELECT 1 FROM branch WHERE id = ?', (branch_id,)).fetchone():
+                return "Unknown branch", 400
+            if partitioned and branch_id > partitions.MAX_BRANCH_ID:
+                return f"Branch ids above {partitions.MAX_BRANCH_ID} can't be partitioned", 400
+        elif partitioned:
+            return "branch_id is required when orders are partitioned by branch", 400
+
+        dish_ids = [dish_id for dish_id, _ in cart]
+        placeholders = ', '.join('?' * len(dish_ids))
+        prices = dict(conn.execute(f'SELECT id, price FROM dishes WHERE id IN ({placeholders})', dish_ids).fetchall())
+        if len(prices) != len(dish_ids):
+            return "Unknown dish in order", 400
+        lines = [(dish_id, quantity, prices[dish_id]) for dish_id, quantity in cart]
+        total = sum(quantity * price for _, quantity, price in lines)
+
+        promo_id, discount = None, 0
+        code = data.get('promocode')
+        if code is not None and not isinstance(code, str):
+            return "promocode must be a string", 400
+        if code:
+            try:
+                promo = promo_codes.validate(conn, code)
+            except promo_codes.PromoCodeError as e:
+                return str(e), 400
+            promo_id = promo['id']
+            total, discount = promo_codes.apply_discount(total, promo['discount'])
+
+        # Header, lines and the promo use go in one transaction, so the whole cart costs a single commit
+        def insert_order(conn):
+            if promo_id is not None:
+                promo_codes.redeem(conn, promo_id)
+            # Without partitions the id is left to AUTOINCREMENT
+            id_sql, id_params = partitions.next_order_id(branch_id) if partitioned else ('?', (None,))
+            cur = conn.execute('INSERT INTO orders (id, description, user_id, status, total, promocode_id, discount, '
+                               f'branch_id, created_at) VALUES ({id_sql}, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)',
+                               id_params + (description, user_id, 'Pending', total, promo_id, discount, branch_id))
+            conn.executemany('INSERT INTO order_items (order_id, dish_id, quantity, unit_price) VALUES (?, ?, ?, ?)',
+                             [(cur.lastrowid, dish_id, quantity, price) for dish_id, quantity, price in lines])
+            return cur.lastrowid
+
+        try:
+            order_id = partitions.write(branch_id if partitioned else None, insert_order)
+        except promo_codes.PromoCodeError as e:
+            return str(e), 400
+        finally:
+            if promo_id is not None:
+                promo_codes.get_cache().invalidate(promo['code'])  # its use count changed
+        kitchen_feed.notify()
+        if request.is_json:
+            return jsonify(id=order_id, total=total, discount=discount), 201
+        return redirect(url_for('orders'))
+
+    # Fetching users and dishes for the form
+    users = conn.execute('SELECT id, name FROM user WHERE role = "user"').fetchall()
+    dishes = conn.execute('SELECT id, name, price FROM dishes').fetchall()
+    branches = conn.execute('SELECT id, name FROM branch').fetchall()
+    return render_template('make_order.html', users=users, dishes=dishes, branches=branches,
+                           branch_required=partitioned)
+
+
+@app.route('/send_order_to_kitchen/<int:order_id>', methods=['POST'])
+def send_order_to_kitchen(order_id):
+    """
+    Updates the status of an order to 'In Kitchen'.
+    ---
+    tags:
+      - Order Management
+    parameters:
+      - name: order_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the order
+    responses:
+      200:
+        description: Order status updated to 'In Kitchen'
+      404:
+        description: Order not found
+    """
+    # Send order to kitchen logic; nothing updated means the order doesn't exist
+    updated = partitions.write_order(order_id, lambda conn: conn.execute(
+        'UPDATE orders SET status = ? WHERE id = ?', ('In Kitchen', order_id)).rowcount)
+    if not updated:
+        abort(404)  # Not found
+    kitchen_feed.notify()
+    return redirect(url_for('orders'))
+
+KITCHEN_KEEPALIVE = 15  # seconds between comments that keep idle streams open
+
+@app.route('/kitchen/stream')
+def kitchen_stream():
+    """
+    Server-Sent Events feed of order creations and status changes.
+    ---
+    tags:
+      - Order Management
+    produces:
+      - text/event-stream
+    parameters:
+      - name: Last-Event-ID
+        in: header
+        type: integer
+        required: false
+        description: Replay the events after this one before streaming live events
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: With orders partitioned by branch, stream this branch's events
+    responses:
+      200:
+        description: An endless stream of order_created and status_changed events
+      404:
+        description: Branch not found
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    branch_id = request.args.get('branch_id', type=int)
+    path = None
+    if branch_id is not None and partitions.enabled():
+        # Event ids are per database file, so a partition has a feed of its own
+        if not get_db().execute('SELECT 1 FROM branch WHERE id = ?', (branch_id,)).fetchone():
+            abort(404)
+        partitions.get_pool(branch_id, create=True)
+        path = partitions.path(branch_id)
+    feed = kitchen_feed.get_feed(path=path)
+    # Subscribe before replaying so nothing committed in between is missed
+    subscriber = feed.subscribe()
+    backlog = feed.replay(last_event_id) if last_event_id is not None else []
+
+    def generate():
+        sent = last_event_id or 0
+        try:
+            yield 'retry: 3000\n\n'
+            for event in backlog:
+                yield kitchen_feed.format_event(event)
+                sent = event['id']
+            while True:
+                try:
+                    event = subscriber.get(timeout=KITCHEN_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    return
+                if event['id'] > sent:
+                    yield kitchen_feed.format_event(event)
+                    sent = event['id']
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/kitchen/board')
+def kitchen_board_view():
+    """
+    Shows how much of each dish is pending, in the kitchen and ready right now.
+    ---
+    tags:
+      - Order Management
+    parameters:
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only count this branch's orders (0 for orders without a branch)
+    responses:
+      200:
+        description: Open quantities per dish and status
+    """
+    branch_id = request.args.get('branch_id', type=int)
+    branches = get_db().execute('SELECT id, name FROM branch').fetchall()
+    return render_template('kitchen_board.html', board=kitchen_board.read(branch_id),
+                           statuses=kitchen_board.STATUSES, branches=branches, branch_id=branch_id)
+
+@app.route('/order_details/<int:order_id>')
+def order_details(order_id):
+    """
+    Retrieves details for a specific order.
+    ---
+    tags:
+      - Order Management
+    parameters:
+      - name: order_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the order
+    responses:
+      200:
+        description: Details of the specified order
+      404:
+        description: Order not found
+    """
+    # Header and lines come back from one query; header columns repeat on every line.
+    # Orders that aren't live any more are looked up in the archive.
+    rows = None
+    for conn in partitions.lookup_dbs(order_id):
+        rows = conn.execute('''
+            SELECT orders.id, orders.description, orders.status, orders.total, user.name AS user_name,
+                   branch.name AS branch_name, courier.name AS courier_name,
+                   order_items.dish_id, dishes.name AS dish_name, order_items.quantity, order_items.unit_price
+            FROM orders
+            LEFT JOIN user ON orders.user_id = user.id
+            LEFT JOIN branch ON orders.branch_id = branch.id
+            LEFT JOIN user AS courier ON orders.courier_id = courier.id
+            LEFT JOIN order_items ON order_items.order_id = orders.id
+            LEFT JOIN dishes ON order_items.dish_id = dishes.id
+            WHERE orders.id = ?
+            ORDER BY order_items.id
+        ''', (order_id,)).fetchall()
+        if rows:
+            break
+    if not rows:
+        abort(404)  # Order not found
+    items = [row for row in rows if row['dish_id'] is not None]
+    return render_template('order_details.html', order_id=order_id, order=rows[0], items=items)
+
+# --- Branch Management ---
+@app.route('/add_branch', methods=['GET', 'POST'])
+def add_branch():
+    """
+    Adds a new branch location.
+    ---
+    tags:
+      - Branch Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: branch_name
+        in: formData
+        type: string
+        required: true
+        description: Name of the branch
+      - name: address
+        in: formData
+        type: string
+        required: true
+        description: Address of the branch
+      - name: phone
+        in: formData
+        type: string
+        required: true
+        description: Contact phone number for the branch
+    responses:
+      200:
+        description: Branch successfully added
+      400:
+        description: Error with the provided data
+    """
+    if request.method == 'POST':
+        branch_name = request.form['branch_name']
+        address = request.form['address']
+        phone = request.form['phone']  # Get phone number from the form
+
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute('INSERT INTO branch (name, address, phone) VALUES (?, ?, ?)', (branch_name, address, phone))
+        conn.commit()
+
+        return render_template('add_branch.html', message="Branch added successfully")
+
+    return render_template('add_branch.html')
+
+@app.route('/edit_branch/<int:branch_id>', methods=['GET', 'POST'])
+def edit_branch(branch_id):
+    """
+    Edits an existing branch location's information.
+    ---
+    tags:
+      - Branch Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: branch_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the branch
+      - name: branch_name
+        in: formData
+        type: string
+        required: true
+        description: Updated name of the branch
+      - name: address
+        in: formData
+        type: string
+        required: true
+        description: Updated address of the branch
+      - name: phone
+        in: formData
+        type: string
+        required: true
+        description: Updated contact phone number for the branch
+    responses:
+      200:
+        description: Branch information successfully updated
+      404:
+        description: Branch not found
+    """
+    conn = get_db()
+    cur = conn.cursor()
+
+    if request.method == 'POST':
+        branch_name = request.form['branch_name']
+        address = request.form['address']
+        phone = request.form['phone']
+
+        cur.execute('UPDATE branch SET name = ?, address = ?, phone = ? WHERE id = ?', 
+                    (branch_name, address, phone, branch_id))
+        conn.commit()
+        return redirect(url_for('admin_panel'))
+
+    # Fetch branch details for GET request
+    cur.execute('SELECT name, address, phone FROM branch WHERE id = ?', (branch_id,))
+    branch = cur.fetchone()
+
+    if branch is None:
+        abort(404)  # Branch not found
+
+    return render_template('edit_branch.html', branch=branch, branch_id=branch_id)
+
+
+@app.route('/delete_branch/<int:branch_id>', methods=['POST'])
+def delete_branch(branch_id):
+    """
+    Deletes a branch location from the database.
+    ---
+    tags:
+      - Branch Management
+    parameters:
+      - name: branch_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the branch to delete
+    responses:
+      200:
+        description: Branch successfully deleted
+      404:
+        description: Branch not found
+    """
+    # Logic to delete a branch
+    conn = get_db()
+    conn.execute('DELETE FROM branch WHERE id = ?', (branch_id,))
+    conn.commit()
+    return render_template('admin_panel.html')
+
+@app.route('/branches')
+def branches():
+    """
+    Retrieves a list of all branch locations.
+    ---
+    tags:
+      - Branch Management
+    responses:
+      200:
+        description: A list of branches
+      500:
+        description: Error retrieving branches
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM branch")
+    branches = cur.fetchall()
+    return render_template('branches.html', branches=branches)
+
+# --- Promo Code Management ---
+@app.route('/add_promocode', methods=['GET', 'POST'])
+def add_promocode():
+    """
+    Adds a new promo code to the database.
+    ---
+    tags:
+      - Promo Code Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: code
+        in: formData
+        type: string
+        required: true
+        description: The promo code
+      - name: discount
+        in: formData
+        type: number
+        required: true
+        description: The discount percentage for the promo code
+      - name: usage_limit
+        in: formData
+        type: integer
+        required: false
+        description: How many orders may use the code (unlimited if empty; 1 for single-use)
+    responses:
+      200:
+        description: Promo code successfully added
+      400:
+        description: Error with the provided data
+    """
+    conn = get_db()
+    cur = conn.cursor()
+
+    if request.method == 'POST':
+        code = request.form['code'].strip()
+        discount = request.form['discount']
+        usage_limit = request.form.get('usage_limit') or None
+        if usage_limit is not None and not (usage_limit.isdigit() and int(usage_limit) > 0):
+            return "Usage limit must be a positive number", 400
+        qr_code_blob = generate_qr_code(code)
+
+        try:
+            cur.execute('INSERT INTO promocodes (code, discount, qr_code, usage_limit) VALUES (?, ?, ?, ?)', 
+                        (code, discount, qr_code_blob, usage_limit))
+        except sqlite3.IntegrityError:
+            return "Promo code already exists", 400
+        conn.commit()
+        promo_codes.get_cache().invalidate(code)
+
+    # QR images are fetched separately from promocode_qr, so skip the blobs here
+    cur.execute('SELECT id, code, discount, usage_limit, used_count FROM promocodes')
+    promocodes = cur.fetchall()
+
+    return render_template('add_promocode.html', promocodes=promocodes)
+
+QR_CHUNK_SIZE = 64 * 1024
+QR_MAX_AGE = 365 * 24 * 60 * 60  # a promo's QR code never changes once stored
+
+@app.route('/promocode/<int:promo_id>/qr.png')
+def promocode_qr(promo_id):
+    """
+    Returns the QR code image of a promo code.
+    ---
+    tags:
+      - Promo Code Management
+    produces:
+      - image/png
+    parameters:
+      - name: promo_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the promo code
+    responses:
+      200:
+        description: The QR code image
+      304:
+        description: The image has not changed since the supplied ETag
+      404:
+        description: Promo code not found or has no QR code
+    """
+    conn = get_db()
+    row = conn.execute('SELECT length(qr_code) AS size, substr(qr_code, 1, 2) AS magic FROM promocodes WHERE id = ?',
+                       (promo_id,)).fetchone()
+    if row is None or not row['size']:
+        abort(404)
+
+    # Promo codes are never edited and ids are never reused, so id and size pin the content
+    etag = f"qr-{promo_id}-{row['size']}"
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        if hasattr(conn, 'blobopen'):
+            def generate():
+                with conn.blobopen('promocodes', 'qr_code', promo_id, readonly=True) as blob:
+                    while chunk := blob.read(QR_CHUNK_SIZE):
+                        yield chunk
+            body = stream_with_context(generate())
+        else:
+            body = conn.execute('SELECT qr_code FROM promocodes WHERE id = ?', (promo_id,)).fetchone()[0]
+        # Codes created before the switch to PNG were stored as JPEG
+        mimetype = 'image/jpeg' if row['magic'] == b'\xff\xd8' else 'image/png'
+        response = Response(body, mimetype=mimetype)
+        response.content_length = row['size']
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = QR_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/promocode/campaign', methods=['POST'])
+def start_promo_campaign():
+    """
+    Starts generating a bulk promo-code campaign in the background.
+    Posting an existing campaign name with the same settings resumes it.
+    ---
+    tags:
+      - Promo Code Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: name
+        in: formData
+        type: string
+        required: true
+        description: Unique name of the campaign
+      - name: count
+        in: formData
+        type: integer
+        required: true
+        description: Number of codes the campaign should have
+      - name: discount
+        in: formData
+        type: number
+        required: true
+        description: The discount percentage for every code
+      - name: prefix
+        in: formData
+        type: string
+        required: false
+        description: Prefix prepended to every generated code
+    responses:
+      202:
+        description: Campaign generation started
+      400:
+        description: Error with the provided data
+      409:
+        description: The campaign is already being generated
+    """
+    name = request.form['name']
+    count = request.form.get('count', type=int)
+    discount = request.form.get('discount', type=float)
+    if not count or count <= 0 or discount is None:
+        return "Invalid count or discount", 400
+
+    conn = get_db()
+    try:
+        campaign_id = promo_campaign.get_or_create_campaign(conn, name, discount, count)
+    except ValueError as e:
+        return str(e), 400
+
+    if not promo_campaign.start_campaign(app.config['DATABASE'], name, count, discount,
+                                         prefix=request.form.get('prefix', '')):
+        return "The campaign is already being generated", 409
+    return jsonify(id=campaign_id, status=url_for('promo_campaign_status', campaign_id=campaign_id)), 202
+
+@app.route('/promocode/campaign/<int:campaign_id>')
+def promo_campaign_status(campaign_id):
+    """
+    Reports how far generation of a promo-code campaign has got.
+    ---
+    tags:
+      - Promo Code Management
+    parameters:
+      - name: campaign_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the campaign
+    responses:
+      200:
+        description: Campaign settings, number of codes generated so far, and the state of the latest
+          background run in this worker (running, failed with its error, or finished with its throughput)
+      404:
+        description: Campaign not found
+    """
+    conn = get_db()
+    campaign = conn.execute('SELECT * FROM promo_campaigns WHERE id = ?', (campaign_id,)).fetchone()
+    if campaign is None:
+        abort(404)
+    generated = promo_campaign.campaign_progress(conn, campaign_id)
+    return jsonify(**dict(campaign), generated=generated, done=generated >= campaign['target_count'],
+                   run=promo_campaign.last_run(campaign['name']))
+
+@app.route('/promocode/validate')
+def validate_promocode():
+    """
+    Checks a promo code and previews its discount.
+    ---
+    tags:
+      - Promo Code Management
+    parameters:
+      - name: code
+        in: query
+        type: string
+        required: true
+        description: The promo code
+      - name: total
+        in: query
+        type: number
+        required: false
+        description: Order total to preview the discounted total for
+    responses:
+      200:
+        description: The code is valid; its discount and remaining uses
+      404:
+        description: Unknown or used-up promo code
+    """
+    try:
+        promo = promo_codes.validate(get_db(), request.args.get('code', ''))
+    except promo_codes.PromoCodeError as e:
+        return jsonify(valid=False, error=str(e)), 404
+    remaining = None if promo['usage_limit'] is None else promo['usage_limit'] - promo['used_count']
+    result = dict(valid=True, code=promo['code'], discount=promo['discount'], remaining_uses=remaining)
+    total = request.args.get('total', type=float)
+    if total is not None:
+        result['total'], result['discount_amount'] = promo_codes.apply_discount(total, promo['discount'])
+    return jsonify(result)
+
+@app.route('/delete_promocode/<int:promo_id>', methods=['POST'])
+def delete_promocode(promo_id):
+    """
+    Deletes an existing promo code from the database.
+    ---
+    tags:
+      - Promo Code Management
+    parameters:
+      - name: promo_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the promo code
+    responses:
+      200:
+        description: Promo code successfully deleted
+      404:
+        description: Promo code not found
+    """
+    conn = get_db()
+
+    # Delete the promocode; no row returned means it doesn't exist
+    deleted = conn.execute('DELETE FROM promocodes WHERE id = ? RETURNING code', (promo_id,)).fetchone()
+    if deleted is None:
+        abort(404)  # Not found
+    conn.commit()
+    promo_codes.get_cache().invalidate(deleted['code'])
+
+    return render_template('admin_panel.html')
+
+# --- Additional Features ---
+# Implement routes and logic for any additional features required
+
+def get_dishes():
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM dishes")
+    dishes = cur.fetchall()
+    return dishes
+
+MENU_CACHE_MAX_AGE = 60  # seconds clients may reuse /menu before revalidating
+MENU_CACHE_SIZE = 256  # rendered pages kept; any integer filter makes a new one
+
+# Rendered /menu pages keyed by (menu version, category_id, sub_category_id),
+# least recently used first. Entries for an older menu version can never be
+# hit again and are dropped.
+_menu_cache = collections.OrderedDict()
+_menu_cache_lock = threading.Lock()
+
+def get_menu_version(conn):
+    return conn.execute('SELECT version FROM menu_version WHERE id = 1').fetchone()[0]
+
+def render_menu(conn, category_id, sub_category_id):
+    cur = conn.cursor()
+
+    # Fetch categories and sub-categories for the filter dropdowns
+    cur.execute('SELECT * FROM categories')
+    categories = cur.fetchall()
+    cur.execute('SELECT * FROM sub_category')
+    sub_categories = cur.fetchall()
+
+    # Fetch dishes, filtered by category / sub-category if selected
+    query = 'SELECT * FROM dishes'
+    conditions, params = [], []
+    if category_id:
+        conditions.append('category_id = ?')
+        params.append(category_id)
+    if sub_category_id:
+        conditions.append('sub_category_id = ?')
+        params.append(sub_category_id)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    cur.execute(query, params)
+    dishes = cur.fetchall()
+
+    return render_template('menu.html', categories=categories, sub_categories=sub_categories, dishes=dishes,
+                           selected_category_id=category_id, selected_sub_category_id=sub_category_id)
+
+@app.route('/menu', methods=['GET', 'POST'])
+def menu():
+    """
+    Retrieves the menu items, optionally filtered by category and sub-category.
+    Rendered pages are cached per filter until the menu changes, and carry an
+    ETag so clients can revalidate with If-None-Match.
+    ---
+    tags:
+      - Menu Management
+    parameters:
+      - name: category_id
+        in: query
+        type: integer
+        required: false
+        description: Optional category ID to filter the menu items
+      - name: sub_category_id
+        in: query
+        type: integer
+        required: false
+        description: Optional sub-category ID to filter the menu items
+    responses:
+      200:
+        description: A list of menu items, optionally filtered by category
+      303:
+        description: POSTed filters are redirected to the equivalent GET URL
+      304:
+        description: The menu has not changed since the supplied ETag
+      500:
+        description: Error retrieving menu items
+    """
+    if request.method == 'POST':
+        # Old-style filter form; redirect so the result is cacheable.
+        return redirect(url_for('menu', category_id=request.form.get('category_id') or None,
+                                sub_category_id=request.form.get('sub_category_id') or None), code=303)
+
+    category_id = request.args.get('category_id', type=int)
+    sub_category_id = request.args.get('sub_category_id', type=int)
+
+    conn = get_db()
+    version = get_menu_version(conn)
+    key = (version, category_id, sub_category_id)
+    with _menu_cache_lock:
+        cached = _menu_cache.get(key)
+        if cached is not None:
+            _menu_cache.move_to_end(key)
+    if cached is None:
+        body = render_menu(conn, category_id, sub_category_id)
+        cached = (body, hashlib.sha1(body.encode()).hexdigest())
+        with _menu_cache_lock:
+            for stale in [k for k in _menu_cache if k[0] != version]:
+                del _menu_cache[stale]
+            _menu_cache[key] = cached
+            _menu_cache.move_to_end(key)
+            while len(_menu_cache) > MENU_CACHE_SIZE:
+                _menu_cache.popitem(last=False)
+
+    body, etag = cached
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = MENU_CACHE_MAX_AGE
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_TERMS = 10
+SEARCH_RANK_MAX = 2000  # matches beyond which results are not ranked
+
+def search_query(text):
+    """Turns free text into an FTS5 query that prefix-matches every word."""
+    terms = re.findall(r'\w+', text)[:SEARCH_MAX_TERMS]
+    # Words contain no quotes, so quoting them is enough to neutralise FTS5 syntax
+    return ' '.join(f'"{term}"*' for term in terms)
+
+@app.route('/menu/search')
+def search_menu():
+    """
+    Finds dishes by name, category or sub-category for type-ahead.
+    Every word is matched as a prefix; results are ranked with dish names
+    weighing more than category names.
+    ---
+    tags:
+      - Menu Management
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Search text, e.g. "gre te"
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of results (default 20, at most 100)
+    responses:
+      200:
+        description: Matching dishes, best match first
+      304:
+        description: The results have not changed since the supplied ETag
+    """
+    query = search_query(request.args.get('q', ''))
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), SEARCH_MAX_LIMIT))
+    results = []
+    if query:
+        conn = get_db()
+        # Ranking has to score every match, so a query as broad as one or two
+        # letters over a large menu just lists the first matches instead.
+        matches = conn.execute('SELECT count(*) FROM (SELECT 1 FROM dish_search WHERE dish_search MATCH ? LIMIT ?)',
+                               (query, SEARCH_RANK_MAX + 1)).fetchone()[0]
+        order = 'bm25(dish_search, 10.0, 2.0, 2.0)' if matches <= SEARCH_RANK_MAX else 'dish_search.rowid'
+        cur = conn.execute(f'''SELECT dishes.id, dishes.name, dishes.price,
+                                      dish_search.category, dish_search.sub_category
+                               FROM dish_search JOIN dishes ON dishes.id = dish_search.rowid
+                               WHERE dish_search MATCH ?
+                               ORDER BY {order}
+                               LIMIT ?''', (query, limit))
+        results = [dict(row) for row in cur]
+    response = jsonify(results)
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = MENU_CACHE_MAX_AGE
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+@app.route('/admin/menu/import', methods=['POST'])
+def import_menu():
+    """
+    Bulk-imports categories, sub-categories and dishes from CSV or JSON Lines.
+    The upload is parsed as it arrives and written in batched transactions;
+    dishes are matched by category, sub-category and name and updated in place.
+    ---
+    tags:
+      - Menu Management
+    consumes:
+      - multipart/form-data
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: The menu file; alternatively send it as the raw request body
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: ['csv', 'jsonl']
+        description: File format (defaults to the uploaded file's extension, else csv)
+    responses:
+      200:
+        description: Import statistics
+      400:
+        description: Malformed menu file
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream, filename = request.stream, None
+    fmt = request.args.get('format') or menu_io.format_from_name(filename)
+    if fmt not in menu_io.FORMATS:
+        return "Unsupported format", 400
+
+    conn = get_db()
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        stats = menu_io.import_menu(conn, text, fmt)
+    except (ValueError, KeyError, TypeError, csv.Error) as e:
+        return f"Malformed menu file: {e}", 400
+    return jsonify(stats)
+
+@app.route('/admin/menu/export')
+def export_menu():
+    """
+    Streams the whole menu as CSV or JSON Lines.
+    ---
+    tags:
+      - Menu Management
+    produces:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: ['csv', 'jsonl']
+        description: File format (default csv)
+    responses:
+      200:
+        description: The menu, one dish per record
+      400:
+        description: Unsupported format
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in menu_io.FORMATS:
+        return "Unsupported format", 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    conn = get_db()
+    return Response(stream_with_context(menu_io.export_records(conn, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=menu.{fmt}'})
+
+@app.route('/admin/slow_queries', methods=['GET', 'POST'])
+def slow_query_report():
+    """
+    Shows the statements that ran past the slow-query threshold, grouped by
+    normalized text and ordered by total time, with their query plans.
+    A POST clears the collected statements.
+    ---
+    tags:
+      - Monitoring
+    responses:
+      200:
+        description: Slow statements with counts, timings and query plans
+      303:
+        description: Statements cleared; redirects to the report
+    """
+    if request.method == 'POST':
+        slow_queries.reset()
+        return redirect(url_for('slow_query_report'), code=303)
+    return render_template('slow_queries.html', offenders=slow_queries.worst_offenders(),
+                           threshold_ms=app.config['SLOW_QUERY_MS'])
+
+@app.route('/admin/backups', methods=['GET', 'POST'])
+def backups():
+    """
+    Lists the database snapshots, newest first, or takes a new one on POST.
+    The copy runs online, in small steps, and every file is integrity-checked
+    before the snapshot is kept; older snapshots beyond BACKUP_KEEP are deleted.
+    ---
+    tags:
+      - Administration
+    responses:
+      200:
+        description: The snapshots with their files and sizes in bytes
+      201:
+        description: The new snapshot, and the snapshots pruned to make room
+      409:
+        description: A backup is already running
+      500:
+        description: A copied file failed its integrity check; no snapshot was kept
+    """
+    if request.method == 'POST':
+        try:
+            return jsonify(backup.backup()), 201
+        except backup.BackupRunning as e:
+            return str(e), 409
+        except backup.BackupError as e:
+            return str(e), 500
+    backup_dir = app.config['BACKUP_DIR']
+    return jsonify([dict(name=name, files=backup.snapshot_files(os.path.join(backup_dir, name)))
+                    for name in reversed(backup.snapshots(backup_dir))])
+
+@app.route('/update_order_status/<int:order_id>', methods=['POST'])
+def update_order_status(order_id):
+    """
+    Updates the status of a specific order.
+    ---
+    tags:
+      - Order Management
+    consumes:
+      - application/x-www-form-urlencoded
+    parameters:
+      - name: order_id
+        in: path
+        type: integer
+        required: true
+        description: The unique identifier for the order
+      - name: status
+        in: formData
+        type: string
+        required: true
+        enum: ['Pending', 'In Kitchen', 'Ready for Pickup', 'Completed']
+        description: The new status for the order
+    responses:
+      200:
+        description: Order status successfully updated
+      400:
+        description: Missing or unknown status
+      404:
+        description: Order not found
+    """
+    status = request.form.get('status')
+    if status not in ORDER_STATUSES:
+        return "Invalid status", 400
+
+    # Update the order status; no row returned means the order doesn't exist
+    updated = partitions.write_order(order_id, lambda conn: conn.execute(
+        'UPDATE orders SET status = ? WHERE id = ? RETURNING branch_id', (status, order_id)).fetchone())
+    if not updated:
+        abort(404)  # Not found
+    kitchen_feed.notify()
+    # Ready orders get a courier, completed ones free theirs up
+    dispatch.status_changed(order_id, status, updated[0])
+
+    return redirect(url_for('orders'))
+
+@app.route('/dispatch', methods=['GET', 'POST'])
+def dispatch_board():
+    """
+    Shows courier loads, and assigns waiting ready orders on POST.
+    ---
+    tags:
+      - Courier Management
+    responses:
+      200:
+        description: Each courier's open orders and the number of orders waiting for a courier
+      302:
+        description: Waiting orders were assigned where a courier had room
+    """
+    if request.method == 'POST':
+        dispatch.assign_waiting(dispatch.sync(force=True))
+        return redirect(url_for('dispatch_board'))
+
+    loads, waiting = dispatch.sync().snapshot()
+    names = {row['id']: row['name'] for row in
+             get_db().execute("SELECT id, name FROM user WHERE role = 'courier'")}
+    branches = dict(get_db().execute('SELECT id, name FROM branch').fetchall())
+    loads.sort(key=lambda courier: (-courier['load'], courier['courier_id']))
+    return render_template('dispatch.html', loads=loads, waiting=waiting, names=names, branches=branches,
+                           max_load=app.config['DISPATCH_MAX_LOAD'])
+
+REPORT_DAYS = 30  # default report period, ending today
+
+@app.route('/reports')
+def sales_reports():
+    """
+    Daily revenue, orders per status and top dishes per category.
+    ---
+    tags:
+      - Reports
+    parameters:
+      - name: start
+        in: query
+        type: string
+        format: date
+        required: false
+        description: First day of the period, YYYY-MM-DD (UTC; default 29 days before end)
+      - name: end
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Last day of the period, YYYY-MM-DD (UTC; default today)
+      - name: branch_id
+        in: query
+        type: integer
+        required: false
+        description: Only report on this branch (0 for orders without a branch)
+    responses:
+      200:
+        description: The report for the period
+      400:
+        description: Invalid date
+    """
+    try:
+        end = datetime.date.fromisoformat(request.args['end']) if request.args.get('end') \
+            else datetime.datetime.now(datetime.timezone.utc).date()
+        start = datetime.date.fromisoformat(request.args['start']) if request.args.get('start') \
+            else end - datetime.timedelta(days=REPORT_DAYS - 1)
+    except ValueError:
+        return "Dates must be given as YYYY-MM-DD", 400
+    branch_id = request.args.get('branch_id', type=int)
+
+    days = reports.daily_sales(start.isoformat(), end.isoformat(), branch_id)
+    statuses = {}
+    for day in days:
+        for status, count in day['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    branches = get_db().execute('SELECT id, name FROM branch').fetchall()
+    return render_template('reports.html', days=days, statuses=statuses,
+                           revenue=round(sum(day['revenue'] for day in days), 2),
+                           top_dishes=reports.top_dishes(start.isoformat(), end.isoformat(), branch_id),
+                           start=start, end=end, branch_id=branch_id, branches=branches,
+                           order_statuses=ORDER_STATUSES)
+
+startup.mark('routes')
+apispec.load(app, swagger)
+startup.mark('apispec')
+startup.report_if_requested()
+
+if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
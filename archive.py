@@ -0,0 +1,185 @@
+"""Moves old completed orders out of the live order databases.
+
+Orders only ever grow, so every listing, join and status update would work
+against an ever larger table. This job moves the orders that were completed
+and placed more than ``RETENTION_DAYS`` ago, with their order lines, into an
+archive file next to each order database (``cooksoo_cafe_archive.db``,
+``orders_branch_<id>_archive.db``), and hands the freed pages back to the
+file system with incremental vacuum. Listings and order lookups read the
+archives too (see partitions.py); the sales rollups keep counting archived
+orders. Run it once, or keep it running::
+
+    python archive.py run --retention-days 90
+    python archive.py run --every 3600
+
+Orders move in batches of ``BATCH_SIZE``, each copied in one short write
+transaction and deleted in the next, with a pause in between, so writers
+are never held up for long. SQLite doesn't commit a transaction across WAL
+files atomically; copying first means an interruption can leave an order in
+both files (readers show it once, and the next run finishes the move) but
+never in neither.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import database_create
+import db
+import partitions
+
+RETENTION_DAYS = 90
+BATCH_SIZE = 500
+BATCH_PAUSE = 0.05  # seconds between batches, for writers waiting on the lock
+VACUUM_PAGES = 1000  # pages freed per incremental vacuum step
+INCREMENTAL = 2  # PRAGMA auto_vacuum
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def archive_orders(conn, cutoff, batch_size=BATCH_SIZE, pause=BATCH_PAUSE, undated=False, log=None):
+    """Moves the completed orders placed before ``cutoff`` ('YYYY-MM-DD HH:MM:SS',
+    UTC) from ``main`` to the attached ``archive`` database.
+
+    ``undated`` also moves completed orders from before orders had a
+    timestamp. Returns the number of orders moved.
+    """
+    log = log or (lambda message: None)
+    order_columns = ', '.join(column for column in _columns(conn, 'main', 'orders')
+                              if column in _columns(conn, 'archive', 'orders'))
+    item_columns = ', '.join(column for column in _columns(conn, 'main', 'order_items') if column != 'id')
+    age = '(created_at < ? OR created_at IS NULL)' if undated else 'created_at < ?'
+    moved = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ids = [row[0] for row in conn.execute(f'''SELECT id FROM main.orders
+                                                      WHERE status = 'Completed' AND {age}
+                                                      ORDER BY id LIMIT ?''', (cutoff, batch_size))]
+            batch = json.dumps(ids)
+            if ids:
+                # A copy left over from an interrupted run is replaced, lines and all
+                conn.execute(f'''INSERT OR REPLACE INTO archive.orders ({order_columns})
+                                 SELECT {order_columns} FROM main.orders
+                                 WHERE id IN (SELECT value FROM json_each(?))''', (batch,))
+                conn.execute('DELETE FROM archive.order_items WHERE order_id IN (SELECT value FROM json_each(?))',
+                             (batch,))
+                conn.execute(f'''INSERT INTO archive.order_items ({item_columns})
+                                 SELECT {item_columns} FROM main.order_items
+                                 WHERE order_id IN (SELECT value FROM json_each(?))
+                                 ORDER BY id''', (batch,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if not ids:
+            return moved
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Only what reached the archive, and is still completed
+            copied = '''id IN (SELECT value FROM json_each(?)) AND status = 'Completed'
+                        AND id IN (SELECT id FROM archive.orders)'''
+            conn.execute(f'DELETE FROM main.order_items WHERE order_id IN (SELECT id FROM main.orders WHERE {copied})',
+                         (batch,))
+            moved += conn.execute(f'DELETE FROM main.orders WHERE {copied}', (batch,)).rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        log(f'moved {moved} orders')
+        time.sleep(pause)
+
+
+def reclaim(conn, pages=VACUUM_PAGES, pause=BATCH_PAUSE):
+    """Returns the free pages of the main database to the file system, a few
+    at a time. Returns the number of pages freed, or None if the file wasn't
+    created with incremental vacuum (see ``enable_incremental_vacuum``)."""
+    if conn.execute('PRAGMA main.auto_vacuum').fetchone()[0] != INCREMENTAL:
+        return None
+    freed = 0
+    while True:
+        free = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+        if not free:
+            break
+        conn.execute(f'PRAGMA main.incremental_vacuum({min(free, pages)})').fetchall()
+        freed += min(free, pages)
+        time.sleep(pause)
+    # Moves the shrunk pages from the WAL back into the file without waiting on readers
+    conn.execute('PRAGMA main.wal_checkpoint(PASSIVE)').fetchall()
+    return freed
+
+
+def enable_incremental_vacuum(path):
+    """Switches an existing file to incremental vacuum, unless it has it
+    already. This rewrites the whole file and locks it while doing so; new
+    files get it on creation."""
+    conn = db.connect(path)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def archive_database(path, cutoff, batch_size=BATCH_SIZE, undated=False, log=None):
+    """Archives one order database; returns (orders moved, pages freed or None)."""
+    archive = partitions.archive_path(path)
+    database_create.create_database(archive, database_create.ARCHIVE_MIGRATIONS)
+    conn = db.connect(path, attach={'archive': archive})
+    conn.row_factory = None
+    conn.isolation_level = None  # transactions are managed by hand
+    try:
+        moved = archive_orders(conn, cutoff, batch_size, undated=undated, log=log)
+        return moved, reclaim(conn) if moved else 0
+    finally:
+        conn.close()
+
+
+def order_databases(database, partition_dir):
+    paths = [database]
+    if os.path.isdir(partition_dir):
+        paths += [os.path.join(partition_dir, name) for name in sorted(os.listdir(partition_dir))
+                  if partitions.FILE_RE.match(name)]
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['run'])
+    parser.add_argument('--database', default=database_create.DATABASE)
+    parser.add_argument('--partition-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                partitions.PARTITION_DIR))
+    parser.add_argument('--retention-days', type=float, default=RETENTION_DAYS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--undated', action='store_true',
+                        help='also archive completed orders placed before orders had a timestamp')
+    parser.add_argument('--every', type=float, metavar='SECONDS', help='keep running, archiving this often')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='first convert databases without incremental vacuum (rewrites each file once)')
+    args = parser.parse_args(argv)
+
+    database_create.create_database(args.database)
+    while True:
+        cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - args.retention_days * 86400))
+        for path in order_databases(args.database, args.partition_dir):
+            if path != args.database:
+                database_create.create_database(path, database_create.PARTITION_MIGRATIONS)
+            if args.enable_incremental_vacuum:
+                enable_incremental_vacuum(path)
+            moved, freed = archive_database(path, cutoff, args.batch_size, args.undated,
+                                            log=lambda message: print(f'{path}: {message}', file=sys.stderr))
+            note = (', no incremental vacuum (see --enable-incremental-vacuum)' if freed is None
+                    else f', {freed} pages freed')
+            print(f'{path}: {moved} orders archived' + note)
+        if args.every is None:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Online backups of the order and menu databases.
+
+A snapshot is copied with SQLite's backup API a few pages at a time, with a
+pause after every step, while the application keeps running. The source
+connection holds one read transaction for the whole copy: in WAL mode that
+doesn't block writers, and it keeps the copy consistent, where a backup that
+let go between steps would start over after every order written meanwhile.
+(The WAL can't be checkpointed past that read until the copy is done.)
+
+Every snapshot is a directory under ``BACKUP_DIR`` named after its UTC time,
+holding the main database and, if there are any, the order partitions and
+archives under the same relative paths. Each file is checked with ``PRAGMA
+integrity_check`` before it is gzipped; only the newest ``BACKUP_KEEP``
+snapshots are kept::
+
+    python backup.py create
+    python backup.py verify [SNAPSHOT ...]
+    python backup.py list
+
+To restore, stop the application, gunzip the files of a snapshot and put
+them in place of the live ones (removing any ``-wal``/``-shm`` files).
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from flask import current_app
+
+import archive
+import database_create
+import partitions
+
+BACKUP_DIR = 'backups'
+KEEP = 7
+STEP_PAGES = 256
+STEP_PAUSE = 0.005  # seconds between steps, for the writers
+CHUNK = 1024 * 1024
+BUSY_TIMEOUT = 5  # seconds
+SNAPSHOT_RE = re.compile(r'^\d{8}T\d{6}Z(-\d+)?$')
+TMP_PREFIX = '.tmp-'
+
+_backup_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupRunning(BackupError):
+    pass
+
+
+def copy_database(source, target, pages=STEP_PAGES, pause=STEP_PAUSE):
+    """Copies the database file ``source`` to ``target`` in steps of ``pages``."""
+    src = sqlite3.connect(source, timeout=BUSY_TIMEOUT)
+    dst = sqlite3.connect(target)
+    try:
+        # One snapshot for the whole copy; see the module docstring
+        src.execute('BEGIN')
+        src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        src.rollback()
+        # A single self-contained file, readable without -wal/-shm files
+        dst.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        dst.close()
+        src.close()
+
+
+def check(path):
+    """Runs ``PRAGMA integrity_check`` on a database file; returns the problems found."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+
+def compress(path):
+    with open(path, 'rb') as raw, gzip.open(path + '.gz', 'wb') as packed:
+        shutil.copyfileobj(raw, packed, CHUNK)
+    os.remove(path)
+    return path + '.gz'
+
+
+def sources(database, partition_dir):
+    """(file, path relative to the snapshot) of every database to back up."""
+    found = []
+    for path in archive.order_databases(database, partition_dir):
+        for name in (path, partitions.archive_path(path)):
+            if os.path.exists(name):
+                relative = os.path.basename(name)
+                if path != database:
+                    relative = os.path.join(partitions.PARTITION_DIR, relative)
+                found.append((name, relative))
+    return found
+
+
+def snapshots(backup_dir):
+    """Names of the finished snapshots in ``backup_dir``, oldest first."""
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if SNAPSHOT_RE.match(name)),
+                  key=lambda name: (name[:16], int(name[17:] or 0)))
+
+
+def snapshot_files(path):
+    """{relative path: bytes} of the files in a snapshot directory."""
+    files = {}
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            file = os.path.join(root, name)
+            files[os.path.relpath(file, path)] = os.path.getsize(file)
+    return dict(sorted(files.items()))
+
+
+def prune(backup_dir, keep=KEEP):
+    """Deletes all but the newest ``keep`` snapshots; returns their names."""
+    pruned = snapshots(backup_dir)[:-keep] if keep > 0 else []
+    for name in pruned:
+        shutil.rmtree(os.path.join(backup_dir, name))
+    return pruned
+
+
+def create_snapshot(database, partition_dir, backup_dir, compressed=True, keep=KEEP, log=None):
+    """Backs up every database into a new snapshot of ``backup_dir``.
+
+    The snapshot is assembled under a temporary name and only renamed into
+    place once every file passed its integrity check, so a listed snapshot
+    is always complete. Returns {name, files: {relative path: bytes}, pruned}.
+    """
+    log = log or (lambda message: None)
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    work = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=backup_dir)
+    try:
+        files = {}
+        for source, relative in sources(database, partition_dir):
+            target = os.path.join(work, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            copy_database(source, target)
+            problems = check(target)
+            if problems:
+                raise BackupError(f'{relative} failed its integrity check: {"; ".join(problems[:5])}')
+            if compressed:
+                target = compress(target)
+                relative += '.gz'
+            files[relative] = os.path.getsize(target)
+            log(f'{relative}: {files[relative]} bytes')
+
+        name, suffix = stamp, 0
+        while True:
+            try:
+                os.rename(work, os.path.join(backup_dir, name))
+                break
+            except OSError:
+                # Another snapshot took this second (a rename doesn't replace a non-empty directory)
+                if not os.path.exists(os.path.join(backup_dir, name)):
+                    raise
+                suffix += 1
+                name = f'{stamp}-{suffix}'
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    return dict(name=name, files=files, pruned=prune(backup_dir, keep))
+
+
+def verify_snapshot(path):
+    """Checks every database of a snapshot directory, decompressing as needed.
+
+    Returns {relative path: [problems]} with an empty list for a sound file.
+    """
+    results = {}
+    for relative in snapshot_files(path):
+        file = os.path.join(path, relative)
+        if not relative.endswith('.gz'):
+            results[relative] = check(file)
+            continue
+        fd, raw = tempfile.mkstemp(suffix='.db')
+        try:
+            with os.fdopen(fd, 'wb') as out, gzip.open(file, 'rb') as packed:
+                shutil.copyfileobj(packed, out, CHUNK)
+            results[relative] = check(raw)
+        except (OSError, EOFError) as e:
+            results[relative] = [f'Not a readable gzip file: {e}']
+        finally:
+            os.remove(raw)
+    return results
+
+
+def backup(app=None):
+    """Takes a snapshot with the application's settings. Only one runs at a
+    time per process; raises BackupRunning if one is already running."""
+    app = app or current_app
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupRunning('A backup is already running')
+    try:
+        return create_snapshot(app.config['DATABASE'], app.config['PARTITION_DIR'], app.config['BACKUP_DIR'],
+                               app.config['BACKUP_COMPRESS'], app.config['BACKUP_KEEP'])
+    finally:
+        _backup_lock.release()
+
+
+def init_app(app):
+    app.config.setdefault('BACKUP_DIR', os.path.join(app.root_path, BACKUP_DIR))
+    app.config.setdefault('BACKUP_KEEP', KEEP)
+    app.config.setdefault('BACKUP_COMPRESS', True)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['create', 'verify', 'list'])
+    parser.add_argument('snapshots', nargs='*', help='snapshots to verify (default: all)')
+    parser.add_argument('--database', default=database_create.DATABASE)
+    parser.add_argument('--partition-dir', default=os.path.join(here, partitions.PARTITION_DIR))
+    parser.add_argument('--backup-dir', default=os.path.join(here, BACKUP_DIR))
+    parser.add_argument('--keep', type=int, default=KEEP, help='snapshots to keep, 0 for all')
+    parser.add_argument('--no-compress', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.action == 'create':
+        try:
+            result = create_snapshot(args.database, args.partition_dir, args.backup_dir, not args.no_compress,
+                                     args.keep, log=lambda message: print(message, file=sys.stderr))
+        except BackupError as e:
+            sys.exit(str(e))
+        print(f"Created {result['name']}" + (f", pruned {', '.join(result['pruned'])}" if result['pruned'] else ''))
+    elif args.action == 'list':
+        for name in snapshots(args.backup_dir):
+            print(f'{name}\t{sum(snapshot_files(os.path.join(args.backup_dir, name)).values())} bytes')
+    else:
+        failed = False
+        for name in args.snapshots or snapshots(args.backup_dir):
+            for relative, problems in verify_snapshot(os.path.join(args.backup_dir, name)).items():
+                failed |= bool(problems)
+                print(f'{name}/{relative}: ' + ('; '.join(problems[:5]) if problems else 'ok'))
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
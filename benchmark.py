@@ -0,0 +1,239 @@
+"""Route-level benchmarks over seeded databases of configurable size.
+
+Every route is driven through Flask's test client against a copy of a
+database seeded at each requested scale. Per route it reports p50/p95/p99
+latency, throughput and SQL statements per request, and writes the results
+as JSON. With ``--compare`` the run is checked against a stored baseline::
+
+    python benchmark.py --scales small medium --output bench.json
+    python benchmark.py --scales small --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+import db
+import generate_data
+
+# generate_data options per scale; seeded databases are cached in --data-dir.
+SCALES = {
+    'small': dict(users=200, branches=5, categories=5, sub_categories_per_category=(4, 4),
+                  dishes_per_sub_category=(5, 5), promocodes=1000, orders=1000),
+    'medium': dict(users=5000, branches=20, categories=20, sub_categories_per_category=(10, 10),
+                   dishes_per_sub_category=(50, 50), promocodes=10000, orders=100000),
+    'large': dict(users=50000, branches=50, categories=20, sub_categories_per_category=(10, 10),
+                  dishes_per_sub_category=(50, 50), promocodes=10000, orders=1000000),
+}
+STATUSES = list(generate_data.DEFAULTS['status_mix'])
+DATA_DIR = '.bench'
+ITERATIONS = 200
+WARMUP = 10
+REGRESSION_THRESHOLD = 0.20  # relative slowdown of p50 or p95 flagged by --compare
+SEED = 1234
+
+
+def seeded_copy(scale, data_dir):
+    """Returns a fresh copy of the seeded database for ``scale``."""
+    os.makedirs(data_dir, exist_ok=True)
+    template = os.path.join(data_dir, f'{scale}.db')
+    if not os.path.exists(template):
+        print(f'Seeding {scale} database...', file=sys.stderr)
+        generate_data.generate(template + '.tmp', seed=SEED, **SCALES[scale])
+        os.replace(template + '.tmp', template)
+    path = os.path.join(data_dir, f'{scale}-run.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.copy(template, path)
+    return path
+
+
+def table_sizes(path):
+    """Highest id per table, used to pick existing rows at random."""
+    conn = db.connect(path, readonly=True)
+    try:
+        return {table: conn.execute(f'SELECT COALESCE(MAX(id), 1) FROM {table}').fetchone()[0]
+                for table in ('categories', 'dishes', 'promocodes', 'orders')}
+    finally:
+        conn.close()
+
+
+def routes(counts):
+    """(name, method, callable returning (url, test client kwargs)) for every benchmarked route."""
+    rng = random.Random(SEED)
+    order_ids = lambda: rng.randint(1, counts['orders'])
+    dish_ids = lambda: rng.randint(1, counts['dishes'])
+    codes = itertools.count()
+    return [
+        ('index', 'GET', lambda: ('/', {})),
+        ('menu', 'GET', lambda: ('/menu', {})),
+        ('menu_filtered', 'GET', lambda: (f"/menu?category_id={rng.randint(1, counts['categories'])}", {})),
+        ('orders', 'GET', lambda: ('/orders', {})),
+        ('orders_by_status', 'GET', lambda: (f'/orders?status={rng.choice(STATUSES)}', {})),
+        ('orders_deep_page', 'GET', lambda: (f'/orders?cursor={order_ids()}', {})),
+        ('order_details', 'GET', lambda: (f'/order_details/{order_ids()}', {})),
+        ('couriers', 'GET', lambda: ('/couriers', {})),
+        ('branches', 'GET', lambda: ('/branches', {})),
+        ('add_dish_form', 'GET', lambda: ('/add_dish', {})),
+        ('edit_dish_form', 'GET', lambda: (f'/edit_dish/{dish_ids()}', {})),
+        ('add_category_form', 'GET', lambda: ('/add_category', {})),
+        ('add_sub_category_form', 'GET', lambda: ('/add_sub_category', {})),
+        ('make_order_form', 'GET', lambda: ('/make_order', {})),
+        ('add_promocode_form', 'GET', lambda: ('/add_promocode', {})),
+        ('promocode_qr', 'GET', lambda: (f"/promocode/{rng.randint(1, counts['promocodes'])}/qr.png", {})),
+        ('api_menu', 'GET', lambda: ('/api/v1/menu', {})),
+        ('api_orders', 'GET', lambda: ('/api/v1/orders?status=Pending', {})),
+        ('api_order_details', 'GET', lambda: (f'/api/v1/orders/{order_ids()}', {})),
+        ('make_order', 'POST', lambda: ('/make_order', dict(data={
+            'description': 'bench', 'user_id': 1,
+            'dish_id': [str(dish_ids()), str(dish_ids())], 'quantity': ['1', '2']}))),
+        ('send_order_to_kitchen', 'POST', lambda: (f'/send_order_to_kitchen/{order_ids()}', {})),
+        ('update_order_status', 'POST', lambda: (f'/update_order_status/{order_ids()}',
+                                                 dict(data={'status': rng.choice(STATUSES)}))),
+        ('add_promocode', 'POST', lambda: ('/add_promocode', dict(data={
+            'code': f'BENCHNEW{next(codes)}', 'discount': '10'}))),
+    ]
+
+
+class StatementCounter:
+    """Counts SQL statements run by the app's connections."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, statement):
+        if statement.startswith('--'):
+            return  # trigger bodies are reported as comments; count the statement only
+        with self._lock:
+            self.count += 1
+
+
+def percentile(samples, pct):
+    if len(samples) == 1:
+        return samples[0]  # quantiles needs two points
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+def bench_scale(flask_app, scale, data_dir, iterations, warmup, only=None):
+    path = seeded_copy(scale, data_dir)
+    flask_app.config['DATABASE'] = path
+    pool = flask_app.extensions.pop('db_pool', None)
+    if pool is not None:
+        pool.close_all()
+    client = flask_app.test_client()
+    counter = StatementCounter()
+    db.trace_callbacks(flask_app).append(counter)
+
+    results = {}
+    try:
+        for name, method, request_for in routes(table_sizes(path)):
+            if only and name not in only:
+                continue
+            for _ in range(warmup):
+                url, kwargs = request_for()
+                client.open(url, method=method, **kwargs)
+            timings, statements_before = [], counter.count
+            started = time.perf_counter()
+            for _ in range(iterations):
+                url, kwargs = request_for()
+                t0 = time.perf_counter()
+                response = client.open(url, method=method, **kwargs)
+                response.get_data()
+                timings.append(time.perf_counter() - t0)
+                if response.status_code >= 500:
+                    raise RuntimeError(f'{name}: {url} returned {response.status_code}')
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                'p50_ms': percentile(timings, 50) * 1000,
+                'p95_ms': percentile(timings, 95) * 1000,
+                'p99_ms': percentile(timings, 99) * 1000,
+                'requests_per_second': iterations / elapsed,
+                'statements_per_request': (counter.count - statements_before) / iterations,
+            }
+            print(f"{scale:>7} {name:<24} p50 {results[name]['p50_ms']:8.2f} ms  "
+                  f"p95 {results[name]['p95_ms']:8.2f} ms  p99 {results[name]['p99_ms']:8.2f} ms  "
+                  f"{results[name]['requests_per_second']:8.1f} req/s  "
+                  f"{results[name]['statements_per_request']:5.1f} stmts/req", file=sys.stderr)
+    finally:
+        db.trace_callbacks(flask_app).remove(counter)
+        pool = flask_app.extensions.pop('db_pool', None)
+        if pool is not None:
+            pool.close_all()
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Returns a line for every route whose p50 or p95 regressed past ``threshold``."""
+    regressions = []
+    for scale, routes_ in results['scales'].items():
+        for name, current in routes_.items():
+            previous = baseline.get('scales', {}).get(scale, {}).get(name)
+            if previous is None:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(f'{scale}/{name} {metric}: {previous[metric]:.2f} -> {current[metric]:.2f}')
+            if current['statements_per_request'] > previous['statements_per_request']:
+                regressions.append(f"{scale}/{name} statements_per_request: "
+                                   f"{previous['statements_per_request']:.1f} -> {current['statements_per_request']:.1f}")
+    return regressions
+
+
+def at_least(minimum):
+    """An argparse type for integers no smaller than ``minimum``."""
+    def parse(text):
+        value = int(text)
+        if value < minimum:
+            raise argparse.ArgumentTypeError(f'must be at least {minimum}')
+        return value
+    parse.__name__ = 'int'  # argparse names the type in its error for non-numbers
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small'])
+    parser.add_argument('--routes', nargs='+', help='only benchmark these routes')
+    parser.add_argument('--iterations', type=at_least(1), default=ITERATIONS)
+    parser.add_argument('--warmup', type=at_least(0), default=WARMUP)
+    parser.add_argument('--data-dir', default=DATA_DIR, help='where seeded databases are cached')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='flag regressions against this results file')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    from app import app as flask_app
+
+    results = {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'iterations': args.iterations,
+        'scales': {scale: bench_scale(flask_app, scale, args.data_dir, args.iterations, args.warmup, args.routes)
+                   for scale in args.scales},
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,106 +1,622 @@
-import sqlite3
-
-def create_database():
-    conn = sqlite3.connect('cooksoo_cafe.db')
-    cur = conn.cursor()
-
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS user (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   name TEXT NOT NULL,
-                   phone TEXT NOT NULL,
-                   role TEXT CHECK(role IN ('kitchen', 'administration', 'courier', 'user')) NOT NULL
-                   )''')
-
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS categories (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   name TEXT NOT NULL
-                   )''')
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS dishes (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   name TEXT NOT NULL,
-                   price REAL NOT NULL,
-                   category_id INTEGER,
-                   sub_category_id INTEGER, 
-                   img_link TEXT,
-                   FOREIGN KEY (category_id) REFERENCES categories (id),
-                   FOREIGN KEY (sub_category_id) REFERENCES sub_category (id)
-                   )''')
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS promocodes (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   code TEXT NOT NULL,
-                   discount REAL NOT NULL,
-                   qr_code BLOB
-                   )''')
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS orders (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   description TEXT,
-                   status TEXT,
-                   user_id INTEGER,
-                   dish_id INTEGER,
-                   FOREIGN KEY (user_id) REFERENCES user (id),
-                   FOREIGN KEY (dish_id) REFERENCES dishes (id)
-                   )''')
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS branch (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    address TEXT NOT NULL,
-                    phone TEXT NOT NULL
-                     )''')
-
-    cur.execute('''CREATE TABLE IF NOT EXISTS sub_category (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    category_id INTEGER,
-                    FOREIGN KEY (category_id) REFERENCES categories (id)
-                    )''')
-                    
-
-    cur.execute('''INSERT INTO categories (name) VALUES ('Beverages');''')
-    cur.execute('''INSERT INTO categories (name) VALUES ('Main Dishes');''')
-    cur.execute('''INSERT INTO categories (name) VALUES ('Desserts');''')  
-                    
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Coffee', 1);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Tea', 1);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Soft Drinks', 1);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Pasta', 2);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Burgers', 2);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Salads', 2);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Cakes', 3);''')
-    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Ice Cream', 3);''')
-
-        
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Green Tea', 2.50, 1, 2, 'https://hips.hearstapps.com/hmg-prod/images/green-tea-wight-loss-1643990040.jpg?crop=0.665xw:1.00xh;0.291xw,0&resize=1200:*');''')
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Black Tea', 2.50, 1, 2, 'https://clubmagichour.com/cdn/shop/articles/AdobeStock_316822193.jpg?v=1688754552');''')
-
-
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Cola', 1.99, 1, 3, 'https://arigato.kg/wp-content/uploads/2022/12/cola-600x600-1.png');''')
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Fanta', 1.99, 1, 3, 'https://www.coca-cola.co.uk/content/dam/one/gb/en/heritage/brands/brand-fanta-uk-1.png');''')
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Sprite', 1.99, 1, 3, 'https://www.coca-cola.co.uk/content/dam/one/gb/en/heritage/brands/brand-sprite-uk-1.png');''')
-    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Lemonade', 2.50, 1, 3, 'https://www.foodiecrush.com/wp-content/uploads/2022/06/Lemonade-foodiecrush.com-9-1.jpg');''')
-
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Spaghetti Carbonara', 8.99, 2, 4, 'https://images.services.kitchenstories.io/6glN_4JhpVS9aUiBS7JnGsuDULA=/3840x0/filters:quality(80)/images.kitchenstories.io/wagtailOriginalImages/R2568-photo-final-_0.jpg');")
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Penne Arrabbiata', 7.99, 2, 4, 'https://theplantbasedschool.com/wp-content/uploads/2022/04/Arrabbiata-in-pan-1.jpg');")
-
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Classic Beef Burger', 6.99, 2, 5, 'https://realfood.tesco.com/media/images/Burger-31LGH-a296a356-020c-4969-86e8-d8c26139f83f-0-1400x919.jpg');")
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Veggie Burger', 5.99, 2, 5, 'https://www.realsimple.com/thmb/z3cQCYXTyDQS9ddsqqlTVE8fnpc=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/real-simple-mushroom-black-bean-burgers-recipe-0c365277d4294e6db2daa3353d6ff605.jpg');")
-
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Caesar Salad', 5.99, 2, 6, 'https://www.seriouseats.com/thmb/Fi_FEyVa3_-_uzfXh6OdLrzal2M=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/the-best-caesar-salad-recipe-06-40e70f549ba2489db09355abd62f79a9.jpg');")
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Greek Salad', 4.99, 2, 6, 'https://www.thehungrybites.com/wp-content/uploads/2017/07/Authentic-Greek-salad-horiatiki-featured.jpg');")
-
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Cheesecake', 3.99, 3, 7, 'https://joyfoodsunshine.com/wp-content/uploads/2022/03/best-cheesecake-recipe-6.jpg');")
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Chocolate Cake', 3.99, 3, 7, 'https://hips.hearstapps.com/hmg-prod/images/chocolate-cake-index-64b83bce2df26.jpg?crop=0.6668359143606668xw:1xh;center,top&resize=1200:*');")
-
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Vanilla Ice Cream', 2.99, 3, 8, 'https://www.washingtonpost.com/wp-apps/imrs.php?src=https://arc-anglerfish-washpost-prod-washpost.s3.amazonaws.com/public/KUFWIPXROII6ZLAWR67XDFGNPA.jpg&w=1440');")
-    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Strawberry Ice Cream', 2.99, 3, 8, 'https://www.thespruceeats.com/thmb/kpuMkqk0BhGMTuSENf_IebbHu1s=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/strawberry-ice-cream-10-0b3e120e7d6f4df1be3c57c17699eb2c.jpg');")
-
-    conn.commit()
-    conn.close()
-
-if __name__ == '__main__':
+import sqlite3
+
+DATABASE = 'cooksoo_cafe.db'
+
+
+def _add_column(cur, table, column, definition):
+    columns = {row[1] for row in cur.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        cur.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _create_tables(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS user (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   name TEXT NOT NULL,
+                   phone TEXT NOT NULL,
+                   role TEXT CHECK(role IN ('kitchen', 'administration', 'courier', 'user')) NOT NULL
+                   )''')
+
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS categories (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   name TEXT NOT NULL
+                   )''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS dishes (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   name TEXT NOT NULL,
+                   price REAL NOT NULL,
+                   category_id INTEGER,
+                   sub_category_id INTEGER, 
+                   img_link TEXT,
+                   FOREIGN KEY (category_id) REFERENCES categories (id),
+                   FOREIGN KEY (sub_category_id) REFERENCES sub_category (id)
+                   )''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS promocodes (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   code TEXT NOT NULL,
+                   discount REAL NOT NULL,
+                   qr_code BLOB
+                   )''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS orders (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   description TEXT,
+                   status TEXT,
+                   user_id INTEGER,
+                   dish_id INTEGER,
+                   FOREIGN KEY (user_id) REFERENCES user (id),
+                   FOREIGN KEY (dish_id) REFERENCES dishes (id)
+                   )''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS branch (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    address TEXT NOT NULL,
+                    phone TEXT NOT NULL
+                     )''')
+
+    cur.execute('''CREATE TABLE IF NOT EXISTS sub_category (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    category_id INTEGER,
+                    FOREIGN KEY (category_id) REFERENCES categories (id)
+                    )''')
+
+
+def _seed_data(cur):
+    # Databases created before migrations were tracked already hold the seed rows.
+    if cur.execute('SELECT 1 FROM categories LIMIT 1').fetchone():
+        return
+
+    cur.execute('''INSERT INTO categories (name) VALUES ('Beverages');''')
+    cur.execute('''INSERT INTO categories (name) VALUES ('Main Dishes');''')
+    cur.execute('''INSERT INTO categories (name) VALUES ('Desserts');''')  
+                    
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Coffee', 1);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Tea', 1);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Soft Drinks', 1);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Pasta', 2);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Burgers', 2);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Salads', 2);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Cakes', 3);''')
+    cur.execute('''INSERT INTO sub_category (name, category_id) VALUES ('Ice Cream', 3);''')
+
+        
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Green Tea', 2.50, 1, 2, 'https://hips.hearstapps.com/hmg-prod/images/green-tea-wight-loss-1643990040.jpg?crop=0.665xw:1.00xh;0.291xw,0&resize=1200:*');''')
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Black Tea', 2.50, 1, 2, 'https://clubmagichour.com/cdn/shop/articles/AdobeStock_316822193.jpg?v=1688754552');''')
+
+
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Cola', 1.99, 1, 3, 'https://arigato.kg/wp-content/uploads/2022/12/cola-600x600-1.png');''')
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Fanta', 1.99, 1, 3, 'https://www.coca-cola.co.uk/content/dam/one/gb/en/heritage/brands/brand-fanta-uk-1.png');''')
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Sprite', 1.99, 1, 3, 'https://www.coca-cola.co.uk/content/dam/one/gb/en/heritage/brands/brand-sprite-uk-1.png');''')
+    cur.execute('''INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Lemonade', 2.50, 1, 3, 'https://www.foodiecrush.com/wp-content/uploads/2022/06/Lemonade-foodiecrush.com-9-1.jpg');''')
+
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Spaghetti Carbonara', 8.99, 2, 4, 'https://images.services.kitchenstories.io/6glN_4JhpVS9aUiBS7JnGsuDULA=/3840x0/filters:quality(80)/images.kitchenstories.io/wagtailOriginalImages/R2568-photo-final-_0.jpg');")
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Penne Arrabbiata', 7.99, 2, 4, 'https://theplantbasedschool.com/wp-content/uploads/2022/04/Arrabbiata-in-pan-1.jpg');")
+
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Classic Beef Burger', 6.99, 2, 5, 'https://realfood.tesco.com/media/images/Burger-31LGH-a296a356-020c-4969-86e8-d8c26139f83f-0-1400x919.jpg');")
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Veggie Burger', 5.99, 2, 5, 'https://www.realsimple.com/thmb/z3cQCYXTyDQS9ddsqqlTVE8fnpc=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/real-simple-mushroom-black-bean-burgers-recipe-0c365277d4294e6db2daa3353d6ff605.jpg');")
+
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Caesar Salad', 5.99, 2, 6, 'https://www.seriouseats.com/thmb/Fi_FEyVa3_-_uzfXh6OdLrzal2M=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/the-best-caesar-salad-recipe-06-40e70f549ba2489db09355abd62f79a9.jpg');")
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Greek Salad', 4.99, 2, 6, 'https://www.thehungrybites.com/wp-content/uploads/2017/07/Authentic-Greek-salad-horiatiki-featured.jpg');")
+
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Cheesecake', 3.99, 3, 7, 'https://joyfoodsunshine.com/wp-content/uploads/2022/03/best-cheesecake-recipe-6.jpg');")
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Chocolate Cake', 3.99, 3, 7, 'https://hips.hearstapps.com/hmg-prod/images/chocolate-cake-index-64b83bce2df26.jpg?crop=0.6668359143606668xw:1xh;center,top&resize=1200:*');")
+
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Vanilla Ice Cream', 2.99, 3, 8, 'https://www.washingtonpost.com/wp-apps/imrs.php?src=https://arc-anglerfish-washpost-prod-washpost.s3.amazonaws.com/public/KUFWIPXROII6ZLAWR67XDFGNPA.jpg&w=1440');")
+    cur.execute("INSERT INTO dishes (name, price, category_id, sub_category_id, img_link) VALUES ('Strawberry Ice Cream', 2.99, 3, 8, 'https://www.thespruceeats.com/thmb/kpuMkqk0BhGMTuSENf_IebbHu1s=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/strawberry-ice-cream-10-0b3e120e7d6f4df1be3c57c17699eb2c.jpg');")
+
+
+def _add_indexes(cur):
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_dish_id ON orders (dish_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_dishes_category ON dishes (category_id, sub_category_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_sub_category_category_id ON sub_category (category_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_user_role ON user (role)')
+
+
+def _unique_promocodes(cur):
+    # Keep the oldest row of any duplicated code so the unique index can be built.
+    cur.execute('''DELETE FROM promocodes WHERE id NOT IN (
+                       SELECT MIN(id) FROM promocodes GROUP BY code
+                   )''')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_promocodes_code ON promocodes (code)')
+
+
+def _menu_version(cur):
+    # Bumped by triggers on every menu write so cached menu pages can be keyed on it.
+    cur.execute('''CREATE TABLE IF NOT EXISTS menu_version (
+                   id INTEGER PRIMARY KEY CHECK (id = 1),
+                   version INTEGER NOT NULL
+                   )''')
+    cur.execute('INSERT OR IGNORE INTO menu_version (id, version) VALUES (1, 0)')
+    for table in ('dishes', 'categories', 'sub_category'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cur.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_menu_version
+                            AFTER {event} ON {table}
+                            BEGIN
+                                UPDATE menu_version SET version = version + 1 WHERE id = 1;
+                            END''')
+
+
+def _promo_campaigns(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS promo_campaigns (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   name TEXT NOT NULL UNIQUE,
+                   discount REAL NOT NULL,
+                   target_count INTEGER NOT NULL,
+                   created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                   )''')
+    _add_column(cur, 'promocodes', 'campaign_id', 'INTEGER REFERENCES promo_campaigns (id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_promocodes_campaign_id ON promocodes (campaign_id)')
+
+
+def _order_items(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS order_items (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   order_id INTEGER NOT NULL,
+                   dish_id INTEGER NOT NULL,
+                   quantity INTEGER NOT NULL CHECK (quantity > 0),
+                   unit_price REAL NOT NULL,
+                   FOREIGN KEY (order_id) REFERENCES orders (id),
+                   FOREIGN KEY (dish_id) REFERENCES dishes (id)
+                   )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_items_dish_id ON order_items (dish_id)')
+    _add_column(cur, 'orders', 'total', 'REAL')
+    # Orders placed before carts existed become single-line orders
+    cur.execute('''INSERT INTO order_items (order_id, dish_id, quantity, unit_price)
+                   SELECT orders.id, orders.dish_id, 1, COALESCE(dishes.price, 0)
+                   FROM orders LEFT JOIN dishes ON orders.dish_id = dishes.id
+                   WHERE orders.dish_id IS NOT NULL
+                     AND NOT EXISTS (SELECT 1 FROM order_items WHERE order_items.order_id = orders.id)''')
+    cur.execute('''UPDATE orders SET total = (
+                       SELECT COALESCE(SUM(quantity * unit_price), 0) FROM order_items
+                       WHERE order_items.order_id = orders.id
+                   ) WHERE total IS NULL''')
+
+
+ORDER_EVENTS_RETAINED = 10000
+
+ORDER_INSERT_EVENT_TRIGGER = '''CREATE TRIGGER IF NOT EXISTS orders_insert_event
+                   AFTER INSERT ON orders
+                   BEGIN
+                       INSERT INTO order_events (order_id, event, status) VALUES (new.id, 'order_created', new.status);
+                   END'''
+
+
+def _order_events(cur):
+    # Written by triggers in the same transaction as the order change, so the
+    # kitchen feed only ever sees committed changes and can replay by id.
+    cur.execute('''CREATE TABLE IF NOT EXISTS order_events (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   order_id INTEGER NOT NULL,
+                   event TEXT NOT NULL,
+                   status TEXT,
+                   created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                   )''')
+    cur.execute(ORDER_INSERT_EVENT_TRIGGER)
+    cur.execute('''CREATE TRIGGER IF NOT EXISTS orders_status_event
+                   AFTER UPDATE OF status ON orders
+                   WHEN old.status IS NOT new.status
+                   BEGIN
+                       INSERT INTO order_events (order_id, event, status) VALUES (new.id, 'status_changed', new.status);
+                   END''')
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS order_events_prune
+                    AFTER INSERT ON order_events
+                    BEGIN
+                        DELETE FROM order_events WHERE id <= new.id - {ORDER_EVENTS_RETAINED};
+                    END''')
+
+
+def _dish_thumbnails(cur):
+    # Digest of the dish image in the local thumbnail cache (see thumbnails.py)
+    _add_column(cur, 'dishes', 'thumbnail', 'TEXT')
+
+
+def _dish_search(cur):
+    # Full-text index over dish, category and sub-category names; the rowid is
+    # the dish id. Prefix indexes keep type-ahead queries of 2-3 letters cheap.
+    cur.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS dish_search USING fts5(
+                   name, category, sub_category,
+                   tokenize = 'unicode61 remove_diacritics 2',
+                   prefix = '2 3'
+                   )''')
+    row = '''(SELECT name FROM categories WHERE id = new.category_id),
+             (SELECT name FROM sub_category WHERE id = new.sub_category_id)'''
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS dishes_insert_search
+                    AFTER INSERT ON dishes
+                    BEGIN
+                        INSERT INTO dish_search (rowid, name, category, sub_category) VALUES (new.id, new.name, {row});
+                    END''')
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS dishes_update_search
+                    AFTER UPDATE OF id, name, category_id, sub_category_id ON dishes
+                    BEGIN
+                        DELETE FROM dish_search WHERE rowid = old.id;
+                        INSERT INTO dish_search (rowid, name, category, sub_category) VALUES (new.id, new.name, {row});
+                    END''')
+    cur.execute('''CREATE TRIGGER IF NOT EXISTS dishes_delete_search
+                   AFTER DELETE ON dishes
+                   BEGIN
+                       DELETE FROM dish_search WHERE rowid = old.id;
+                   END''')
+    for table, column, key in (('categories', 'category', 'category_id'),
+                               ('sub_category', 'sub_category', 'sub_category_id')):
+        cur.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_update_search
+                        AFTER UPDATE OF name ON {table}
+                        BEGIN
+                            UPDATE dish_search SET {column} = new.name
+                            WHERE rowid IN (SELECT id FROM dishes WHERE {key} = new.id);
+                        END''')
+        cur.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_delete_search
+                        AFTER DELETE ON {table}
+                        BEGIN
+                            UPDATE dish_search SET {column} = NULL
+                            WHERE rowid IN (SELECT id FROM dishes WHERE {key} = old.id);
+                        END''')
+    cur.execute('''INSERT INTO dish_search (rowid, name, category, sub_category)
+                   SELECT dishes.id, dishes.name, categories.name, sub_category.name
+                   FROM dishes
+                   LEFT JOIN categories ON dishes.category_id = categories.id
+                   LEFT JOIN sub_category ON dishes.sub_category_id = sub_category.id
+                   WHERE dishes.id NOT IN (SELECT rowid FROM dish_search)''')
+
+
+def _promo_usage(cur):
+    # NULL usage_limit means unlimited; used_count is only ever bumped by a
+    # single conditional UPDATE (see promocodes.redeem).
+    _add_column(cur, 'promocodes', 'usage_limit', 'INTEGER')
+    _add_column(cur, 'promocodes', 'used_count', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column(cur, 'orders', 'promocode_id', 'INTEGER REFERENCES promocodes (id)')
+    _add_column(cur, 'orders', 'discount', 'REAL NOT NULL DEFAULT 0')
+
+
+def _order_branches(cur):
+    _add_column(cur, 'orders', 'branch_id', 'INTEGER REFERENCES branch (id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_branch_id ON orders (branch_id)')
+
+
+# Orders a courier still has to deliver; the dispatcher's load counts come from here
+OPEN_COURIER_INDEX = '''CREATE INDEX IF NOT EXISTS idx_orders_open_courier ON orders (courier_id)
+                        WHERE courier_id IS NOT NULL AND status != 'Completed' '''
+
+
+def _order_couriers(cur):
+    _add_column(cur, 'orders', 'courier_id', 'INTEGER REFERENCES user (id)')
+    cur.execute(OPEN_COURIER_INDEX)
+    # A courier without a branch serves every branch
+    _add_column(cur, 'user', 'branch_id', 'INTEGER REFERENCES branch (id)')
+
+
+# Statuses counted on the kitchen board; completed orders drop off it
+KITCHEN_BOARD_STATUSES = ('Pending', 'In Kitchen', 'Ready for Pickup')
+
+
+def _kitchen_board(cur):
+    # Dish quantities per branch (0 for none) and open status, kept current by
+    # triggers so the board is read without touching orders. Order lines are
+    # counted under their order's status at the time; if an order is deleted
+    # before its lines, the lines no longer count when they go.
+    statuses = ', '.join(f"'{status}'" for status in KITCHEN_BOARD_STATUSES)
+    cur.execute('''CREATE TABLE IF NOT EXISTS kitchen_board (
+                   branch_id INTEGER NOT NULL,
+                   dish_id INTEGER NOT NULL,
+                   status TEXT NOT NULL,
+                   quantity INTEGER NOT NULL,
+                   PRIMARY KEY (branch_id, dish_id, status)
+                   ) WITHOUT ROWID''')
+    upsert = 'ON CONFLICT (branch_id, dish_id, status) DO UPDATE SET quantity = quantity + excluded.quantity'
+    remove_order = '''UPDATE kitchen_board SET quantity = quantity - (
+                            SELECT SUM(quantity) FROM order_items
+                            WHERE order_id = old.id AND dish_id = kitchen_board.dish_id)
+                        WHERE branch_id = COALESCE(old.branch_id, 0) AND status = old.status
+                          AND dish_id IN (SELECT dish_id FROM order_items WHERE order_id = old.id);'''
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS order_items_insert_board
+                    AFTER INSERT ON order_items
+                    BEGIN
+                        INSERT INTO kitchen_board (branch_id, dish_id, status, quantity)
+                        SELECT COALESCE(branch_id, 0), new.dish_id, status, new.quantity FROM orders
+                        WHERE id = new.order_id AND status IN ({statuses})
+                        {upsert};
+                    END''')
+    cur.execute('''CREATE TRIGGER IF NOT EXISTS order_items_delete_board
+                   AFTER DELETE ON order_items
+                   BEGIN
+                       UPDATE kitchen_board SET quantity = quantity - old.quantity
+                       WHERE dish_id = old.dish_id AND (branch_id, status) =
+                           (SELECT COALESCE(branch_id, 0), status FROM orders WHERE id = old.order_id);
+                   END''')
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS orders_status_board
+                    AFTER UPDATE OF status ON orders
+                    WHEN old.status IS NOT new.status
+                    BEGIN
+                        {remove_order}
+                        INSERT INTO kitchen_board (branch_id, dish_id, status, quantity)
+                        SELECT COALESCE(new.branch_id, 0), dish_id, new.status, SUM(quantity) FROM order_items
+                        WHERE order_id = new.id AND new.status IN ({statuses})
+                        GROUP BY dish_id
+                        {upsert};
+                    END''')
+    cur.execute(f'''CREATE TRIGGER IF NOT EXISTS orders_delete_board
+                    AFTER DELETE ON orders
+                    BEGIN
+                        {remove_order}
+                    END''')
+    cur.execute(f'''INSERT OR REPLACE INTO kitchen_board (branch_id, dish_id, status, quantity)
+                    SELECT COALESCE(orders.branch_id, 0), order_items.dish_id, orders.status, SUM(order_items.quantity)
+                    FROM orders JOIN order_items ON order_items.order_id = orders.id
+                    WHERE orders.status IN ({statuses})
+                    GROUP BY 1, 2, 3''')
+
+
+def rebuild_sales_rollups(cur, archive=None):
+    """Recomputes the sales rollups from the orders in bulk.
+
+    ``archive`` names an attached schema holding archived orders (see
+    archive.py) to include. Returns the number of orders left out for lack
+    of a timestamp. An order an interrupted archive run left in both files
+    is counted once, from ``main``.
+    """
+    orders = 'main.orders'
+    order_items = 'main.order_items'
+    if archive:
+        orders = f'''(SELECT id, status, total, branch_id, created_at FROM main.orders UNION ALL
+                     SELECT id, status, total, branch_id, created_at FROM {archive}.orders
+                     WHERE id NOT IN (SELECT id FROM main.orders))'''
+        order_items = f'''(SELECT order_id, dish_id, quantity, unit_price FROM main.order_items UNION ALL
+                          SELECT order_id, dish_id, quantity, unit_price FROM {archive}.order_items
+                          WHERE order_id NOT IN (SELECT id FROM main.orders))'''
+    cur.execute('DELETE FROM daily_order_stats')
+    cur.execute('DELETE FROM daily_dish_sales')
+    cur.execute(f'''INSERT INTO daily_order_stats (day, branch_id, status, orders, total)
+                    SELECT date(created_at), COALESCE(branch_id, 0), COALESCE(status, ''), COUNT(*),
+                           SUM(COALESCE(total, 0))
+                    FROM {orders} WHERE created_at IS NOT NULL
+                    GROUP BY 1, 2, 3''')
+    cur.execute(f'''INSERT INTO daily_dish_sales (day, branch_id, dish_id, quantity, revenue)
+                    SELECT date(orders.created_at), COALESCE(orders.branch_id, 0), order_items.dish_id,
+                           SUM(order_items.quantity), SUM(order_items.quantity * order_items.unit_price)
+                    FROM {orders} AS orders JOIN {order_items} AS order_items ON order_items.order_id = orders.id
+                    WHERE orders.status = 'Completed' AND orders.created_at IS NOT NULL
+                    GROUP BY 1, 2, 3''')
+    return cur.execute(f'SELECT COUNT(*) FROM {orders} WHERE created_at IS NULL').fetchone()[0]
+
+
+_ORDER_DAY = "date(COALESCE(new.created_at, CURRENT_TIMESTAMP))"
+_ADD_DISH_SALES = '''ON CONFLICT (day, branch_id, dish_id) DO UPDATE
+                     SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue'''
+
+# Dropped by generate_data for bulk loads, which rebuild the rollups afterwards
+SALES_ROLLUP_TRIGGERS = {
+    'orders_created_at': '''CREATE TRIGGER IF NOT EXISTS orders_created_at
+                   AFTER INSERT ON orders
+                   WHEN new.created_at IS NULL
+                   BEGIN
+                       UPDATE orders SET created_at = CURRENT_TIMESTAMP WHERE id = new.id;
+                   END''',
+    'orders_insert_sales': f'''CREATE TRIGGER IF NOT EXISTS orders_insert_sales
+                   AFTER INSERT ON orders
+                   BEGIN
+                       INSERT INTO daily_order_stats (day, branch_id, status, orders, total)
+                       VALUES ({_ORDER_DAY}, COALESCE(new.branch_id, 0), COALESCE(new.status, ''), 1,
+                               COALESCE(new.total, 0))
+                       ON CONFLICT (day, branch_id, status) DO UPDATE
+                       SET orders = orders + 1, total = total + excluded.total;
+                   END''',
+    # Orders from before timestamps existed aren't in the rollups, so their updates are ignored
+    'orders_status_sales': f'''CREATE TRIGGER IF NOT EXISTS orders_status_sales
+                   AFTER UPDATE OF status ON orders
+                   WHEN old.status IS NOT new.status AND new.created_at IS NOT NULL
+                   BEGIN
+                       UPDATE daily_order_stats SET orders = orders - 1, total = total - COALESCE(old.total, 0)
+                       WHERE day = date(old.created_at) AND branch_id = COALESCE(old.branch_id, 0)
+                         AND status = COALESCE(old.status, '');
+                       INSERT INTO daily_order_stats (day, branch_id, status, orders, total)
+                       VALUES (date(new.created_at), COALESCE(new.branch_id, 0), COALESCE(new.status, ''), 1,
+                               COALESCE(new.total, 0))
+                       ON CONFLICT (day, branch_id, status) DO UPDATE
+                       SET orders = orders + 1, total = total + excluded.total;
+                       UPDATE daily_dish_sales
+                       SET quantity = quantity - (SELECT SUM(quantity) FROM order_items
+                                                  WHERE order_id = old.id AND dish_id = daily_dish_sales.dish_id),
+                           revenue = revenue - (SELECT SUM(quantity * unit_price) FROM order_items
+                                                WHERE order_id = old.id AND dish_id = daily_dish_sales.dish_id)
+                       WHERE old.status = 'Completed' AND day = date(old.created_at)
+                         AND branch_id = COALESCE(old.branch_id, 0)
+                         AND dish_id IN (SELECT dish_id FROM order_items WHERE order_id = old.id);
+                       INSERT INTO daily_dish_sales (day, branch_id, dish_id, quantity, revenue)
+                       SELECT date(new.created_at), COALESCE(new.branch_id, 0), dish_id, SUM(quantity),
+                              SUM(quantity * unit_price)
+                       FROM order_items WHERE order_id = new.id AND new.status = 'Completed'
+                       GROUP BY dish_id
+                       {_ADD_DISH_SALES};
+                   END''',
+    # Lines added to an order that is already completed, as in bulk loads
+    'order_items_insert_sales': f'''CREATE TRIGGER IF NOT EXISTS order_items_insert_sales
+                   AFTER INSERT ON order_items
+                   BEGIN
+                       INSERT INTO daily_dish_sales (day, branch_id, dish_id, quantity, revenue)
+                       SELECT date(created_at), COALESCE(branch_id, 0), new.dish_id, new.quantity,
+                              new.quantity * new.unit_price
+                       FROM orders WHERE id = new.order_id AND status = 'Completed' AND created_at IS NOT NULL
+                       {_ADD_DISH_SALES};
+                   END''',
+}
+
+
+def _sales_rollups(cur):
+    # Per day (UTC, of the order's creation), branch (0 for none) and status:
+    # how many orders there are and what they total, so revenue is the total
+    # of the Completed row. Dish sales count completed orders only, before
+    # order-level discounts. Deleting orders doesn't touch the rollups: they
+    # are history, and outlive archived orders.
+    _add_column(cur, 'orders', 'created_at', 'TEXT')
+    cur.execute('''CREATE TABLE IF NOT EXISTS daily_order_stats (
+                   day TEXT NOT NULL,
+                   branch_id INTEGER NOT NULL,
+                   status TEXT NOT NULL,
+                   orders INTEGER NOT NULL,
+                   total REAL NOT NULL,
+                   PRIMARY KEY (day, branch_id, status)
+                   ) WITHOUT ROWID''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS daily_dish_sales (
+                   day TEXT NOT NULL,
+                   branch_id INTEGER NOT NULL,
+                   dish_id INTEGER NOT NULL,
+                   quantity INTEGER NOT NULL,
+                   revenue REAL NOT NULL,
+                   PRIMARY KEY (day, branch_id, dish_id)
+                   ) WITHOUT ROWID''')
+    for trigger in SALES_ROLLUP_TRIGGERS.values():
+        cur.execute(trigger)
+    # The retained order_created events are the only creation times history has
+    cur.execute('''UPDATE orders SET created_at = events.created_at
+                   FROM (SELECT order_id, MIN(created_at) AS created_at FROM order_events
+                         WHERE event = 'order_created' GROUP BY order_id) AS events
+                   WHERE orders.id = events.order_id AND orders.created_at IS NULL''')
+    rebuild_sales_rollups(cur)
+
+
+# Schema version N is reached once MIGRATIONS[N - 1] has run; the current
+# version is stored in PRAGMA user_version. Only ever append to this list.
+MIGRATIONS = [
+    _create_tables,
+    _seed_data,
+    _add_indexes,
+    _unique_promocodes,
+    _menu_version,
+    _promo_campaigns,
+    _order_items,
+    _order_events,
+    _dish_thumbnails,
+    _dish_search,
+    _promo_usage,
+    _order_branches,
+    _order_couriers,
+    _kitchen_board,
+    _sales_rollups,
+]
+
+
+def _partition_tables(cur):
+    # A branch's share of the order tables (see partitions.py), with the same
+    # columns as in the main database. Foreign keys can't point into another
+    # file, so the references to users, dishes and promo codes go unchecked.
+    cur.execute('''CREATE TABLE IF NOT EXISTS orders (
+                   id INTEGER PRIMARY KEY,
+                   description TEXT,
+                   status TEXT,
+                   user_id INTEGER,
+                   dish_id INTEGER,
+                   total REAL,
+                   promocode_id INTEGER,
+                   discount REAL NOT NULL DEFAULT 0,
+                   branch_id INTEGER
+                   )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id)')
+    cur.execute('''CREATE TABLE IF NOT EXISTS order_items (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   order_id INTEGER NOT NULL,
+                   dish_id INTEGER NOT NULL,
+                   quantity INTEGER NOT NULL CHECK (quantity > 0),
+                   unit_price REAL NOT NULL,
+                   FOREIGN KEY (order_id) REFERENCES orders (id)
+                   )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_items_dish_id ON order_items (dish_id)')
+    _order_events(cur)
+
+
+def _partition_couriers(cur):
+    _add_column(cur, 'orders', 'courier_id', 'INTEGER')
+    cur.execute(OPEN_COURIER_INDEX)
+
+
+# Versioned separately from the main database; same append-only rule.
+PARTITION_MIGRATIONS = [
+    _partition_tables,
+    _partition_couriers,
+    _kitchen_board,
+    _sales_rollups,
+]
+
+
+def _archive_tables(cur):
+    # Completed orders moved out of a live database (see archive.py). Item ids
+    # are the archive's own; everything else is copied as is.
+    cur.execute('''CREATE TABLE IF NOT EXISTS orders (
+                   id INTEGER PRIMARY KEY,
+                   description TEXT,
+                   status TEXT,
+                   user_id INTEGER,
+                   dish_id INTEGER,
+                   total REAL,
+                   promocode_id INTEGER,
+                   discount REAL NOT NULL DEFAULT 0,
+                   branch_id INTEGER,
+                   courier_id INTEGER,
+                   created_at TEXT
+                   )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_orders_branch_id ON orders (branch_id)')
+    cur.execute('''CREATE TABLE IF NOT EXISTS order_items (
+                   id INTEGER PRIMARY KEY,
+                   order_id INTEGER NOT NULL,
+                   dish_id INTEGER NOT NULL,
+                   quantity INTEGER NOT NULL,
+                   unit_price REAL NOT NULL
+                   )''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+
+
+# Same append-only rule; add the archive's side of any new orders column here.
+ARCHIVE_MIGRATIONS = [
+    _archive_tables,
+]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Applies every migration newer than the database's user_version.
+
+    Each migration runs in its own transaction together with the version bump,
+    so an interrupted upgrade resumes where it stopped. BEGIN IMMEDIATE keeps
+    concurrently starting workers from applying the same migration twice.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for version, migration in enumerate(migrations, start=1):
+            cur = conn.cursor()
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                if cur.execute('PRAGMA user_version').fetchone()[0] >= version:
+                    cur.execute('ROLLBACK')
+                    continue
+                migration(cur)
+                cur.execute(f'PRAGMA user_version = {version}')
+                cur.execute('COMMIT')
+            except BaseException:
+                cur.execute('ROLLBACK')
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    return len(migrations)
+
+
+def create_database(path=DATABASE, migrations=MIGRATIONS):
+    conn = sqlite3.connect(path)
+    try:
+        # Only takes effect on a new, empty file; lets archive.py hand freed pages back
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        migrate(conn, migrations)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
     create_database()
\ No newline at end of file
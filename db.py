@@ -0,0 +1,176 @@
+import queue
+import sqlite3
+import threading
+
+from flask import current_app, g, has_request_context, request
+
+import database_create
+
+DATABASE = database_create.DATABASE
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),      # KiB, i.e. ~16 MB of page cache per connection
+    ('mmap_size', 268435456),    # 256 MB memory-mapped I/O
+    ('busy_timeout', 5000),      # ms to wait on a locked database
+    ('temp_store', 'MEMORY'),
+)
+
+POOL_SIZE = 8
+
+_pool_lock = threading.Lock()
+
+
+def _chain(callbacks):
+    # SQLite has a single trace slot per connection; this one calls every
+    # callback registered at the time of the statement.
+    def trace(statement):
+        for callback in list(callbacks):
+            callback(statement)
+    return trace
+
+
+def connect(path, readonly=False, attach=None, factory=sqlite3.Connection, hooks=(), traces=None):
+    """Opens a connection to ``path`` with the standard pragmas applied.
+
+    ``attach`` maps schema names to further database files to attach.
+    ``factory`` is the sqlite3.Connection subclass to use, ``hooks`` are
+    called with the new connection, and ``traces`` is a list of trace
+    callbacks, read on every statement so callbacks added later see
+    existing connections too. See ``connect_options`` for an app's.
+    """
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False, factory=factory)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, factory=factory)
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    for schema, attached in (attach or {}).items():
+        conn.execute(f'ATTACH DATABASE ? AS {schema}', (f'file:{attached}?mode=ro' if readonly else attached,))
+    if readonly:
+        conn.execute('PRAGMA query_only=1')
+    for hook in hooks:
+        hook(conn)
+    if traces is not None:
+        conn.set_trace_callback(_chain(traces))
+    return conn
+
+
+def connect_hooks(app):
+    """The app's list of functions called with every new connection."""
+    return app.extensions.setdefault('db_connect_hooks', [])
+
+
+def trace_callbacks(app):
+    """The app's list of trace callbacks, called with every statement its
+    connections run (trigger bodies arrive as ``--`` comments)."""
+    return app.extensions.setdefault('db_trace_callbacks', [])
+
+
+def connect_options(app=None):
+    """The ``connect`` keyword arguments for the app's own connections."""
+    app = app or current_app
+    return dict(factory=app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection),
+                hooks=connect_hooks(app), traces=trace_callbacks(app))
+
+
+class ConnectionPool:
+    """Keeps idle SQLite connections around so requests don't reconnect.
+
+    Read-write and read-only connections are pooled separately. A connection
+    is only ever handed to one thread at a time, so ``check_same_thread`` is
+    relaxed to let a connection opened by one worker thread be reused by the
+    next.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, attach=None, **options):
+        self.path = path
+        self.size = size
+        self.attach = attach
+        self.options = options  # further ``connect`` arguments
+        self._idle = {False: queue.LifoQueue(), True: queue.LifoQueue()}
+        self._wal_enabled = False
+
+    def _connect(self, readonly):
+        if readonly and not self._wal_enabled:
+            # Switching to WAL needs a writable handle; do it once up front.
+            self.release(self._connect(False), False)
+        conn = connect(self.path, readonly, self.attach, **self.options)
+        self._wal_enabled = True
+        return conn
+
+    def acquire(self, readonly=False):
+        try:
+            return self._idle[readonly].get_nowait()
+        except queue.Empty:
+            return self._connect(readonly)
+
+    def release(self, conn, readonly=False):
+        if conn.in_transaction:
+            conn.rollback()
+        idle = self._idle[readonly]
+        if idle.qsize() < self.size:
+            idle.put_nowait(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        for idle in self._idle.values():
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+def get_pool(app=None):
+    app = app or current_app
+    pool = app.extensions.get('db_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None:
+                # Bring the schema up to date before the first connection is handed out.
+                database_create.create_database(app.config['DATABASE'])
+                pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'], **connect_options(app))
+                app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_db(readonly=None):
+    """Returns the connection bound to the current app context.
+
+    GET and HEAD requests get a read-only connection unless ``readonly`` is
+    given explicitly. The connection goes back to the pool on teardown.
+    """
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+    key = 'db_ro' if readonly else 'db_rw'
+    conn = g.get(key)
+    if conn is None:
+        conn = get_pool().acquire(readonly)
+        setattr(g, key, conn)
+    return conn
+
+
+def release_db(exc=None):
+    # No pool means no connection was taken; don't create one during teardown
+    pool = current_app.extensions.get('db_pool')
+    if pool is None:
+        return
+    for key, readonly in (('db_ro', True), ('db_rw', False)):
+        conn = g.pop(key, None)
+        if conn is not None:
+            pool.release(conn, readonly)
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', DATABASE)
+    app.config.setdefault('DB_POOL_SIZE', POOL_SIZE)
+    # sqlite3.Connection subclass for the app's connections, e.g. to time queries
+    app.config.setdefault('DB_CONNECTION_FACTORY', sqlite3.Connection)
+    app.teardown_appcontext(release_db)
@@ -0,0 +1,240 @@
+"""Automatic assignment of ready orders to couriers.
+
+An order that becomes "Ready for Pickup" goes to the least-loaded courier
+of its branch, where couriers without a branch serve every branch and a
+courier's load is the number of assigned orders not yet completed. When
+every candidate already carries ``DISPATCH_MAX_LOAD`` orders, the order
+waits and goes to the first courier that completes one.
+
+The loads live in memory, in one heap per branch, and change as orders are
+assigned and completed instead of being counted for every decision. Heap
+entries are never updated in place: a load change pushes a new entry, and
+outdated ones are dropped when they surface. Each worker process has its
+own dispatcher, which reloads couriers, loads and waiting orders from the
+database every ``DISPATCH_RESYNC`` seconds to pick up the other workers'
+assignments. Assignments are written with a conditional UPDATE, so an
+order never gets two couriers.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from flask import current_app
+
+import partitions
+from db import get_db
+
+MAX_LOAD = 5
+RESYNC_INTERVAL = 30  # seconds
+ALL = 'all'  # heap of every courier, for orders placed without a branch
+COMPACT_SLACK = 64  # outdated heap entries tolerated before a rebuild
+
+_dispatcher_lock = threading.Lock()
+
+
+class Dispatcher:
+    def __init__(self, max_load=MAX_LOAD):
+        self.max_load = max_load
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._loaded_at = None
+        self._clear()
+
+    def _clear(self):
+        self._couriers = {}  # courier id -> branch id, None for every branch
+        self._load = {}      # courier id -> open orders assigned
+        self._current = {}   # courier id -> seq of its live heap entry
+        self._heaps = {}     # branch id, None or ALL -> [(load, seq, courier id)]
+        self._assigned = {}  # open order id -> courier id
+        self._waiting = {}   # branch id -> {order id: None}, oldest first
+
+    def is_stale(self, max_age):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > max_age
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def load(self, couriers, open_orders, waiting):
+        """Replaces the in-memory state with what the database holds.
+
+        ``couriers`` are (courier id, branch id) pairs, ``open_orders`` are
+        (order id, courier id) pairs of assigned orders not yet completed,
+        and ``waiting`` are (order id, branch id) pairs of ready orders
+        without a courier, oldest first.
+        """
+        with self._lock:
+            self._clear()
+            for courier_id, branch_id in couriers:
+                self._couriers[courier_id] = branch_id
+                self._load[courier_id] = 0
+            for order_id, courier_id in open_orders:
+                # Orders of deleted couriers don't count against anyone
+                if courier_id in self._couriers:
+                    self._assigned[order_id] = courier_id
+                    self._load[courier_id] += 1
+            for courier_id in self._couriers:
+                self._push(courier_id)
+            for order_id, branch_id in waiting:
+                self._waiting.setdefault(branch_id, {})[order_id] = None
+            self._loaded_at = time.monotonic()
+
+    def _push(self, courier_id):
+        seq = next(self._seq)
+        self._current[courier_id] = seq
+        entry = (self._load[courier_id], seq, courier_id)
+        for key in (self._couriers[courier_id], ALL):
+            heap = self._heaps.setdefault(key, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 2 * len(self._couriers) + COMPACT_SLACK:
+                heap[:] = [entry for entry in heap if self._current.get(entry[2]) == entry[1]]
+                heapq.heapify(heap)
+
+    def _peek(self, key):
+        heap = self._heaps.get(key)
+        while heap:
+            entry = heap[0]
+            if self._current.get(entry[2]) == entry[1]:
+                return entry
+            heapq.heappop(heap)
+        return None
+
+    def _pick(self, branch_id):
+        if branch_id is None:
+            candidates = [self._peek(ALL)]
+        else:
+            candidates = [self._peek(branch_id), self._peek(None)]
+        # On equal load the branch's own courier goes before a floating one
+        candidates = [entry for entry in candidates if entry is not None and entry[0] < self.max_load]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda entry: (entry[0], self._couriers[entry[2]] is None, entry[1]))[2]
+
+    def _adjust(self, courier_id, delta):
+        if courier_id in self._load:
+            self._load[courier_id] += delta
+            self._push(courier_id)
+
+    def reserve(self, order_id, branch_id):
+        """Picks a courier for a ready order and counts the order against them.
+
+        Returns the courier id, or None if the order is already assigned or
+        has to wait for a courier to free up.
+        """
+        with self._lock:
+            if order_id in self._assigned:
+                return None
+            courier_id = self._pick(branch_id)
+            if courier_id is None:
+                self._waiting.setdefault(branch_id, {})[order_id] = None
+                return None
+            self._waiting.get(branch_id, {}).pop(order_id, None)
+            self._assigned[order_id] = courier_id
+            self._adjust(courier_id, 1)
+            return courier_id
+
+    def cancel(self, order_id):
+        """Undoes a reservation that couldn't be written."""
+        with self._lock:
+            self._adjust(self._assigned.pop(order_id, None), -1)
+
+    def release(self, order_id, branch_id=None):
+        """Takes a completed order off its courier's load (or the waiting list)."""
+        with self._lock:
+            self._adjust(self._assigned.pop(order_id, None), -1)
+            self._waiting.get(branch_id, {}).pop(order_id, None)
+
+    def reserve_waiting(self):
+        """Reserves couriers for as many waiting orders as possible.
+
+        Returns the (order id, courier id) pairs reserved.
+        """
+        reserved = []
+        with self._lock:
+            for branch_id, orders in self._waiting.items():
+                for order_id in list(orders):
+                    courier_id = self._pick(branch_id)
+                    if courier_id is None:
+                        break
+                    del orders[order_id]
+                    self._assigned[order_id] = courier_id
+                    self._adjust(courier_id, 1)
+                    reserved.append((order_id, courier_id))
+        return reserved
+
+    def snapshot(self):
+        with self._lock:
+            loads = [dict(courier_id=courier_id, branch_id=self._couriers[courier_id], load=load)
+                     for courier_id, load in self._load.items()]
+            waiting = sum(len(orders) for orders in self._waiting.values())
+        return loads, waiting
+
+
+def get_dispatcher(app=None):
+    app = app or current_app
+    dispatcher = app.extensions.get('dispatcher')
+    if dispatcher is None:
+        with _dispatcher_lock:
+            dispatcher = app.extensions.get('dispatcher')
+            if dispatcher is None:
+                dispatcher = app.extensions['dispatcher'] = Dispatcher(app.config['DISPATCH_MAX_LOAD'])
+    return dispatcher
+
+
+def sync(force=False):
+    """Reloads the dispatcher from the database once it is older than DISPATCH_RESYNC."""
+    dispatcher = get_dispatcher()
+    if not force and not dispatcher.is_stale(current_app.config['DISPATCH_RESYNC']):
+        return dispatcher
+    couriers = get_db().execute("SELECT id, branch_id FROM user WHERE role = 'courier'").fetchall()
+    # The literals match idx_orders_open_courier's WHERE clause, so the partial index is used
+    open_orders = partitions.fan_out('''SELECT id, courier_id FROM orders
+                                        WHERE courier_id IS NOT NULL AND status != 'Completed'
+                                        ORDER BY id''', plain=True)
+    waiting = partitions.fan_out('''SELECT id, branch_id FROM orders
+                                    WHERE status = 'Ready for Pickup' AND courier_id IS NULL
+                                    ORDER BY id''', plain=True)
+    dispatcher.load(couriers, list(open_orders), list(waiting))
+    return dispatcher
+
+
+def _assign(dispatcher, order_id, courier_id):
+    # Only a ready order that nobody (e.g. another worker) has assigned yet
+    assigned = partitions.write_order(order_id, lambda conn: conn.execute(
+        '''UPDATE orders SET courier_id = ? WHERE id = ? AND courier_id IS NULL
+           AND status = 'Ready for Pickup' ''', (courier_id, order_id)).rowcount)
+    if not assigned:
+        dispatcher.cancel(order_id)
+    return bool(assigned)
+
+
+def assign_waiting(dispatcher=None):
+    """Writes an assignment for every waiting order a courier can take."""
+    dispatcher = dispatcher or sync()
+    return sum(_assign(dispatcher, order_id, courier_id) for order_id, courier_id in dispatcher.reserve_waiting())
+
+
+def status_changed(order_id, status, branch_id):
+    """Updates the dispatcher after an order's status has been committed.
+
+    Returns the courier a newly ready order was assigned to, if any.
+    """
+    dispatcher = sync()
+    if status == 'Ready for Pickup':
+        courier_id = dispatcher.reserve(order_id, branch_id)
+        if courier_id is not None and _assign(dispatcher, order_id, courier_id):
+            return courier_id
+    elif status == 'Completed':
+        dispatcher.release(order_id, branch_id)
+        assign_waiting(dispatcher)  # the courier may have room for a waiting order
+    return None
+
+
+def couriers_changed():
+    """Makes the next dispatch reload the couriers."""
+    get_dispatcher().invalidate()
+
+
+def init_app(app):
+    app.config.setdefault('DISPATCH_MAX_LOAD', MAX_LOAD)
+    app.config.setdefault('DISPATCH_RESYNC', RESYNC_INTERVAL)
@@ -0,0 +1,245 @@
+"""Synthetic production-scale data for benchmarking and load testing.
+
+Builds a fresh database with database_create and fills it with users,
+branches, a menu, promo codes and orders, deterministically from a seed::
+
+    python generate_data.py big.db --users 100000 --orders 2000000 \\
+        --status-mix "Completed=0.9,Pending=0.04,In Kitchen=0.03,Ready for Pickup=0.03"
+"""
+import argparse
+import calendar
+import itertools
+import os
+import random
+import sys
+import time
+
+import database_create
+import db
+from qr import generate_qr_code
+
+DEFAULTS = dict(
+    users=1000,
+    role_mix={'user': 0.9, 'courier': 0.06, 'kitchen': 0.03, 'administration': 0.01},
+    branches=5,
+    categories=5,
+    sub_categories_per_category=(2, 6),
+    dishes_per_sub_category=(3, 15),
+    price_range=(1.0, 30.0),
+    promocodes=1000,
+    discounts=(5, 10, 15, 20, 25),
+    orders=10000,
+    status_mix={'Completed': 0.85, 'Pending': 0.05, 'In Kitchen': 0.05, 'Ready for Pickup': 0.05},
+    items_per_order=(1, 4),
+    popularity_skew=1.1,
+    history_days=365,
+    # Last day (UTC) of the history; fixed, so the timestamps follow from the seed alone
+    end_date='2025-01-01',
+)
+CHUNK_SIZE = 20000
+
+# Only for the load itself: durability doesn't matter until the file is complete.
+LOAD_PRAGMAS = (
+    ('synchronous', 'OFF'),
+    ('cache_size', -262144),  # 256 MB
+    ('temp_store', 'MEMORY'),
+)
+
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _insert(conn, sql, rows, chunk_size):
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        with conn:
+            conn.executemany(sql, chunk)
+        count += len(chunk)
+    return count
+
+
+def _weighted(rng, mix, k):
+    return rng.choices(list(mix), weights=list(mix.values()), k=k)
+
+
+def generate(path, seed=0, chunk_size=CHUNK_SIZE, render_qr=False, log=None, **options):
+    """Creates ``path`` and fills it; ``options`` override ``DEFAULTS``.
+
+    Returns the number of rows written per table.
+    """
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown option(s): {', '.join(sorted(unknown))}")
+    opts = {**DEFAULTS, **options}
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+
+    database_create.create_database(path)
+    conn = db.connect(path)
+    for name, value in LOAD_PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    counts = {}
+    try:
+        roles = _weighted(rng, opts['role_mix'], opts['users'])
+        counts['user'] = _insert(conn, 'INSERT INTO user (name, phone, role) VALUES (?, ?, ?)',
+                                 ((f'{role.title()} {i}', f'+1555{i:07d}', role) for i, role in enumerate(roles)),
+                                 chunk_size)
+        log(f"user: {counts['user']}")
+
+        counts['branch'] = _insert(conn, 'INSERT INTO branch (name, address, phone) VALUES (?, ?, ?)',
+                                   ((f'Branch {i}', f'{i + 1} Main Street', f'+1556{i:07d}')
+                                    for i in range(opts['branches'])), chunk_size)
+
+        with conn:
+            conn.executemany('INSERT INTO categories (name) VALUES (?)',
+                             [(f'Category {i}',) for i in range(opts['categories'])])
+            category_ids = [row[0] for row in conn.execute('SELECT id FROM categories ORDER BY id')]
+            conn.executemany('INSERT INTO sub_category (name, category_id) VALUES (?, ?)',
+                             [(f'Sub-category {category_id}.{i}', category_id)
+                              for category_id in category_ids
+                              for i in range(rng.randint(*opts['sub_categories_per_category']))])
+        sub_categories = conn.execute('SELECT id, category_id FROM sub_category ORDER BY id').fetchall()
+        low, high = opts['price_range']
+        counts['dishes'] = _insert(
+            conn, 'INSERT INTO dishes (name, price, category_id, sub_category_id) VALUES (?, ?, ?, ?)',
+            ((f'Dish {sub_category_id}.{i}', round(rng.uniform(low, high), 2), category_id, sub_category_id)
+             for sub_category_id, category_id in sub_categories
+             for i in range(rng.randint(*opts['dishes_per_sub_category']))),
+            chunk_size)
+        log(f"dishes: {counts['dishes']}")
+
+        placeholder = None if render_qr else generate_qr_code('PLACEHOLDER')
+        counts['promocodes'] = _insert(
+            conn, 'INSERT INTO promocodes (code, discount, qr_code) VALUES (?, ?, ?)',
+            ((code, rng.choice(opts['discounts']), placeholder or generate_qr_code(code))
+             for code in (f'GEN{seed}X{i:08d}' for i in range(opts['promocodes']))),
+            chunk_size)
+        log(f"promocodes: {counts['promocodes']}")
+
+        # Historical orders are not news for the kitchen feed, and skipping the
+        # per-row event insert makes the load markedly faster. The sales rollups
+        # are likewise built in one pass at the end rather than row by row.
+        conn.execute('DROP TRIGGER IF EXISTS orders_insert_event')
+        for name in database_create.SALES_ROLLUP_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        try:
+            counts['orders'], counts['order_items'] = _generate_orders(conn, rng, opts, chunk_size, log)
+        finally:
+            conn.execute(database_create.ORDER_INSERT_EVENT_TRIGGER)
+            for trigger in database_create.SALES_ROLLUP_TRIGGERS.values():
+                conn.execute(trigger)
+        with conn:
+            database_create.rebuild_sales_rollups(conn.cursor())
+        log('sales rollups rebuilt')
+    finally:
+        conn.execute('PRAGMA optimize')
+        conn.close()
+    return counts
+
+
+def _generate_orders(conn, rng, opts, chunk_size, log):
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM user WHERE role = 'user'")] or [None]
+    dishes = conn.execute('SELECT id, price FROM dishes ORDER BY id').fetchall()
+    if not dishes:
+        return 0, 0
+    # Zipf-like popularity so a few dishes dominate, as on a real menu
+    rng.shuffle(dishes)
+    cum_weights = list(itertools.accumulate(1 / (rank ** opts['popularity_skew'])
+                                            for rank in range(1, len(dishes) + 1)))
+    next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM orders').fetchone()[0]
+    statuses, status_weights = list(opts['status_mix']), list(opts['status_mix'].values())
+    # Creation times rise with the id, spread evenly over the history period up to the end of end_date
+    ended = calendar.timegm(time.strptime(opts['end_date'], '%Y-%m-%d')) + 86400
+    started = ended - opts['history_days'] * 86400
+    step = opts['history_days'] * 86400 / max(opts['orders'], 1)
+    total_orders = total_items = 0
+    while total_orders < opts['orders']:
+        size = min(chunk_size, opts['orders'] - total_orders)
+        orders, items = [], []
+        for order_id in range(next_id, next_id + size):
+            picked = {}
+            for dish_id, price in rng.choices(dishes, cum_weights=cum_weights,
+                                              k=rng.randint(*opts['items_per_order'])):
+                picked[dish_id] = (picked.get(dish_id, (0, price))[0] + 1, price)
+            items.extend((order_id, dish_id, quantity, price) for dish_id, (quantity, price) in picked.items())
+            created_at = time.gmtime(started + (total_orders + len(orders) + rng.random()) * step)
+            orders.append((order_id, f'Order {order_id}',
+                           rng.choices(statuses, weights=status_weights)[0], rng.choice(user_ids),
+                           round(sum(quantity * price for quantity, price in picked.values()), 2),
+                           time.strftime('%Y-%m-%d %H:%M:%S', created_at)))
+        with conn:
+            conn.executemany('INSERT INTO orders (id, description, status, user_id, total, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', orders)
+            conn.executemany('INSERT INTO order_items (order_id, dish_id, quantity, unit_price) VALUES (?, ?, ?, ?)',
+                             items)
+        next_id += size
+        total_orders += size
+        total_items += len(items)
+        log(f'orders: {total_orders}/{opts["orders"]}')
+    return total_orders, total_items
+
+
+def _mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def _range(text):
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
+def _date(text):
+    time.strptime(text, '%Y-%m-%d')  # raises ValueError, which argparse reports
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', help='database file to create')
+    parser.add_argument('--force', action='store_true', help='replace the database if it exists')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per transaction')
+    parser.add_argument('--render-qr', action='store_true',
+                        help='render a real QR image per promo code (slow) instead of a shared placeholder')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--role-mix', type=_mix, help='e.g. "user=0.9,courier=0.06,kitchen=0.03,administration=0.01"')
+    parser.add_argument('--branches', type=int)
+    parser.add_argument('--categories', type=int)
+    parser.add_argument('--sub-categories-per-category', type=_range, help='N or MIN-MAX')
+    parser.add_argument('--dishes-per-sub-category', type=_range, help='N or MIN-MAX')
+    parser.add_argument('--promocodes', type=int)
+    parser.add_argument('--orders', type=int)
+    parser.add_argument('--status-mix', type=_mix, help='e.g. "Completed=0.85,Pending=0.05,..."')
+    parser.add_argument('--items-per-order', type=_range, help='N or MIN-MAX')
+    parser.add_argument('--popularity-skew', type=float, help='Zipf exponent of dish popularity')
+    parser.add_argument('--history-days', type=int, help='days over which order creation times are spread')
+    parser.add_argument('--end-date', type=_date, help=f"YYYY-MM-DD (UTC) the history ends on "
+                                                     f"(default {DEFAULTS['end_date']})")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.database):
+        if not args.force:
+            parser.error(f'{args.database} exists; pass --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.database + suffix):
+                os.remove(args.database + suffix)
+
+    options = {name: value for name, value in vars(args).items() if name in DEFAULTS and value is not None}
+    started = time.perf_counter()
+    counts = generate(args.database, seed=args.seed, chunk_size=args.chunk_size, render_qr=args.render_qr,
+                      log=lambda message: print(message, file=sys.stderr), **options)
+    seconds = time.perf_counter() - started
+    rows = sum(counts.values())
+    print(f'Wrote {rows} rows in {seconds:.1f}s ({rows / seconds:.0f} rows/s): '
+          + ', '.join(f'{table}={count}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Optional single-writer path that commits concurrent writes together.
+
+With ``GROUP_COMMIT`` enabled, order mutations are handed to one writer
+thread per process instead of each request committing on its own
+connection. The writer takes whatever arrives within ``GROUP_COMMIT_WINDOW_MS``
+of the first queued write, runs every write in its own savepoint inside a
+single transaction, commits once with a full fsync, and only then answers
+the waiting requests. Under burst load that turns hundreds of commits and
+lock hand-overs into a few.
+
+A batch that fails as a whole (a failed commit, or a rollback SQLite had
+already done itself) fails its writes, and the writer carries on with a new
+connection. A request that gives up waiting is only told so if its write
+never ran; otherwise it waits for the outcome.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from flask import current_app
+
+import db
+
+WINDOW_MS = 2
+MAX_BATCH = 500
+WRITE_TIMEOUT = 30  # seconds a request waits for its batch to commit
+
+_writer_lock = threading.Lock()
+
+
+class GroupCommitWriter:
+    def __init__(self, path, window=WINDOW_MS / 1000, max_batch=MAX_BATCH, attach=None, **options):
+        self.path = path
+        self.attach = attach
+        self.options = options  # further ``db.connect`` arguments
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = dict(writes=0, commits=0, failed_writes=0)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+    def submit(self, write):
+        """Queues ``write(conn)`` and returns a Future for its return value.
+
+        The Future resolves once the transaction containing the write has
+        committed, or with the exception the write (or the commit) raised.
+        A write whose Future is cancelled before its batch starts never runs.
+        """
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def write(self, write, timeout=WRITE_TIMEOUT):
+        """Runs ``write(conn)`` through the writer and returns its result.
+
+        Raises TimeoutError only for a write that never ran. Once its batch
+        has started, the outcome is waited for, so a caller is never told a
+        write failed that then commits.
+        """
+        future = self.submit(write)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # finish this batch, then stop
+                break
+            batch.append(job)
+        return batch
+
+    def _connect(self):
+        conn = db.connect(self.path, attach=self.attach, **self.options)
+        conn.isolation_level = None  # transactions are managed explicitly below
+        # One fsync per batch is affordable, so every acknowledged write is durable
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    break
+                # Cancelled writes are dropped; the rest can't be cancelled from here on
+                batch = [(write, future) for write, future in self._collect(first)
+                         if future.set_running_or_notify_cancel()]
+                try:
+                    conn = conn or self._connect()
+                    self._commit(conn, batch)
+                except Exception as e:
+                    # E.g. a failed ROLLBACK after SQLite had already rolled back on a full
+                    # disk: the connection's state is unknown, so fail the batch and start over
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    self.stats['failed_writes'] += len(batch)
+                    if conn is not None:
+                        self._discard(conn)
+                    conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _discard(conn):
+        # Roll back first: close() defers to the last statement being freed (e.g.
+        # one kept alive by the exception's traceback), and holds the lock until then
+        try:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+        conn.close()
+
+    def _commit(self, conn, batch):
+        results = []
+        conn.execute('BEGIN IMMEDIATE')
+        for write, future in batch:
+            # A failing write only rolls back its own savepoint, not the batch
+            conn.execute('SAVEPOINT write')
+            try:
+                results.append((future, write(conn), None))
+                conn.execute('RELEASE write')
+            except Exception as e:
+                conn.execute('ROLLBACK TO write')
+                conn.execute('RELEASE write')
+                results.append((future, None, e))
+        try:
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        self.stats['commits'] += 1
+        for future, result, error in results:
+            self.stats['writes'] += 1
+            if error is None:
+                future.set_result(result)
+            else:
+                self.stats['failed_writes'] += 1
+                future.set_exception(error)
+
+
+def get_writer(app=None, path=None, attach=None):
+    """Returns the writer of ``path``, the main database by default.
+
+    Each database file gets its own writer, as each has its own write lock.
+    """
+    app = app or current_app
+    path = path or app.config['DATABASE']
+    writers = app.extensions.setdefault('group_commit', {})
+    writer = writers.get(path)
+    if writer is None or not writer.alive:
+        with _writer_lock:
+            writer = writers.get(path)
+            if writer is None or not writer.alive:
+                db.get_pool(app)  # brings the schema up to date first
+                writer = GroupCommitWriter(path, app.config['GROUP_COMMIT_WINDOW_MS'] / 1000, attach=attach,
+                                           **db.connect_options(app))
+                writers[path] = writer
+    return writer
+
+
+def write(fn):
+    """Runs ``fn(conn)`` in a committed transaction and returns its result.
+
+    With GROUP_COMMIT the call goes through the writer thread, so ``fn`` must
+    not touch the request; otherwise it runs on the request's connection.
+    """
+    app = current_app
+    if app.config['GROUP_COMMIT']:
+        return get_writer(app).write(fn)
+    conn = db.get_db(readonly=False)
+    result = fn(conn)
+    conn.commit()
+    return result
+
+
+def init_app(app):
+    app.config.setdefault('GROUP_COMMIT', False)
+    app.config.setdefault('GROUP_COMMIT_WINDOW_MS', WINDOW_MS)
@@ -0,0 +1,39 @@
+"""Reads the kitchen board: how much of each dish is waiting in each open status.
+
+The counts come from the ``kitchen_board`` table, which triggers on orders
+and order lines keep current (see database_create._kitchen_board), so a
+read costs one row per dish and status rather than a scan of the orders.
+With partitioned orders every partition keeps its own table and the reads
+are summed.
+"""
+from database_create import KITCHEN_BOARD_STATUSES as STATUSES
+import partitions
+from db import get_db
+
+
+def read(branch_id=None):
+    """Returns [{dish_id, dish_name, <status>: quantity, ...}] by dish name.
+
+    ``branch_id`` 0 selects the orders placed without a branch.
+    """
+    query = 'SELECT dish_id, status, SUM(quantity) FROM kitchen_board WHERE quantity > 0'
+    params = []
+    if branch_id is not None:
+        query += ' AND branch_id = ?'
+        params.append(branch_id)
+    query += ' GROUP BY dish_id, status'
+
+    counts = {}
+    for conn in partitions.order_dbs(branch_id or None):
+        cur = conn.cursor()
+        cur.row_factory = None
+        for dish_id, status, quantity in cur.execute(query, params):
+            counts.setdefault(dish_id, dict.fromkeys(STATUSES, 0))[status] += quantity
+    if not counts:
+        return []
+
+    placeholders = ', '.join('?' * len(counts))
+    names = dict(get_db().execute(f'SELECT id, name FROM dishes WHERE id IN ({placeholders})', list(counts)).fetchall())
+    board = [dict(dish_id=dish_id, dish_name=names.get(dish_id), **statuses) for dish_id, statuses in counts.items()]
+    board.sort(key=lambda row: (row['dish_name'] is None, row['dish_name'] or '', row['dish_id']))
+    return board
@@ -0,0 +1,121 @@
+import json
+import queue
+import threading
+
+from flask import current_app
+
+import db
+
+POLL_INTERVAL = 1.0       # seconds between checks for changes made by other workers
+SUBSCRIBER_BACKLOG = 1000  # events buffered per screen before it is dropped
+
+
+class OrderFeed:
+    """Fans committed order events out to every connected kitchen screen.
+
+    Events are rows of ``order_events``, written by triggers alongside the
+    order change itself. One background thread per process tails that table
+    and hands each new row to every subscriber queue, so any number of
+    screens share a single query. Writers in this process call ``notify``
+    after committing to have the thread look immediately instead of waiting
+    for the next poll.
+    """
+
+    def __init__(self, path, poll_interval=POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(SUBSCRIBER_BACKLOG)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                # Take the starting point now rather than in the thread, so the
+                # caller's replay and the live feed are guaranteed to overlap.
+                conn = db.connect(self.path, readonly=True)
+                last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+                self._thread = threading.Thread(target=self._run, args=(conn, last_id),
+                                                name='order-feed', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _drop(self, subscriber):
+        # A screen that stopped reading is cut off; the None tells its stream
+        # to end so the client reconnects and catches up via Last-Event-ID.
+        self.unsubscribe(subscriber)
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+    def notify(self):
+        self._wake.set()
+
+    def replay(self, after_id):
+        """Returns the retained events newer than ``after_id``."""
+        conn = db.connect(self.path, readonly=True)
+        try:
+            return [dict(row) for row in
+                    conn.execute('SELECT * FROM order_events WHERE id > ? ORDER BY id', (after_id,))]
+        finally:
+            conn.close()
+
+    def _run(self, conn, last_id):
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                events = [dict(row) for row in
+                          conn.execute('SELECT * FROM order_events WHERE id > ? ORDER BY id', (last_id,))]
+                if not events:
+                    continue
+                last_id = events[-1]['id']
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for subscriber in subscribers:
+                    for event in events:
+                        try:
+                            subscriber.put_nowait(event)
+                        except queue.Full:
+                            self._drop(subscriber)
+                            break
+        finally:
+            conn.close()
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+def get_feed(app=None, path=None):
+    """Returns the feed of ``path``, the main database by default.
+
+    Order partitions (see partitions.py) keep their own events, so each
+    database file has its own feed.
+    """
+    app = app or current_app
+    path = path or app.config['DATABASE']
+    feeds = app.extensions.setdefault('order_feeds', {})
+    feed = feeds.get(path)
+    if feed is None:
+        feed = feeds.setdefault(path, OrderFeed(path))
+    return feed
+
+
+def notify(app=None):
+    for feed in list((app or current_app).extensions.get('order_feeds', {}).values()):
+        feed.notify()
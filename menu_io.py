@@ -0,0 +1,217 @@
+"""Streaming bulk import and export of the menu as CSV or JSON Lines.
+
+Every record is one dish with its category and sub-category given by name::
+
+    category,sub_category,dish,price,img_link
+    Beverages,Tea,Green Tea,2.5,https://...
+
+Records with an empty ``dish`` only declare a category / sub-category.
+Usage::
+
+    python menu_io.py export menu.csv
+    python menu_io.py import menu.jsonl
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sys
+
+import database_create
+import db
+
+FIELDS = ['category', 'sub_category', 'dish', 'price', 'img_link']
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 500
+EXPORT_FLUSH_ROWS = 200  # CSV rows buffered per yielded chunk
+
+EXPORT_QUERY = '''
+    SELECT categories.name, sub_category.name, dishes.name, dishes.price, dishes.img_link
+    FROM dishes
+    LEFT JOIN categories ON dishes.category_id = categories.id
+    LEFT JOIN sub_category ON dishes.sub_category_id = sub_category.id
+    UNION ALL
+    SELECT categories.name, sub_category.name, NULL, NULL, NULL
+    FROM sub_category
+    LEFT JOIN categories ON sub_category.category_id = categories.id
+    WHERE NOT EXISTS (SELECT 1 FROM dishes WHERE dishes.sub_category_id = sub_category.id)
+    UNION ALL
+    SELECT categories.name, NULL, NULL, NULL, NULL
+    FROM categories
+    WHERE NOT EXISTS (SELECT 1 FROM sub_category WHERE sub_category.category_id = categories.id)
+      AND NOT EXISTS (SELECT 1 FROM dishes WHERE dishes.category_id = categories.id)
+'''
+
+
+def format_from_name(filename, default='csv'):
+    ext = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return ext if ext in FORMATS else default
+
+
+def read_records(stream, fmt):
+    """Yields one dict per record from a text stream, without reading it all."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f'Line {number}: not a JSON object')
+                yield record
+    else:
+        raise ValueError(f'Unsupported format {fmt!r}')
+
+
+def export_records(conn, fmt):
+    """Yields the whole menu encoded as ``fmt``, a chunk at a time."""
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(EXPORT_QUERY)
+    if fmt == 'jsonl':
+        for row in cur:
+            yield json.dumps(dict(zip(FIELDS, row)), separators=(',', ':')) + '\n'
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+        while rows := cur.fetchmany(EXPORT_FLUSH_ROWS):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        raise ValueError(f'Unsupported format {fmt!r}')
+
+
+class MenuImporter:
+    """Upserts menu records in batched transactions.
+
+    Category and sub-category names are resolved through in-memory maps that
+    are loaded once and extended as new ones are created. Dishes are matched
+    on (category, sub-category, name): existing ones get their price and
+    image updated, new ones are inserted.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.categories = {}
+        for category_id, name in conn.execute('SELECT id, name FROM categories ORDER BY id DESC'):
+            self.categories[name] = category_id
+        self.sub_categories = {}
+        for sub_category_id, name, category_id in conn.execute(
+                'SELECT id, name, category_id FROM sub_category ORDER BY id DESC'):
+            self.sub_categories[(category_id, name)] = sub_category_id
+        self.stats = dict(rows=0, categories_created=0, sub_categories_created=0, dishes_upserted=0)
+
+    def _category_id(self, name):
+        if name not in self.categories:
+            cur = self.conn.execute('INSERT INTO categories (name) VALUES (?)', (name,))
+            self.categories[name] = cur.lastrowid
+            self.stats['categories_created'] += 1
+        return self.categories[name]
+
+    def _sub_category_id(self, category_id, name):
+        key = (category_id, name)
+        if key not in self.sub_categories:
+            cur = self.conn.execute('INSERT INTO sub_category (name, category_id) VALUES (?, ?)', (name, category_id))
+            self.sub_categories[key] = cur.lastrowid
+            self.stats['sub_categories_created'] += 1
+        return self.sub_categories[key]
+
+    @staticmethod
+    def _text(row, record, field):
+        value = record.get(field)
+        if isinstance(value, (dict, list)):
+            raise ValueError(f'Row {row}: {field} is not text')
+        return '' if value is None else str(value).strip()
+
+    @staticmethod
+    def _price(row, record):
+        try:
+            price = float(record.get('price'))
+        except (TypeError, ValueError):
+            price = math.nan
+        if not math.isfinite(price) or price < 0:
+            raise ValueError(f"Row {row}: invalid price {record.get('price')!r}")
+        return price
+
+    def _write_batch(self, batch):
+        dishes = {}
+        for row, record in batch:
+            category = self._text(row, record, 'category')
+            if not category:
+                raise ValueError(f'Row {row}: record without a category')
+            category_id = self._category_id(category)
+            sub_category = self._text(row, record, 'sub_category')
+            sub_category_id = self._sub_category_id(category_id, sub_category) if sub_category else None
+            name = self._text(row, record, 'dish')
+            if name:
+                # Later records for the same dish win
+                dishes[(name, category_id, sub_category_id)] = (self._price(row, record),
+                                                                self._text(row, record, 'img_link') or None)
+
+        rows = [(price, img_link, name, category_id, sub_category_id)
+                for (name, category_id, sub_category_id), (price, img_link) in dishes.items()]
+        # A changed image link invalidates the cached thumbnail of the old image
+        self.conn.executemany('''UPDATE dishes SET price = ?1, img_link = ?2,
+                                     thumbnail = CASE WHEN img_link IS ?2 THEN thumbnail END
+                                 WHERE name = ?3 AND category_id IS ?4 AND sub_category_id IS ?5''', rows)
+        self.conn.executemany('''INSERT INTO dishes (price, img_link, name, category_id, sub_category_id)
+                                 SELECT ?1, ?2, ?3, ?4, ?5
+                                 WHERE NOT EXISTS (SELECT 1 FROM dishes
+                                                   WHERE name = ?3 AND category_id IS ?4 AND sub_category_id IS ?5)''',
+                              rows)
+        self.stats['dishes_upserted'] += len(rows)
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            self.stats['rows'] += 1
+            batch.append((self.stats['rows'], record))
+            if len(batch) >= self.batch_size:
+                with self.conn:
+                    self._write_batch(batch)
+                batch = []
+        if batch:
+            with self.conn:
+                self._write_batch(batch)
+        return self.stats
+
+
+def import_menu(conn, stream, fmt, batch_size=BATCH_SIZE):
+    return MenuImporter(conn, batch_size).run(read_records(stream, fmt))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('file', help="file to read or write; '-' for stdin/stdout")
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension, else csv')
+    parser.add_argument('--database', default=database_create.DATABASE)
+    args = parser.parse_args(argv)
+    fmt = args.format or format_from_name(args.file)
+
+    database_create.create_database(args.database)
+    conn = db.connect(args.database, readonly=args.action == 'export')
+    try:
+        if args.action == 'import':
+            stream = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+            with stream:
+                stats = import_menu(conn, stream, fmt)
+            print(', '.join(f'{key}={value}' for key, value in stats.items()))
+        else:
+            stream = sys.stdout if args.file == '-' else open(args.file, 'w', newline='', encoding='utf-8')
+            with stream:
+                for chunk in export_records(conn, fmt):
+                    stream.write(chunk)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
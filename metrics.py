@@ -0,0 +1,322 @@
+"""Request and database instrumentation exposed in Prometheus text format.
+
+Every request records its latency per endpoint, method and status code,
+the bytes it sent, and how many queries, rows and seconds it spent in
+SQLite and in Jinja. Counters live in per-thread stores that only their
+own thread writes, so recording takes no lock; a scrape sums the stores.
+Each worker process reports its own numbers.
+"""
+import bisect
+import sqlite3
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from flask import Response, request, template_rendered, before_render_template
+
+import db
+import slow_queries
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROGRESS_OPCODES = 1000  # SQLite VM instructions between progress callbacks
+
+COUNTERS = {
+    'http_response_bytes_total': 'Response body bytes sent',
+    'db_queries_total': 'SQL statements executed',
+    'db_seconds_total': 'Seconds spent executing SQL and fetching rows',
+    'db_rows_fetched_total': 'Rows fetched from SQLite',
+    'db_vm_steps_total': f'SQLite VM instructions executed, in units of {PROGRESS_OPCODES}',
+    'template_seconds_total': 'Seconds spent rendering Jinja templates',
+}
+
+
+class _Store:
+    """Counters and histograms written by a single thread."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        # Per-request scratch values, folded into counters when the request ends
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.vm_steps = 0
+        self.template_seconds = 0.0
+        self.template_started = None
+
+    def reset_request(self):
+        self.db_seconds = 0.0
+        self.queries = self.rows = self.vm_steps = 0
+        self.template_seconds = 0.0
+
+
+_local = threading.local()
+_live = weakref.WeakSet()
+_retired = _Store()
+_registry_lock = threading.Lock()
+
+
+def _merge(counters, histograms, into=None):
+    into = into or _retired
+    for key, value in counters.items():
+        into.counters[key] += value
+    for key, buckets in histograms.items():
+        target = into.histograms.setdefault(key, [0] * len(buckets))
+        for i, value in enumerate(buckets):
+            target[i] += value
+
+
+def _retire(counters, histograms):
+    with _registry_lock:
+        _merge(counters, histograms)
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = _Store()
+        with _registry_lock:
+            _live.add(store)
+        # Keep a finished thread's numbers once its store is garbage collected
+        weakref.finalize(store, _retire, store.counters, store.histograms)
+    return store
+
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    # Layout: one slot per bucket, then +Inf, sum and count
+    histograms = _store().histograms
+    key = (name, labels)
+    slots = histograms.get(key)
+    if slots is None:
+        slots = histograms[key] = [0] * (len(buckets) + 3)
+    slots[bisect.bisect_left(buckets, value)] += 1
+    slots[-2] += value
+    slots[-1] += 1
+
+
+def inc(name, labels, value=1):
+    _store().counters[(name, labels)] += value
+
+
+class MetricsCursor(sqlite3.Cursor):
+    """Cursor that times its statements from execute until the rows run out.
+
+    Each finished statement is handed to the slow-query log.
+    """
+    _statement = None  # (sql, parameters) of the statement being read
+    _elapsed = 0.0
+
+    def _begin(self, sql, parameters):
+        self._finish()
+        self._statement = (sql, parameters)
+        self._elapsed = 0.0
+
+    def _spent(self, started):
+        seconds = time.perf_counter() - started
+        _store().db_seconds += seconds
+        self._elapsed += seconds
+
+    def _finish(self):
+        if self._statement is not None:
+            sql, parameters = self._statement
+            self._statement = None
+            slow_queries.observe(self.connection, sql, parameters, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._spent(started)
+            if self.description is None:
+                self._finish()  # no rows to read
+
+    def executemany(self, sql, seq_of_parameters):
+        # Only a sequence can be peeked at without consuming it
+        sample = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self._begin(sql, sample)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._spent(started)
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._spent(started)
+        _store().rows += row is not None
+        # Single-row lookups rarely read on, so the statement counts as done
+        self._finish()
+        return row
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args)
+        self._spent(started)
+        _store().rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._spent(started)
+        _store().rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._spent(started)
+            self._finish()
+            raise
+        self._spent(started)
+        _store().rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except sqlite3.Error:
+            pass
+
+
+class MetricsConnection(sqlite3.Connection):
+    """Connection whose statements and fetches are timed and counted."""
+
+    def cursor(self, factory=MetricsCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def _trace(statement):
+    # Trigger bodies are reported as comments; count the statement only
+    if not statement.startswith('--'):
+        _store().queries += 1
+
+
+def _progress():
+    _store().vm_steps += 1
+    return 0
+
+
+def instrument_connection(conn):
+    conn.set_progress_handler(_progress, PROGRESS_OPCODES)
+
+
+def _before_request():
+    _store().reset_request()
+    request.environ['metrics.started'] = time.perf_counter()
+
+
+def _after_request(response):
+    started = request.environ.get('metrics.started')
+    if started is None:
+        return response
+    store = _store()
+    endpoint = request.endpoint or 'unmatched'
+    observe('http_request_duration_seconds', (endpoint, request.method, str(response.status_code)),
+            time.perf_counter() - started)
+    if not response.is_streamed:
+        inc('http_response_bytes_total', (endpoint,), response.calculate_content_length() or 0)
+    labels = (endpoint,)
+    inc('db_queries_total', labels, store.queries)
+    inc('db_seconds_total', labels, store.db_seconds)
+    inc('db_rows_fetched_total', labels, store.rows)
+    inc('db_vm_steps_total', labels, store.vm_steps)
+    inc('template_seconds_total', labels, store.template_seconds)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    _store().template_started = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    store = _store()
+    if store.template_started is not None:
+        store.template_seconds += time.perf_counter() - store.template_started
+        store.template_started = None
+
+
+def collect():
+    """Sums the retired and live per-thread stores into one snapshot."""
+    total = _Store()
+    with _registry_lock:
+        _merge(_retired.counters, _retired.histograms, total)
+        stores = list(_live)
+    for store in stores:
+        # Plain dict copies are atomic under the GIL, so no lock is needed
+        _merge(store.counters.copy(), {key: list(slots) for key, slots in store.histograms.copy().items()}, total)
+    return total
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+def render():
+    snapshot = collect()
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by endpoint, method and status',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (name, labels), slots in sorted(snapshot.histograms.items()):
+        label_text = _labels(('endpoint', 'method', 'status'), labels)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), slots[:-2]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label_text}}} {slots[-2]}')
+        lines.append(f'{name}_count{{{label_text}}} {slots[-1]}')
+
+    for metric, help_text in COUNTERS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for (name, labels), value in sorted(snapshot.counters.items()):
+            if name == metric:
+                lines.append(f'{metric}{{{_labels(("endpoint",), labels)}}} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    """
+    Prometheus metrics for this worker process.
+    ---
+    tags:
+      - Monitoring
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics in Prometheus text exposition format
+    """
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.config['DB_CONNECTION_FACTORY'] = MetricsConnection
+    db.connect_hooks(app).append(instrument_connection)
+    db.trace_callbacks(app).append(_trace)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,254 @@
+"""Optional per-branch partitioning of orders.
+
+By default every order lives in the main database behind its single write
+lock. With ``ORDER_PARTITIONS`` enabled, each branch's orders, order lines
+and order events go to a file of their own,
+``<PARTITION_DIR>/orders_branch_<id>.db``, so branches write in parallel.
+
+A partition connection attaches the main database as ``shared``. Tables the
+partition doesn't have (user, dishes, promocodes, ...) resolve to it, so the
+order queries run unchanged on either kind of connection. A write that also
+touches the main database, such as redeeming a promo code, takes both locks
+and is only atomic per file.
+
+Partitioned order ids are the creation time in milliseconds shifted left by
+``BRANCH_BITS``, plus the branch id: the id alone says which file holds the
+order, and ids from different files still sort by age. Orders placed before
+partitioning was enabled keep their ids and stay in the main database.
+
+Next to every order database there may be an archive file of old completed
+orders (see archive.py). Listings and lookups that need history read the
+archives too; nothing here writes to them.
+"""
+import heapq
+import operator
+import os
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+
+import database_create
+import db
+import group_commit
+
+PARTITION_DIR = 'partitions'
+FILE_RE = re.compile(r'^orders_branch_(\d+)\.db$')
+BRANCH_BITS = 10
+MAX_BRANCH_ID = (1 << BRANCH_BITS) - 1
+# Main database ids come from AUTOINCREMENT and stay far below this
+PARTITION_ID_MIN = 1 << 40
+ARCHIVE_SUFFIX = '_archive.db'
+
+_pools_lock = threading.Lock()
+
+
+def enabled(app=None):
+    return (app or current_app).config['ORDER_PARTITIONS']
+
+
+def branch_of(order_id):
+    """The branch whose partition holds ``order_id``; None for the main database."""
+    if order_id < PARTITION_ID_MIN:
+        return None
+    return order_id & MAX_BRANCH_ID
+
+
+def next_order_id(branch_id):
+    """SQL for a new order id in ``branch_id``'s partition, and its parameters.
+
+    Use it as the id value of the INSERT itself. The statement holds the
+    partition's write lock while it reads MAX(id), so concurrent inserts
+    can't allocate the same id; a SELECT before the INSERT runs without
+    the lock. (BEGIN IMMEDIATE would also lock the attached main database.)
+    """
+    order_id = (int(time.time() * 1000) << BRANCH_BITS) | branch_id
+    # The later of now and a millisecond after the last id, same branch bits
+    return f'MAX(?, COALESCE((SELECT MAX(id) FROM orders), 0) + {1 << BRANCH_BITS})', (order_id,)
+
+
+def path(branch_id, app=None):
+    app = app or current_app
+    return os.path.join(app.config['PARTITION_DIR'], f'orders_branch_{branch_id}.db')
+
+
+def branches(app=None):
+    """Ids of the branches that have a partition file."""
+    app = app or current_app
+    try:
+        names = os.listdir(app.config['PARTITION_DIR'])
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(FILE_RE.match, names) if match)
+
+
+def archive_path(database):
+    """The archive file that belongs to the order database ``database``."""
+    return os.path.splitext(database)[0] + ARCHIVE_SUFFIX
+
+
+def get_pool(branch_id, create=False, app=None):
+    """The connection pool of a partition, or None if it has no file and ``create`` is false."""
+    app = app or current_app
+    pools = app.extensions.setdefault('partition_pools', {})
+    pool = pools.get(branch_id)
+    if pool is None:
+        with _pools_lock:
+            pool = pools.get(branch_id)
+            if pool is None:
+                partition = path(branch_id, app)
+                if not create and not os.path.exists(partition):
+                    return None
+                db.get_pool(app)  # the main schema first, as every partition attaches it
+                os.makedirs(app.config['PARTITION_DIR'], exist_ok=True)
+                database_create.create_database(partition, database_create.PARTITION_MIGRATIONS)
+                pool = db.ConnectionPool(partition, app.config['DB_POOL_SIZE'],
+                                         attach={'shared': app.config['DATABASE']}, **db.connect_options(app))
+                pools[branch_id] = pool
+    return pool
+
+
+def get_db(branch_id, readonly=None):
+    """Like ``db.get_db``, for the partition of ``branch_id``.
+
+    ``branch_id`` None means the main database. Returns None when reading
+    from a partition that has no file yet; writing creates it.
+    """
+    if branch_id is None:
+        return db.get_db(readonly)
+    if readonly is None:
+        readonly = has_request_context() and request.method in ('GET', 'HEAD')
+    conns = g.setdefault('partition_dbs', {})
+    conn = conns.get((branch_id, readonly))
+    if conn is None:
+        pool = get_pool(branch_id, create=not readonly)
+        if pool is None:
+            return None
+        conn = conns[(branch_id, readonly)] = pool.acquire(readonly)
+    return conn
+
+
+def get_archive_db(branch_id):
+    """A read-only connection to the archive of ``branch_id``'s database
+    (None: the main database's), or None if it has no archive."""
+    app = current_app
+    conns = g.setdefault('archive_dbs', {})
+    conn = conns.get(branch_id)
+    if conn is None:
+        pools = app.extensions.setdefault('partition_pools', {})
+        pool = pools.get(('archive', branch_id))
+        if pool is None:
+            archive = archive_path(app.config['DATABASE'] if branch_id is None else path(branch_id, app))
+            if not os.path.exists(archive):
+                return None
+            pool = pools.setdefault(('archive', branch_id), db.ConnectionPool(
+                archive, app.config['DB_POOL_SIZE'], attach={'shared': app.config['DATABASE']},
+                **db.connect_options(app)))
+        conn = conns[branch_id] = pool.acquire(True)
+    return conn
+
+
+def release_dbs(exc=None):
+    for (branch_id, readonly), conn in g.pop('partition_dbs', {}).items():
+        get_pool(branch_id).release(conn, readonly)
+    pools = current_app.extensions.get('partition_pools', {})
+    for branch_id, conn in g.pop('archive_dbs', {}).items():
+        pools[('archive', branch_id)].release(conn, True)
+
+
+def order_db(order_id, readonly=None):
+    """The connection to the database holding ``order_id``, or None if that can't exist."""
+    return get_db(branch_of(order_id), readonly)
+
+
+def lookup_dbs(order_id):
+    """Read connections that may hold ``order_id``: its live database, then its archive."""
+    branch_id = branch_of(order_id)
+    return [conn for conn in (get_db(branch_id), get_archive_db(branch_id)) if conn is not None]
+
+
+def order_dbs(branch_id=None, readonly=None, history=False):
+    """Connections to every database holding orders, or ``branch_id``'s orders.
+
+    The main database is always included, as it keeps the orders placed
+    before partitioning was enabled. ``history`` adds the (read-only)
+    archives of archived completed orders.
+    """
+    sources = [None] + [branch for branch in branches() if branch_id is None or branch == branch_id]
+    conns = []
+    for branch in sources:
+        conn = get_db(branch, readonly)
+        if conn is not None:
+            conns.append(conn)
+        if history:
+            conn = get_archive_db(branch)
+            if conn is not None:
+                conns.append(conn)
+    return conns
+
+
+def fan_out(query, params=(), branch_id=None, descending=False, plain=False, history=False):
+    """Runs an orders query on every partition and merges the results.
+
+    The query must return rows ordered by the order id, in its first column.
+    The merge is lazy, so with a LIMIT on the query each partition only
+    contributes the rows that make it onto the page. ``plain`` returns
+    tuples instead of ``sqlite3.Row`` objects. ``history`` includes the
+    archives, which only have the orders and order_items tables (plus the
+    shared ones); an order read while it is being archived shows up once.
+    """
+    cursors = []
+    for conn in order_dbs(branch_id, history=history):
+        cur = conn.cursor()
+        if plain:
+            cur.row_factory = None
+        cursors.append(cur.execute(query, params))
+    if len(cursors) == 1:
+        return cursors[0]
+    rows = heapq.merge(*cursors, key=operator.itemgetter(0), reverse=descending)
+    return _unique(rows) if history else rows
+
+
+def _unique(rows):
+    last = object()
+    for row in rows:
+        if row[0] != last:
+            last = row[0]
+            yield row
+
+
+def write(branch_id, fn):
+    """Runs ``fn(conn)`` in a committed transaction on ``branch_id``'s database.
+
+    The partitioned counterpart of ``group_commit.write``: each partition
+    gets its own group-commit writer when GROUP_COMMIT is on.
+    """
+    if branch_id is None:
+        return group_commit.write(fn)
+    app = current_app
+    if app.config['GROUP_COMMIT']:
+        get_pool(branch_id, create=True)  # creates the file and its schema
+        writer = group_commit.get_writer(app, path(branch_id), attach={'shared': app.config['DATABASE']})
+        return writer.write(fn)
+    conn = get_db(branch_id, readonly=False)
+    result = fn(conn)
+    conn.commit()
+    return result
+
+
+def write_order(order_id, fn):
+    """Runs ``fn(conn)`` on the database holding ``order_id``.
+
+    Returns None without calling ``fn`` if that partition doesn't exist.
+    """
+    branch_id = branch_of(order_id)
+    if branch_id is not None and get_pool(branch_id) is None:
+        return None
+    return write(branch_id, fn)
+
+
+def init_app(app):
+    app.config.setdefault('ORDER_PARTITIONS', False)
+    app.config.setdefault('PARTITION_DIR', os.path.join(app.root_path, PARTITION_DIR))
+    app.teardown_appcontext(release_dbs)
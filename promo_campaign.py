@@ -0,0 +1,179 @@
+"""Bulk generation of promo codes for marketing campaigns.
+
+QR images are rendered on a process pool and inserted in chunked
+transactions, so an interrupted run can simply be started again::
+
+    python promo_campaign.py summer-2026 50000 15 --prefix SUM
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+import database_create
+import db
+from qr import generate_qr_code
+
+logger = logging.getLogger(__name__)
+
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # no 0/O or 1/I lookalikes
+CODE_LENGTH = 10
+CHUNK_SIZE = 1000
+
+# Campaign name -> outcome of the latest background run in this process:
+# {'state': 'running'}, {'state': 'failed', 'error': ...} or
+# {'state': 'finished', **run_campaign's result}
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def _random_codes(prefix, count):
+    codes = set()
+    while len(codes) < count:
+        codes.add(prefix + ''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH)))
+    return list(codes)
+
+
+def _render_chunk(codes):
+    return [(code, generate_qr_code(code)) for code in codes]
+
+
+def _render(pool, chunks, in_flight):
+    # Keep only a few chunks in flight so memory stays flat for large campaigns.
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(_render_chunk, chunk))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def get_or_create_campaign(conn, name, discount, count):
+    # A concurrent create of the same name is a no-op rather than a constraint error
+    with conn:
+        conn.execute('''INSERT INTO promo_campaigns (name, discount, target_count) VALUES (?, ?, ?)
+                        ON CONFLICT (name) DO NOTHING''', (name, discount, count))
+    row = conn.execute('SELECT id, discount, target_count FROM promo_campaigns WHERE name = ?',
+                       (name,)).fetchone()
+    if row['discount'] != discount or row['target_count'] != count:
+        raise ValueError(f'Campaign {name!r} already exists with a different discount or size')
+    return row['id']
+
+
+def campaign_progress(conn, campaign_id):
+    return conn.execute('SELECT COUNT(*) FROM promocodes WHERE campaign_id = ?',
+                        (campaign_id,)).fetchone()[0]
+
+
+def run_campaign(path, name, count, discount, prefix='', workers=None, chunk_size=CHUNK_SIZE,
+                 progress=None):
+    """Generates promo codes until campaign ``name`` has ``count`` of them.
+
+    Each chunk is committed on its own and only the missing codes are
+    generated, so re-running an interrupted campaign resumes it. Codes that
+    collide with existing ones are ignored and replaced on the next pass.
+    Every chunk is capped at what the campaign still lacks when it is
+    written, so concurrent runs of one campaign never overshoot ``count``.
+    ``progress`` is called with the number of codes inserted so far after
+    every chunk.
+    """
+    # Imported here: multiprocessing is only needed while a campaign runs
+    from concurrent.futures import ProcessPoolExecutor
+
+    database_create.create_database(path)
+    conn = db.connect(path)
+    started = time.perf_counter()
+    inserted = 0
+    try:
+        campaign_id = get_or_create_campaign(conn, name, discount, count)
+        workers = workers or os.cpu_count() or 1
+        # Spawned, not forked: a fork would copy the locks other threads of a server hold
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            in_flight = 2 * workers
+            while (remaining := count - campaign_progress(conn, campaign_id)) > 0:
+                chunks = (_random_codes(prefix, min(chunk_size, remaining - start))
+                          for start in range(0, remaining, chunk_size))
+                for rendered in _render(pool, chunks, in_flight):
+                    before = conn.total_changes
+                    # Counted under the write lock, as another run may have added codes meanwhile
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        room = count - campaign_progress(conn, campaign_id)
+                        conn.executemany('INSERT OR IGNORE INTO promocodes (code, discount, qr_code, campaign_id) '
+                                         'VALUES (?, ?, ?, ?)',
+                                         [(code, discount, qr, campaign_id) for code, qr in rendered[:max(room, 0)]])
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                    inserted += conn.total_changes - before
+                    if progress:
+                        progress(inserted)
+                    if room <= len(rendered):
+                        break  # full, unless codes collided; the outer loop checks
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        'campaign_id': campaign_id,
+        'inserted': inserted,
+        'seconds': seconds,
+        'codes_per_second': inserted / seconds if seconds else 0.0,
+    }
+
+
+def start_campaign(path, name, count, discount, prefix=''):
+    """Runs ``run_campaign`` on a background thread, unless this process is
+    generating campaign ``name`` already. Returns whether it was started;
+    ``last_run`` tells how it went."""
+    with _runs_lock:
+        if _runs.get(name, {}).get('state') == 'running':
+            return False
+        _runs[name] = {'state': 'running'}
+
+    def run():
+        try:
+            outcome = {'state': 'finished', **run_campaign(path, name, count, discount, prefix=prefix)}
+        except Exception as e:
+            logger.exception('Promo campaign %r failed', name)
+            outcome = {'state': 'failed', 'error': str(e) or type(e).__name__}
+        with _runs_lock:
+            _runs[name] = outcome
+
+    threading.Thread(target=run, name=f'promo-campaign-{name}', daemon=True).start()
+    return True
+
+
+def last_run(name):
+    """The outcome of this process's latest background run of campaign
+    ``name`` (see ``_runs``), or None if it hasn't run one."""
+    with _runs_lock:
+        outcome = _runs.get(name)
+        return dict(outcome) if outcome is not None else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('name', help='campaign name; re-use it to resume an interrupted run')
+    parser.add_argument('count', type=int, help='number of codes the campaign should have')
+    parser.add_argument('discount', type=float, help='discount percentage for every code')
+    parser.add_argument('--prefix', default='', help='prefix prepended to every code')
+    parser.add_argument('--workers', type=int, help='QR rendering processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='codes per transaction')
+    parser.add_argument('--database', default=database_create.DATABASE)
+    args = parser.parse_args(argv)
+
+    result = run_campaign(args.database, args.name, args.count, args.discount, prefix=args.prefix,
+                          workers=args.workers, chunk_size=args.chunk_size)
+    print(f"Inserted {result['inserted']} codes for campaign {args.name!r} in {result['seconds']:.1f}s "
+          f"({result['codes_per_second']:.0f} codes/s)")
+
+
+if __name__ == '__main__':
+    main()
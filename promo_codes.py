@@ -0,0 +1,88 @@
+"""Promo-code lookup, redemption and discount arithmetic.
+
+Codes are resolved through a small per-process cache in front of the
+unique index on ``promocodes.code``; misses are cached too, so repeated
+guesses don't reach the database. Entries expire after ``CACHE_TTL`` so
+codes added or deleted by other workers are picked up, and this process
+invalidates entries itself when it adds or deletes a code. The cache is
+only a fast path: redeeming re-checks the code in the database.
+"""
+import collections
+import threading
+import time
+
+from flask import current_app
+
+CACHE_TTL = 30  # seconds
+CACHE_SIZE = 10000  # codes, including misses
+
+
+class PromoCodeError(ValueError):
+    pass
+
+
+class PromoCodeCache:
+    def __init__(self, ttl=CACHE_TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries = collections.OrderedDict()  # code -> (expires, promo dict or None)
+        self._lock = threading.Lock()
+
+    def lookup(self, conn, code):
+        """Returns the promo for ``code`` as a dict, or None if there is none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(code)
+                return entry[1]
+        row = conn.execute('SELECT id, code, discount, usage_limit, used_count FROM promocodes WHERE code = ?',
+                           (code,)).fetchone()
+        promo = dict(row) if row is not None else None
+        with self._lock:
+            self._entries[code] = (now + self.ttl, promo)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return promo
+
+    def invalidate(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+
+
+def get_cache(app=None):
+    app = app or current_app
+    cache = app.extensions.get('promo_cache')
+    if cache is None:
+        cache = app.extensions.setdefault('promo_cache', PromoCodeCache())
+    return cache
+
+
+def validate(conn, code):
+    """Returns the usable promo for ``code`` or raises PromoCodeError."""
+    promo = get_cache().lookup(conn, code.strip())
+    if promo is None:
+        raise PromoCodeError('Unknown promo code')
+    # The cached count may lag; redeem() is the authoritative check
+    if promo['usage_limit'] is not None and promo['used_count'] >= promo['usage_limit']:
+        raise PromoCodeError('Promo code has been used up')
+    return promo
+
+
+def redeem(conn, promo_id):
+    """Counts one use of the promo, failing if it is used up or gone.
+
+    The limit check and the increment are one UPDATE, so concurrent
+    checkouts can't both take the last use.
+    """
+    cur = conn.execute('''UPDATE promocodes SET used_count = used_count + 1
+                          WHERE id = ? AND (usage_limit IS NULL OR used_count < usage_limit)''', (promo_id,))
+    if cur.rowcount == 0:
+        raise PromoCodeError('Promo code has been used up')
+
+
+def apply_discount(subtotal, discount):
+    """Returns (total, discount amount) for a percentage ``discount``."""
+    total = round(subtotal * (100 - min(max(discount, 0), 100)) / 100, 2)
+    return total, round(subtotal - total, 2)
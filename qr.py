@@ -0,0 +1,20 @@
+from io import BytesIO
+
+
+def generate_qr_code(data):
+    # Imported on first use: qrcode pulls in Pillow, which most workers never need
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white')
+    buffered = BytesIO()
+    # A 1-bit PNG of a QR code is a fraction of the size of the equivalent JPEG
+    img.save(buffered, format="PNG", optimize=True)
+    return buffered.getvalue()
@@ -0,0 +1,119 @@
+"""Sales reports read from the daily rollup tables.
+
+``daily_order_stats`` and ``daily_dish_sales`` are kept current by triggers
+as orders are placed and completed (see database_create._sales_rollups), so
+a report reads a few rows per day instead of every order. With partitioned
+orders each partition has its own rollups and the reads are summed. The
+rollups can be rebuilt from the orders in bulk, e.g. after a restore::
+
+    python reports.py backfill
+"""
+import argparse
+import os
+import sqlite3
+
+import database_create
+import partitions
+from db import get_db
+
+TOP_DISHES = 5  # per category
+
+
+def _rows(query, params, branch_id):
+    for conn in partitions.order_dbs(branch_id or None):
+        cur = conn.cursor()
+        cur.row_factory = None
+        yield from cur.execute(query, params)
+
+
+def _filters(start, end, branch_id):
+    where, params = 'day BETWEEN ? AND ?', [start, end]
+    if branch_id is not None:
+        where += ' AND branch_id = ?'
+        params.append(branch_id)
+    return where, params
+
+
+def daily_sales(start, end, branch_id=None):
+    """Per day from ``start`` to ``end`` (inclusive, YYYY-MM-DD): order counts
+    per status, and revenue from the completed orders, newest day first.
+
+    ``branch_id`` 0 selects the orders placed without a branch.
+    """
+    where, params = _filters(start, end, branch_id)
+    days = {}
+    for day, status, orders, total in _rows(f'''SELECT day, status, SUM(orders), SUM(total) FROM daily_order_stats
+                                                WHERE {where} GROUP BY day, status''', params, branch_id):
+        entry = days.setdefault(day, dict(day=day, orders=0, revenue=0.0, statuses={}))
+        entry['orders'] += orders
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + orders
+        if status == 'Completed':
+            entry['revenue'] += total
+    for entry in days.values():
+        entry['revenue'] = round(entry['revenue'], 2)
+    return sorted(days.values(), key=lambda entry: entry['day'], reverse=True)
+
+
+def top_dishes(start, end, branch_id=None, limit=TOP_DISHES):
+    """The best-selling dishes of each category by quantity, as
+    [(category name, [{dish_id, name, quantity, revenue}, ...])]."""
+    where, params = _filters(start, end, branch_id)
+    sales = {}
+    for dish_id, quantity, revenue in _rows(f'''SELECT dish_id, SUM(quantity), SUM(revenue) FROM daily_dish_sales
+                                                WHERE {where} GROUP BY dish_id''', params, branch_id):
+        quantity_sum, revenue_sum = sales.get(dish_id, (0, 0.0))
+        sales[dish_id] = (quantity_sum + quantity, revenue_sum + revenue)
+    if not sales:
+        return []
+
+    placeholders = ', '.join('?' * len(sales))
+    dishes = get_db().execute(f'''SELECT dishes.id, dishes.name, categories.name FROM dishes
+                                  LEFT JOIN categories ON dishes.category_id = categories.id
+                                  WHERE dishes.id IN ({placeholders})''', list(sales)).fetchall()
+    categories = {}
+    for dish_id, name, category in dishes:
+        quantity, revenue = sales[dish_id]
+        if quantity > 0:
+            categories.setdefault(category or 'Uncategorized', []).append(
+                dict(dish_id=dish_id, name=name, quantity=quantity, revenue=round(revenue, 2)))
+    return [(category, sorted(ranked, key=lambda dish: (-dish['quantity'], dish['name']))[:limit])
+            for category, ranked in sorted(categories.items())]
+
+
+def backfill(path):
+    """Rebuilds the rollups of one database file, counting its archived
+    orders too; returns the orders left out."""
+    conn = sqlite3.connect(path)
+    try:
+        archive = None
+        if os.path.exists(partitions.archive_path(path)):
+            archive = 'archive'
+            conn.execute(f'ATTACH DATABASE ? AS {archive}', (partitions.archive_path(path),))
+        with conn:
+            return database_create.rebuild_sales_rollups(conn.cursor(), archive)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['backfill'])
+    parser.add_argument('--database', default=database_create.DATABASE)
+    parser.add_argument('--partition-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                partitions.PARTITION_DIR))
+    args = parser.parse_args(argv)
+
+    database_create.create_database(args.database)
+    paths = [args.database]
+    if os.path.isdir(args.partition_dir):
+        paths += [os.path.join(args.partition_dir, name) for name in sorted(os.listdir(args.partition_dir))
+                  if partitions.FILE_RE.match(name)]
+    for path in paths:
+        if path != args.database:
+            database_create.create_database(path, database_create.PARTITION_MIGRATIONS)
+        skipped = backfill(path)
+        print(f'{path}: rebuilt' + (f', {skipped} orders without a timestamp left out' if skipped else ''))
+
+
+if __name__ == '__main__':
+    main()
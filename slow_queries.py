@@ -0,0 +1,123 @@
+"""Log of SQL statements slower than a configurable threshold.
+
+A statement's time runs from ``execute`` until its rows are exhausted (or
+the cursor is reused or discarded). Slow statements are logged with their
+normalized text, parameter types, duration, calling endpoint and
+``EXPLAIN QUERY PLAN`` output, and aggregated per fingerprint for the
+admin page. Like the metrics, the aggregate is per worker process.
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_MS = 100
+MAX_FINGERPRINTS = 500  # distinct statements kept for the admin page
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+# Seconds; None turns the log off. Set from the SLOW_QUERY_MS config by init_app.
+threshold_seconds = THRESHOLD_MS / 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_offenders = {}
+
+
+def normalize(sql):
+    """Replaces literals with ``?`` and collapses whitespace and IN lists."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def parameter_shape(parameters):
+    if parameters is None:
+        return '(unknown)'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+
+def explain(conn, sql, parameters):
+    """Returns the query plan lines for ``sql``, or [] if it can't be explained."""
+    if parameters is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    try:
+        # A plain cursor, so the EXPLAIN isn't itself timed and logged
+        cur = sqlite3.Cursor(conn)
+        cur.row_factory = None
+        return [row[3] for row in cur.execute('EXPLAIN QUERY PLAN ' + sql, parameters)]
+    except sqlite3.Error:
+        return []
+
+
+def is_full_scan(plan):
+    # "SCAN t" reads the whole table; "SCAN t USING ... INDEX" at least avoids the row lookups
+    return any(line.startswith('SCAN ') and ' USING ' not in line for line in plan)
+
+
+def observe(conn, sql, parameters, seconds):
+    """Records ``sql`` if it ran for at least the threshold.
+
+    ``parameters`` are the bound values, or for ``executemany`` the first
+    row of them (None when that isn't known).
+    """
+    if threshold_seconds is None or seconds < threshold_seconds:
+        return
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+    endpoint = (request.endpoint or 'unmatched') if has_request_context() else threading.current_thread().name
+    shape = parameter_shape(parameters)
+
+    with _lock:
+        entry = _offenders.get(key)
+    if entry is None:
+        # Only the first occurrence of a statement pays for the EXPLAIN
+        entry = dict(fingerprint=key, sql=normalized, params=shape, plan=explain(conn, sql, parameters),
+                     count=0, total_ms=0.0, max_ms=0.0, endpoints=set())
+        entry['full_scan'] = is_full_scan(entry['plan'])
+    with _lock:
+        if key not in _offenders and len(_offenders) >= MAX_FINGERPRINTS:
+            del _offenders[min(_offenders, key=lambda k: _offenders[k]['total_ms'])]
+        entry = _offenders.setdefault(key, entry)
+        entry['count'] += 1
+        entry['total_ms'] += seconds * 1000
+        entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+        entry['endpoints'].add(endpoint)
+
+    logger.warning('Slow query %s took %.1f ms in %s: %s params=%s plan=%s',
+                   key, seconds * 1000, endpoint, normalized, shape, ' | '.join(entry['plan']))
+
+
+def worst_offenders(limit=50):
+    """Aggregated slow statements, most total time first."""
+    with _lock:
+        entries = [dict(entry, endpoints=sorted(entry['endpoints'])) for entry in _offenders.values()]
+    entries.sort(key=lambda entry: entry['total_ms'], reverse=True)
+    return entries[:limit]
+
+
+def reset():
+    with _lock:
+        _offenders.clear()
+
+
+def init_app(app):
+    global threshold_seconds
+    app.config.setdefault('SLOW_QUERY_MS', THRESHOLD_MS)
+    threshold_ms = app.config['SLOW_QUERY_MS']
+    threshold_seconds = None if threshold_ms is None else threshold_ms / 1000
@@ -0,0 +1,58 @@
+"""Timing of the app's boot phases.
+
+``app.py`` imports this module first and calls ``mark`` after each phase,
+so the report covers everything from the first import on. Set
+``STARTUP_REPORT=1`` to have a worker print it once booted, or run::
+
+    python startup.py --first-request
+"""
+import argparse
+import os
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+_phases = []  # (name, seconds)
+_last = STARTED
+
+
+def mark(name):
+    """Records the time since the previous mark as phase ``name``."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((name, now - _last))
+    _last = now
+
+
+def report():
+    total = sum(seconds for _, seconds in _phases)
+    lines = [f'{name:<24} {seconds * 1000:8.1f} ms' for name, seconds in _phases]
+    lines.append(f"{'total':<24} {total * 1000:8.1f} ms")
+    return '\n'.join(lines)
+
+
+def report_if_requested():
+    if os.environ.get('STARTUP_REPORT'):
+        print('Startup timing:\n' + report(), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--first-request', action='store_true',
+                        help='also time the first request, which opens the database and runs migrations')
+    args = parser.parse_args(argv)
+
+    # The copy of this module that app.py imports, not __main__
+    import startup
+    from app import app
+
+    if args.first_request:
+        app.test_client().get('/')
+        startup.mark('first request')
+    print(startup.report())
+    print('For a per-module breakdown of the imports run: python -X importtime -c "import app"')
+
+
+if __name__ == '__main__':
+    main()
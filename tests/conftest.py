@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_create  # noqa: E402
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The application on a fresh database under ``tmp_path``."""
+    config = dict(flask_app.config)
+    extensions = dict(flask_app.extensions)
+    flask_app.config.update(TESTING=True, DATABASE=str(tmp_path / 'test.db'),
+                            PARTITION_DIR=str(tmp_path / 'partitions'),
+                            THUMBNAIL_DIR=str(tmp_path / 'thumbnails'),
+                            BACKUP_DIR=str(tmp_path / 'backups'))
+    # Pools, writers and caches belong to the database they were made for
+    for name in ('db_pool', 'partition_pools', 'group_commit', 'dispatcher', 'thumbnails'):
+        flask_app.extensions.pop(name, None)
+    database_create.create_database(flask_app.config['DATABASE'])
+    yield flask_app
+    for writer in flask_app.extensions.get('group_commit', {}).values():
+        writer.close()
+    for pool in flask_app.extensions.get('partition_pools', {}).values():
+        pool.close_all()
+    if 'db_pool' in flask_app.extensions:
+        flask_app.extensions['db_pool'].close_all()
+    flask_app.config.clear()
+    flask_app.config.update(config)
+    flask_app.extensions.clear()
+    flask_app.extensions.update(extensions)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
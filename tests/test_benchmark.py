@@ -0,0 +1,20 @@
+import pytest
+
+import benchmark
+
+
+def test_percentile_of_a_single_sample():
+    assert benchmark.percentile([0.25], 50) == benchmark.percentile([0.25], 99) == 0.25
+    assert benchmark.percentile([1.0, 3.0], 50) == 2.0
+
+
+@pytest.mark.parametrize('argv, message', [
+    (['--iterations', '0'], 'must be at least 1'),
+    (['--iterations', 'x'], "invalid int value: 'x'"),
+    (['--warmup', '-1'], 'must be at least 0'),
+])
+def test_counts_are_validated(argv, message, capsys):
+    with pytest.raises(SystemExit) as exit:
+        benchmark.main(argv)
+    assert exit.value.code == 2
+    assert message in capsys.readouterr().err
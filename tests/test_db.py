@@ -0,0 +1,31 @@
+import threading
+
+import database_create
+import db
+
+
+def test_pool_is_created_once(app, monkeypatch):
+    migrations = []
+    create_database = database_create.create_database
+    monkeypatch.setattr(database_create, 'create_database',
+                        lambda *args: migrations.append(args) or create_database(*args))
+    pools = []
+    start = threading.Barrier(8)
+
+    def take():
+        start.wait()
+        pools.append(db.get_pool(app))
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(migrations) == 1
+    assert len({id(pool) for pool in pools}) == 1
+
+
+def test_teardown_does_not_create_a_pool(app):
+    with app.app_context():
+        pass
+    assert 'db_pool' not in app.extensions
@@ -0,0 +1,26 @@
+import sqlite3
+
+import generate_data
+
+OPTIONS = dict(users=20, branches=2, categories=2, sub_categories_per_category=(2, 2),
+               dishes_per_sub_category=(3, 3), promocodes=10, orders=200)
+
+
+def rows(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_same_seed_same_data(tmp_path):
+    first, second = tmp_path / 'first.db', tmp_path / 'second.db'
+    generate_data.generate(str(first), seed=1, **OPTIONS)
+    generate_data.generate(str(second), seed=1, **OPTIONS)
+    for sql in ('SELECT * FROM orders ORDER BY id', 'SELECT * FROM daily_order_stats ORDER BY 1, 2, 3'):
+        assert rows(first, sql) == rows(second, sql)
+
+
+def test_history_ends_on_end_date(tmp_path):
+    path = tmp_path / 'orders.db'
+    generate_data.generate(str(path), seed=1, end_date='2024-03-31', history_days=30, **OPTIONS)
+    days = rows(path, 'SELECT MIN(date(created_at)), MAX(date(created_at)) FROM orders')
+    assert days == [('2024-03-02', '2024-03-31')]
@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+
+import pytest
+
+import group_commit
+
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / 'writes.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+    writer = group_commit.GroupCommitWriter(path)
+    yield writer
+    writer.close()
+
+
+def insert(value):
+    return lambda conn: conn.execute('INSERT INTO t (x) VALUES (?)', (value,)).rowcount
+
+
+def values(writer):
+    with sqlite3.connect(writer.path) as conn:
+        return [row[0] for row in conn.execute('SELECT x FROM t ORDER BY x')]
+
+
+def test_a_failing_write_only_rolls_back_itself(writer):
+    def failing(conn):
+        conn.execute('INSERT INTO t (x) VALUES (99)')
+        raise ValueError('no')
+
+    futures = [writer.submit(insert(1)), writer.submit(failing), writer.submit(insert(2))]
+    assert futures[0].result(5) == 1
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 1
+    assert values(writer) == [1, 2]
+
+
+def test_the_writer_survives_a_broken_batch(writer):
+    def breaks_the_savepoint(conn):
+        conn.execute('RELEASE write')  # so the writer's ROLLBACK TO fails
+        raise ValueError('no')
+
+    with pytest.raises(sqlite3.OperationalError):
+        writer.submit(breaks_the_savepoint).result(5)
+    assert writer.alive
+    assert writer.write(insert(3), timeout=5) == 1
+    assert values(writer) == [3]
+
+
+def test_a_timed_out_write_either_never_runs_or_reports_its_outcome(writer):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(conn):
+        started.set()
+        release.wait(5)
+        return insert(1)(conn)
+
+    first = writer.submit(slow)
+    started.wait(5)
+    # Queued behind the running batch: cancelled on timeout, never written
+    with pytest.raises(TimeoutError):
+        writer.write(insert(2), timeout=0.05)
+    release.set()
+    assert first.result(5) == 1
+
+    started.clear()
+    release.clear()
+    threading.Timer(0.2, release.set).start()
+    # Already running when the timeout hits: its committed result is returned
+    assert writer.write(slow, timeout=0.05) == 1
+    assert values(writer) == [1, 1]
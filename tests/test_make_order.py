@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+
+def order_lines(app, order_id):
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        return conn.execute('SELECT dish_id, quantity FROM order_items WHERE order_id = ? ORDER BY dish_id',
+                            (order_id,)).fetchall()
+
+
+def test_json_order(app, client):
+    response = client.post('/make_order', json={'description': 'x', 'user_id': 1,
+                                                'items': [{'dish_id': 1, 'quantity': 2}, {'dish_id': 1}]})
+    assert response.status_code == 201
+    assert order_lines(app, response.json['id']) == [(1, 3)]
+
+
+@pytest.mark.parametrize('body, message', [
+    ([1, 2], 'The request body must be a JSON object'),
+    ('text', 'The request body must be a JSON object'),
+    ({'user_id': 1, 'items': {'dish_id': 1}}, 'items must be a list of objects'),
+    ({'user_id': 1, 'items': [1, 2]}, 'items must be a list of objects'),
+    ({'user_id': 1, 'items': [{'dish_id': 1}, [1]]}, 'items must be a list of objects'),
+    ({'user_id': 1, 'items': [{'dish_id': [1]}]}, 'Invalid dish or quantity'),
+])
+def test_malformed_json_is_rejected(client, body, message):
+    response = client.post('/make_order', json=body)
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) == message
+
+
+def test_form_quantities_must_match_dishes(client):
+    response = client.post('/make_order', data={'description': 'x', 'user_id': 1,
+                                                'dish_id': ['1', '2'], 'quantity': ['1']})
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) == 'Every dish_id needs a quantity'
+
+
+def test_form_order(app, client):
+    response = client.post('/make_order', data={'description': 'x', 'user_id': 1, 'dish_id': ['1', '2'],
+                                                'quantity': ['2', '1']})
+    assert response.status_code == 302
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        order_id = conn.execute('SELECT MAX(id) FROM orders').fetchone()[0]
+    assert order_lines(app, order_id) == [(1, 2), (2, 1)]
+
+
+@pytest.mark.parametrize('code', [123, ['SAVE'], {'code': 'SAVE'}, True])
+def test_promocode_must_be_a_string(client, code):
+    response = client.post('/make_order', json={'description': 'x', 'user_id': 1, 'promocode': code,
+                                                'items': [{'dish_id': 1}]})
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) == 'promocode must be a string'
+
+
+def test_unknown_promocode(client):
+    response = client.post('/make_order', json={'description': 'x', 'user_id': 1, 'promocode': 'NOPE',
+                                                'items': [{'dish_id': 1}]})
+    assert response.status_code == 400
@@ -0,0 +1,22 @@
+import sys
+
+
+def test_menu_cache_is_bounded(client, monkeypatch):
+    module = sys.modules['app']
+    monkeypatch.setattr(module, 'MENU_CACHE_SIZE', 3)
+    module._menu_cache.clear()
+    for category_id in range(1, 6):
+        assert client.get(f'/menu?category_id={category_id}').status_code == 200
+    assert [key[1] for key in module._menu_cache] == [3, 4, 5]
+
+    # A hit makes the page the most recently used one
+    assert client.get('/menu?category_id=3').status_code == 200
+    assert client.get('/menu?category_id=6').status_code == 200
+    assert [key[1] for key in module._menu_cache] == [5, 3, 6]
+
+
+def test_menu_cache_keeps_etag(client):
+    first = client.get('/menu')
+    assert first.status_code == 200
+    again = client.get('/menu', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
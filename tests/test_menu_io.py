@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+
+def post_menu(client, body, fmt):
+    return client.post(f'/admin/menu/import?format={fmt}', data=body.encode(), content_type='text/plain')
+
+
+def test_import_upserts_dishes(app, client):
+    body = ('{"category":"Beverages","sub_category":"Tea","dish":"Green Tea","price":3.1}\n'
+            '{"category":"Snacks","dish":"Fries","price":"2.5","img_link":"https://example.com/fries.png"}\n')
+    response = post_menu(client, body, 'jsonl')
+    assert response.status_code == 200
+    assert response.json['dishes_upserted'] == 2
+    response = post_menu(client, 'category,sub_category,dish,price,img_link\nSnacks,,Fries,2.75,\n', 'csv')
+    assert response.status_code == 200
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        prices = dict(conn.execute("SELECT name, price FROM dishes WHERE name IN ('Green Tea', 'Fries')"))
+    assert prices == {'Green Tea': 3.1, 'Fries': 2.75}
+
+
+@pytest.mark.parametrize('body, fmt, message', [
+    ('[1,2]\n', 'jsonl', 'Line 1: not a JSON object'),
+    ('{"category":"A","dish":"x","price":1}\n"text"\n', 'jsonl', 'Line 2: not a JSON object'),
+    ('{"category":"A","dish":"x","price":null}\n', 'jsonl', 'Row 1: invalid price None'),
+    ('{"category":"A","dish":"x","price":[1]}\n', 'jsonl', 'Row 1: invalid price [1]'),
+    ('{"category":"A","dish":"x","price":"NaN"}\n', 'jsonl', "Row 1: invalid price 'NaN'"),
+    ('{"category":["A"],"dish":"x","price":1}\n', 'jsonl', 'Row 1: category is not text'),
+    ('{"category":"A","dish":"x"}\n', 'jsonl', 'Row 1: invalid price None'),
+    ('{not json}\n', 'jsonl', 'Malformed menu file'),
+    ('category,sub_category,dish,price,img_link\nA,,x,1\nA,,y,cheap,\n', 'csv', "Row 2: invalid price 'cheap'"),
+    ('category,sub_category,dish,price,img_link\n,,x,1,\n', 'csv', 'Row 1: record without a category'),
+])
+def test_import_rejects_malformed_records(client, body, fmt, message):
+    response = post_menu(client, body, fmt)
+    assert response.status_code == 400
+    assert message in response.get_data(as_text=True)
@@ -0,0 +1,41 @@
+import re
+
+from flask import Flask
+
+import benchmark
+import db
+import metrics
+import partitions
+
+
+def queries(client, endpoint):
+    text = client.get('/metrics').get_data(as_text=True)
+    match = re.search(rf'^db_queries_total{{endpoint="{endpoint}"}} (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0
+
+
+def test_trace_callbacks_are_chained(app, client):
+    counter = benchmark.StatementCounter()
+    before = queries(client, 'orders')
+    db.trace_callbacks(app).append(counter)
+    try:
+        assert client.get('/orders').status_code == 200
+    finally:
+        db.trace_callbacks(app).remove(counter)
+    assert counter.count > 0
+    assert queries(client, 'orders') - before == counter.count
+
+
+def test_hooks_are_per_app(app):
+    other = Flask(__name__)
+    db.init_app(other)
+    assert db.connect_options(other)['factory'] is db.sqlite3.Connection
+    assert db.connect_hooks(other) == [] and db.trace_callbacks(other) == []
+    assert db.connect_options(app)['factory'] is metrics.MetricsConnection
+
+
+def test_every_app_connection_is_instrumented(app):
+    app.config['ORDER_PARTITIONS'] = True
+    with app.app_context():
+        assert isinstance(db.get_pool().acquire(), metrics.MetricsConnection)
+        assert isinstance(partitions.get_pool(1, create=True).acquire(), metrics.MetricsConnection)
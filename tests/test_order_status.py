@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+import kitchen_feed
+import partitions
+
+
+@pytest.fixture
+def order_id(client):
+    response = client.post('/make_order', json={'description': 'x', 'user_id': 1, 'items': [{'dish_id': 1}]})
+    return response.json['id']
+
+
+def status_of(app, order_id):
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        return conn.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()[0]
+
+
+@pytest.mark.parametrize('form', [{}, {'status': ''}, {'status': 'Cooking'}, {'status': 'completed'}])
+def test_unknown_status_is_rejected(app, client, order_id, form):
+    response = client.post(f'/update_order_status/{order_id}', data=form)
+    assert response.status_code == 400
+    assert status_of(app, order_id) == 'Pending'
+
+
+def test_status_is_updated(app, client, order_id):
+    assert client.post(f'/update_order_status/{order_id}', data={'status': 'In Kitchen'}).status_code == 302
+    assert status_of(app, order_id) == 'In Kitchen'
+    assert client.post('/update_order_status/999999', data={'status': 'Completed'}).status_code == 404
+
+
+def test_send_to_kitchen(app, client, order_id, monkeypatch):
+    notified = []
+    monkeypatch.setattr(kitchen_feed, 'notify', lambda: notified.append(True))
+    assert client.post(f'/send_order_to_kitchen/{order_id}').status_code == 302
+    assert status_of(app, order_id) == 'In Kitchen'
+    assert client.post('/send_order_to_kitchen/999999').status_code == 404
+    assert notified == [True]
+
+
+def test_send_to_kitchen_in_a_missing_partition(app, client):
+    app.config['ORDER_PARTITIONS'] = True
+    order_id = partitions.PARTITION_ID_MIN | 7  # branch 7, which has no partition file
+    assert partitions.branch_of(order_id) == 7
+    assert client.post(f'/send_order_to_kitchen/{order_id}').status_code == 404
@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+
+import pytest
+
+import partitions
+
+ORDERS = 320
+THREADS = 16
+
+
+@pytest.mark.parametrize('group_commit', [False, True])
+def test_concurrent_orders_get_distinct_ids(app, group_commit):
+    app.config.update(ORDER_PARTITIONS=True, GROUP_COMMIT=group_commit)
+    client = app.test_client()
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        conn.execute("INSERT INTO branch (name, address, phone) VALUES ('A', 'a', '1')")
+    client.post('/make_order', json={'description': 'warm-up', 'user_id': 1, 'branch_id': 1,
+                                     'items': [{'dish_id': 1, 'quantity': 1}]})
+
+    statuses, ids = [], []
+
+    def place(count):
+        client = app.test_client()
+        for _ in range(count):
+            response = client.post('/make_order', json={'description': 'x', 'user_id': 1, 'branch_id': 1,
+                                                        'items': [{'dish_id': 1, 'quantity': 1}]})
+            statuses.append(response.status_code)
+            if response.status_code == 201:
+                ids.append(response.json['id'])
+
+    threads = [threading.Thread(target=place, args=(ORDERS // THREADS,)) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [201] * ORDERS
+    assert len(set(ids)) == ORDERS
+    assert {partitions.branch_of(order_id) for order_id in ids} == {1}
+    with app.app_context():
+        count = partitions.get_db(1, readonly=True).execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    assert count == ORDERS + 1
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+import promo_campaign
+
+
+def test_get_or_create_campaign_is_idempotent(app):
+    conn = db.connect(app.config['DATABASE'])
+    try:
+        campaign_id = promo_campaign.get_or_create_campaign(conn, 'spring', 10.0, 100)
+        assert promo_campaign.get_or_create_campaign(conn, 'spring', 10.0, 100) == campaign_id
+        with pytest.raises(ValueError):
+            promo_campaign.get_or_create_campaign(conn, 'spring', 20.0, 100)
+    finally:
+        conn.close()
+
+
+def test_concurrent_runs_stop_at_the_target(app):
+    path = app.config['DATABASE']
+    threads = [threading.Thread(target=promo_campaign.run_campaign, args=(path, 'race', 120, 5.0),
+                                kwargs=dict(workers=1, chunk_size=25)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with sqlite3.connect(path) as conn:
+        count = conn.execute('''SELECT COUNT(*) FROM promocodes JOIN promo_campaigns
+                                ON promocodes.campaign_id = promo_campaigns.id
+                                WHERE promo_campaigns.name = 'race' ''').fetchone()[0]
+    assert count == 120
+
+
+def test_a_running_campaign_is_not_started_twice(app, client, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(promo_campaign, 'run_campaign', lambda *args, **kwargs: release.wait(5) and {})
+    form = {'name': 'busy', 'count': '10', 'discount': '5'}
+    try:
+        assert client.post('/promocode/campaign', data=form).status_code == 202
+        assert client.post('/promocode/campaign', data=form).status_code == 409
+    finally:
+        release.set()
+
+
+def wait_for_run(client, status_url):
+    for _ in range(200):
+        run = client.get(status_url).json['run']
+        if run['state'] != 'running':
+            return run
+        time.sleep(0.05)
+    raise AssertionError('the campaign run did not finish')
+
+
+def test_a_failed_run_is_reported(app, client, monkeypatch, caplog):
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(promo_campaign, 'run_campaign', fail)
+    response = client.post('/promocode/campaign', data={'name': 'broken', 'count': '10', 'discount': '5'})
+    assert response.status_code == 202
+    assert wait_for_run(client, response.json['status']) == {'state': 'failed', 'error': 'disk full'}
+    assert "Promo campaign 'broken' failed" in caplog.text
+    # A failed run can be started again
+    assert client.post('/promocode/campaign', data={'name': 'broken', 'count': '10', 'discount': '5'}).status_code == 202
+
+
+def test_a_finished_run_reports_its_throughput(app, client):
+    response = client.post('/promocode/campaign', data={'name': 'small', 'count': '5', 'discount': '5'})
+    assert response.status_code == 202
+    run = wait_for_run(client, response.json['status'])
+    assert run['state'] == 'finished' and run['inserted'] == 5 and run['codes_per_second'] > 0
+    status = client.get(response.json['status']).json
+    assert status['generated'] == 5 and status['done']
@@ -0,0 +1,33 @@
+import sqlite3
+
+import archive
+import partitions
+import reports
+
+
+def test_backfill_counts_an_order_in_both_files_once(app, client):
+    path = app.config['DATABASE']
+    for quantity in (2, 3):
+        response = client.post('/make_order', json={'description': 'x', 'user_id': 1,
+                                                    'items': [{'dish_id': 1, 'quantity': quantity}]})
+        assert response.status_code == 201
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE orders SET status = 'Completed'")
+        expected = conn.execute('SELECT SUM(orders), SUM(total) FROM daily_order_stats').fetchone()
+    assert archive.archive_database(path, '9999-01-01 00:00:00')[0] == 2
+
+    # An interrupted run: the first order was copied but not yet deleted from main
+    conn = sqlite3.connect(path)
+    conn.execute('ATTACH DATABASE ? AS archive', (partitions.archive_path(path),))
+    with conn:
+        columns = ', '.join(row[1] for row in conn.execute('PRAGMA archive.table_info(orders)'))
+        conn.execute(f'INSERT INTO main.orders ({columns}) SELECT {columns} FROM archive.orders ORDER BY id LIMIT 1')
+        conn.execute('''INSERT INTO main.order_items (order_id, dish_id, quantity, unit_price)
+                        SELECT order_id, dish_id, quantity, unit_price FROM archive.order_items
+                        WHERE order_id IN (SELECT id FROM main.orders)''')
+    conn.close()
+
+    assert reports.backfill(path) == 0
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT SUM(orders), SUM(total) FROM daily_order_stats').fetchone() == expected
+        assert conn.execute('SELECT SUM(quantity) FROM daily_dish_sales').fetchone() == (5,)
@@ -0,0 +1,149 @@
+import io
+import os
+import socket
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from PIL import Image
+
+import thumbnails
+
+
+def image_bytes(color, size=(800, 600), fmt='PNG', mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return thumbnails.ThumbnailCache(str(tmp_path / 'cache'))
+
+
+def test_store_writes_both_formats_within_the_size(cache):
+    digest = cache.store(image_bytes((255, 0, 0, 128)))
+    assert thumbnails.DIGEST_RE.match(digest)
+    assert cache.exists(digest)
+    for ext, (fmt, _) in thumbnails.FORMATS.items():
+        with Image.open(cache.path(digest, ext)) as image:
+            assert image.format == fmt
+            assert image.width <= thumbnails.THUMBNAIL_SIZE[0] and image.height <= thumbnails.THUMBNAIL_SIZE[1]
+    assert cache.store(image_bytes((255, 0, 0, 128))) == digest
+
+
+def test_store_rejects_what_is_not_an_image(cache):
+    with pytest.raises(thumbnails.ThumbnailError):
+        cache.store(b'not an image')
+
+
+def test_evict_drops_the_least_recently_used(cache):
+    digests = [cache.store(image_bytes(color, mode='RGB')) for color in ('red', 'green', 'blue')]
+    for age, digest in enumerate(reversed(digests)):
+        for ext in thumbnails.FORMATS:
+            os.utime(cache.path(digest, ext), (1000 - age, 1000 - age))
+    sizes = {digest: sum(os.path.getsize(cache.path(digest, ext)) for ext in thumbnails.FORMATS)
+             for digest in digests}
+    cache.max_bytes = sizes[digests[1]] + sizes[digests[2]]
+    assert cache.evict() == len(thumbnails.FORMATS)
+    assert [cache.exists(digest) for digest in digests] == [False, True, True]
+    # The image just stored stays, even when it alone is over the budget
+    cache.max_bytes = 0
+    cache.evict(keep=digests[0])
+    assert not any(cache.exists(digest) for digest in digests)
+    digest = cache.store(image_bytes('white', mode='RGB'))
+    assert cache.exists(digest)
+
+
+def test_img_serves_the_cached_thumbnail(app, client):
+    digest = thumbnails.get_cache(app).store(image_bytes((0, 0, 255, 255)))
+    response = client.get(f'/img/{digest}', headers={'Accept': 'image/webp,*/*'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'immutable' in response.headers['Cache-Control']
+    response = client.get(f'/img/{digest}', headers={'Accept': 'image/jpeg'})
+    assert response.mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(response.data)).format == 'JPEG'
+    assert client.get('/img/not-a-digest').status_code == 404
+    assert client.get('/img/' + '0' * 64).status_code == 404
+
+
+def test_img_redirects_to_the_link_once_evicted(app, client):
+    digest = thumbnails.get_cache(app).store(image_bytes('green', mode='RGB'))
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        conn.execute("UPDATE dishes SET thumbnail = ?, img_link = 'https://example.com/dish.png' WHERE id = 1",
+                     (digest,))
+    for ext in thumbnails.FORMATS:
+        os.remove(thumbnails.get_cache(app).path(digest, ext))
+    response = client.get(f'/img/{digest}')
+    assert response.status_code == 302
+    assert response.headers['Location'] == 'https://example.com/dish.png'
+
+
+def test_add_dish_thumbnails_an_uploaded_image(app, client):
+    response = client.post('/add_dish', data={'name': 'Uploaded', 'price': '3', 'category_id': '1',
+                                              'image': (io.BytesIO(image_bytes('yellow', mode='RGB')), 'dish.png')})
+    assert response.status_code == 200
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        digest = conn.execute("SELECT thumbnail FROM dishes WHERE name = 'Uploaded'").fetchone()[0]
+    assert client.get(f'/img/{digest}').status_code == 200
+
+
+@pytest.mark.parametrize('url', ['http://127.0.0.1/dish.png', 'http://localhost/dish.png',
+                                 'http://169.254.169.254/latest/meta-data', 'http://10.1.2.3/dish.png',
+                                 'http://[::1]/dish.png', 'http://[::ffff:192.168.0.1]/dish.png'])
+def test_fetch_refuses_non_public_hosts(url):
+    with pytest.raises(thumbnails.ThumbnailError, match='non-public'):
+        thumbnails.fetch(url)
+
+
+def test_fetch_checks_the_address_it_connects_to(monkeypatch):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(image_bytes('red', mode='RGB'))
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    resolve = socket.getaddrinfo
+    answers = iter(['93.184.216.34'])  # public on the first lookup, loopback afterwards
+
+    def rebinding(host, *args, **kwargs):
+        if host == 'rebind.example':
+            return resolve(next(answers, '127.0.0.1'), *args, **kwargs)
+        return resolve(host, *args, **kwargs)
+
+    monkeypatch.setattr(socket, 'getaddrinfo', rebinding)
+    try:
+        with pytest.raises(thumbnails.ThumbnailError, match='non-public'):
+            thumbnails.fetch(f'http://rebind.example:{port}/dish.png')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_edit_dish_fetches_before_taking_the_write_lock(app, client, monkeypatch):
+    def store_url(cache, url):
+        # Another writer must still get in while the image downloads
+        other = sqlite3.connect(app.config['DATABASE'], timeout=0)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+            other.rollback()
+        finally:
+            other.close()
+        return cache.store(image_bytes('blue', mode='RGB'))
+
+    monkeypatch.setattr(thumbnails.ThumbnailCache, 'store_url', store_url)
+    response = client.post('/edit_dish/1', data={'name': 'Renamed', 'price': '4', 'category_id': '1',
+                                                 'image_link': 'https://example.com/new.png'})
+    assert response.status_code == 302
+    with sqlite3.connect(app.config['DATABASE']) as conn:
+        name, link, digest = conn.execute('SELECT name, img_link, thumbnail FROM dishes WHERE id = 1').fetchone()
+    assert (name, link) == ('Renamed', 'https://example.com/new.png')
+    assert thumbnails.get_cache(app).exists(digest)
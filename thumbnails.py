@@ -0,0 +1,263 @@
+"""Content-addressed cache of dish thumbnails.
+
+A dish image is fetched (or uploaded) once, shrunk to ``THUMBNAIL_SIZE``
+and stored as WebP and JPEG under the SHA-256 of the original bytes. The
+files never change once written, so they can be served with a long expiry;
+when the cache outgrows its byte budget the least recently used images
+are evicted. Existing dishes can be backfilled from their image links::
+
+    python thumbnails.py backfill
+"""
+import argparse
+import hashlib
+import io
+import ipaddress
+import os
+import re
+import socket
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+import database_create
+import db
+
+CACHE_DIR = 'thumbnails'
+CACHE_BYTES = 100 * 1024 * 1024
+THUMBNAIL_SIZE = (400, 400)  # twice the rendered size, for high-density screens
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpg': ('JPEG', 'image/jpeg')}
+QUALITY = 80
+FETCH_TIMEOUT = 10  # seconds
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+MAX_AGE = 365 * 24 * 3600  # thumbnails never change, so browsers may keep them
+TOUCH_INTERVAL = 3600  # seconds between access-time updates of a served image
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def _check_address(address):
+    """Refuses loopback, private, link-local and other non-public addresses."""
+    ip = ipaddress.ip_address(address.split('%')[0])  # without an IPv6 zone
+    if getattr(ip, 'ipv4_mapped', None):
+        ip = ip.ipv4_mapped
+    if not ip.is_global:
+        raise ThumbnailError(f'Refusing to fetch from the non-public address {ip}')
+
+
+def _connect_public(address, *args, **kwargs):
+    sock = socket.create_connection(address, *args, **kwargs)
+    try:
+        _check_address(sock.getpeername()[0])
+    except ThumbnailError:
+        sock.close()
+        raise
+    return sock
+
+
+def _public(connection_class):
+    def connect(*args, **kwargs):
+        conn = connection_class(*args, **kwargs)
+        conn._create_connection = _connect_public
+        return conn
+    return connect
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(_public(http_class), req, **kwargs)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(_public(http_class), req, **kwargs)
+
+
+# Every connection, redirects included, is checked against the address it
+# actually reached, so a host that resolves differently the second time
+# can't slip through. Images are fetched directly, never through a proxy.
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler)
+
+
+def fetch(url, timeout=FETCH_TIMEOUT):
+    """Downloads an http(s) image from a public address, refusing anything
+    over ``MAX_SOURCE_BYTES``."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ThumbnailError(f'Not an http(s) URL: {url}')
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or parts.scheme, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError) as e:
+        raise ThumbnailError(f'Could not fetch {url}: {e}') from e
+    for *_, sockaddr in addresses:
+        _check_address(sockaddr[0])
+    request = urllib.request.Request(url, headers={'User-Agent': 'cooksoo-cafe-thumbnailer'})
+    try:
+        with _opener.open(request, timeout=timeout) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, ValueError) as e:
+        raise ThumbnailError(f'Could not fetch {url}: {e}') from e
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ThumbnailError(f'{url} is larger than {MAX_SOURCE_BYTES} bytes')
+    return data
+
+
+def _encode(image, fmt):
+    from PIL import Image
+
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white like the page background
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=QUALITY, optimize=fmt == 'JPEG')
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest, ext):
+        return os.path.join(self.directory, f'{digest}.{ext}')
+
+    def exists(self, digest):
+        return all(os.path.exists(self.path(digest, ext)) for ext in FORMATS)
+
+    def store(self, data):
+        """Thumbnails the image in ``data`` and returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.exists(digest):
+            return digest
+        # Pillow is only needed when an image is added, not to serve thumbnails
+        from PIL import Image
+
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info
+                                          else 'RGB')
+                encoded = {ext: _encode(image, fmt) for ext, (fmt, _) in FORMATS.items()}
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ThumbnailError(f'Not a usable image: {e}') from e
+        for ext, body in encoded.items():
+            # Written under a temporary name so a reader never sees half a file
+            tmp = self.path(digest, ext) + f'.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, self.path(digest, ext))
+        self.evict(keep=digest)
+        return digest
+
+    def store_url(self, url):
+        return self.store(fetch(url))
+
+    def open(self, digest, ext):
+        """Returns the path of a cached thumbnail, or None if it isn't cached."""
+        path = self.path(digest, ext)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # mtime doubles as the last-access time for eviction; refresh it sparingly
+        now = time.time()
+        if now - stat.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return path
+
+    def evict(self, keep=None):
+        """Deletes least recently used files until the cache fits its budget.
+
+        The files of digest ``keep`` (the one just stored) are never evicted.
+        """
+        files, total = [], 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.tmp') and not (keep and entry.name.startswith(keep)):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        files.sort()
+        evicted = 0
+        for mtime, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def get_cache(app):
+    cache = app.extensions.get('thumbnails')
+    if cache is None:
+        cache = ThumbnailCache(app.config['THUMBNAIL_DIR'], app.config['THUMBNAIL_CACHE_BYTES'])
+        app.extensions['thumbnails'] = cache
+    return cache
+
+
+def init_app(app):
+    app.config.setdefault('THUMBNAIL_DIR', os.path.join(app.root_path, CACHE_DIR))
+    app.config.setdefault('THUMBNAIL_CACHE_BYTES', CACHE_BYTES)
+
+
+def backfill(conn, cache, refresh=False, log=None):
+    """Thumbnails every dish with an image link but no cached thumbnail."""
+    log = log or (lambda message: None)
+    stats = dict(stored=0, failed=0)
+    dishes = conn.execute('''SELECT id, img_link, thumbnail FROM dishes
+                             WHERE img_link IS NOT NULL AND img_link != '' ''').fetchall()
+    for dish_id, img_link, thumbnail in dishes:
+        if thumbnail and cache.exists(thumbnail) and not refresh:
+            continue
+        try:
+            digest = cache.store_url(img_link)
+        except ThumbnailError as e:
+            log(f'dish {dish_id}: {e}')
+            stats['failed'] += 1
+            continue
+        with conn:
+            conn.execute('UPDATE dishes SET thumbnail = ? WHERE id = ?', (digest, dish_id))
+        stats['stored'] += 1
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['backfill', 'evict'])
+    parser.add_argument('--database', default=database_create.DATABASE)
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_DIR))
+    parser.add_argument('--max-bytes', type=int, default=CACHE_BYTES)
+    parser.add_argument('--refresh', action='store_true', help='re-fetch images that are already cached')
+    args = parser.parse_args(argv)
+
+    cache = ThumbnailCache(args.cache_dir, args.max_bytes)
+    if args.action == 'evict':
+        print(f'Evicted {cache.evict()} files')
+        return
+    database_create.create_database(args.database)
+    conn = db.connect(args.database)
+    conn.row_factory = None
+    try:
+        stats = backfill(conn, cache, args.refresh, log=lambda message: print(message, file=sys.stderr))
+    finally:
+        conn.close()
+    print(', '.join(f'{key}={value}' for key, value in stats.items()))
+
+
+if __name__ == '__main__':
+    main()